@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+This class samples the model's response surface over a regular grid of depths and velocities without running the model at every
+node. Most of the surface is flat or nearly planar, while the interesting features (the ridge near the optimal velocity and the
+sharp drop-off at high velocities) occupy a small part of it, so the sampling is refined quadtree-style only where it's needed.
+
+The nodes at every coarseStride-th depth and velocity are evaluated first, dividing the grid into coarse cells. Each cell larger
+than one grid interval is tested by running the model at its center node. The cell is split into (up to) four quarters if the
+response there differs from the bilinear interpolation of the cell's corners by more than the tolerance (a sign of curvature),
+or if the response varies across the corners by more than gradientFactor times the tolerance (a steep gradient, where features
+are easily missed). The quarters are tested in the same way, level by level, so each level's model runs can be made together.
+
+Several responses can guide the refinement together, e.g. DNEI and the daily risk-balancing metric, which standardized suitability
+follows under the risk-balancing strategy. Each is tested with its own tolerance and floor, and a cell is split if any of them
+fails. Responses for which lower values are better are tested by their reciprocals: for the risk-balancing metric, (risk constant +
+risk) / DNEI, that's a smooth reward-to-risk ratio, which goes through 0 where DNEI does instead of jumping between infinities.
+
+The results are then resampled onto the regular grid: nodes at which the model was run keep their own results, and every other
+node's values are interpolated bilinearly from the corners of the smallest cell containing it. The error estimate at each of those
+nodes is the curvature test's discrepancy for that cell.
+"""
+
+import numpy as np
+
+
+class AdaptiveSurfaceSampler(object):
+
+    def __init__(self, depths, velocities, relativeTolerance, coarseStride=8, gradientFactor=25, floorFraction=0.2):
+        """ The depths and velocities are the regular grid's axes. The tolerance is relative to the largest response among the coarse
+            nodes, so a relativeTolerance of 0.01 for NREI is about 1 % of the maximum standardized suitability. Responses below
+            -floorFraction times that maximum are treated as equal to it when testing cells, like the truncated axes of the NREI plots,
+            so the steep but uninteresting decline at high velocities isn't refined. """
+        self.depths = np.asarray(depths, dtype=float)
+        self.velocities = np.asarray(velocities, dtype=float)
+        self.relativeTolerance = relativeTolerance
+        self.floorFraction = floorFraction
+        self.tolerance = None  # absolute tolerance in units of the (first) response, set once the coarse nodes are evaluated
+        self.floor = None  # (first) response below which differences are ignored, set along with the tolerance
+        self.coarseStride = coarseStride
+        self.gradientFactor = gradientFactor
+        self.evaluated = {}  # model results keyed by (depth index, velocity index)
+        self.leaves = []  # cells that weren't split, as (i0, i1, j0, j1, estimated error) index bounds on the depth and velocity axes
+
+    def run(self, evaluate, response, progress=None, lowerIsBetter=()):
+        """ Samples the surface, calling evaluate with a list of (depth, velocity) tuples at each level of refinement and expecting a
+            list of model results in the same order. The response is the name of the result attribute that guides refinement, or a
+            tuple of names, of which those in lowerIsBetter are tested by their reciprocals; the estimated errors are those of the
+            first. If given, progress(evaluations, gridSize) is called after each level. Returns the dictionary of evaluated results. """
+        responses = (response,) if isinstance(response, str) else tuple(response)
+        tolerances, floors = {}, {}  # by response, set once the coarse nodes are evaluated
+
+        def axisNodes(n):
+            return sorted(set(range(0, n, self.coarseStride)) | {n - 1})
+
+        def evaluateNodes(nodes):
+            nodes = sorted(set(nodes) - set(self.evaluated.keys()))
+            if len(nodes) > 0:
+                for node, result in zip(nodes, evaluate([(self.depths[i], self.velocities[j]) for i, j in nodes])):
+                    self.evaluated[node] = result
+                if progress is not None:
+                    progress(len(self.evaluated), len(self.depths) * len(self.velocities))
+
+        def rawValue(i, j, name):
+            value = float(getattr(self.evaluated[(i, j)], name))
+            if name in lowerIsBetter:
+                with np.errstate(divide='ignore'):
+                    return np.float64(1) / value  # an infinite metric (no net intake) gives 0
+            return value
+
+        def value(i, j, name):
+            value = rawValue(i, j, name)
+            return max(value, floors[name]) if np.isfinite(value) else floors[name]
+
+        def intervals(nodes):
+            return list(zip(nodes[:-1], nodes[1:])) or [(nodes[0], nodes[0])]  # an axis with one value gives flat cells
+
+        depthNodes, velocityNodes = axisNodes(len(self.depths)), axisNodes(len(self.velocities))
+        evaluateNodes([(i, j) for i in depthNodes for j in velocityNodes])
+        for name in responses:
+            coarseValues = np.array([rawValue(i, j, name) for i in depthNodes for j in velocityNodes], dtype=float)
+            coarseValues = coarseValues[np.isfinite(coarseValues)]
+            scale = coarseValues.max() if len(coarseValues) > 0 else 0
+            scale = scale if scale > 0 else max(np.abs(coarseValues).max() if len(coarseValues) > 0 else 0, 1e-12)
+            tolerances[name] = self.relativeTolerance * scale
+            floors[name] = -self.floorFraction * scale
+        self.tolerance, self.floor = tolerances[responses[0]], floors[responses[0]]
+        cells = [(i0, i1, j0, j1) for i0, i1 in intervals(depthNodes) for j0, j1 in intervals(velocityNodes)]
+        self.leaves = []
+        while len(cells) > 0:
+            centers = {cell: ((cell[0] + cell[1]) // 2, (cell[2] + cell[3]) // 2) for cell in cells if cell[1] - cell[0] > 1 or cell[3] - cell[2] > 1}
+            evaluateNodes(centers.values())
+            refinedCells = []
+            for cell in cells:
+                i0, i1, j0, j1 = cell
+                if cell not in centers:
+                    self.leaves.append((i0, i1, j0, j1, 0))
+                    continue
+                im, jm = centers[cell]
+                errors = {}
+                shouldSplit = False
+                for name in responses:
+                    corners = np.array([value(i0, j0, name), value(i1, j0, name), value(i0, j1, name), value(i1, j1, name)])
+                    errors[name] = abs(value(im, jm, name) - self.bilinear(corners, i0, i1, j0, j1, im, jm))
+                    shouldSplit = shouldSplit or errors[name] > tolerances[name] or np.ptp(corners) > self.gradientFactor * tolerances[name]
+                error = errors[responses[0]]
+                if shouldSplit:
+                    depthSplits = [(i0, im), (im, i1)] if i1 - i0 > 1 else [(i0, i1)]
+                    velocitySplits = [(j0, jm), (jm, j1)] if j1 - j0 > 1 else [(j0, j1)]
+                    refinedCells.extend([(a0, a1, b0, b1) for a0, a1 in depthSplits for b0, b1 in velocitySplits])
+                else:
+                    self.leaves.append((i0, i1, j0, j1, error))
+            evaluateNodes([(i, j) for i0, i1, j0, j1 in refinedCells for i in (i0, i1) for j in (j0, j1)])
+            cells = refinedCells
+        return self.evaluated
+
+    @staticmethod
+    def bilinear(corners, i0, i1, j0, j1, i, j):
+        """ Interpolates bilinearly in index space from the corner values ordered (i0, j0), (i1, j0), (i0, j1), (i1, j1). Index space
+            is fine because the grid is regular. """
+        s = (i - i0) / (i1 - i0) if i1 > i0 else 0
+        t = (j - j0) / (j1 - j0) if j1 > j0 else 0
+        return (corners[0] * (1 - s) * (1 - t) + corners[1] * s * (1 - t) + corners[2] * (1 - s) * t + corners[3] * s * t)
+
+    def resample(self, metrics):
+        """ Returns a dictionary of (depth x velocity) arrays of each metric on the regular grid, along with an array of the estimated
+            interpolation error of the guiding response (0 where the model was run) and a boolean array marking those nodes. """
+        shape = (len(self.depths), len(self.velocities))
+        values = {metric: np.full(shape, np.nan) for metric in metrics}
+        error = np.zeros(shape)
+        isEvaluated = np.zeros(shape, dtype=bool)
+        for i0, i1, j0, j1, cellError in self.leaves:
+            ii, jj = np.meshgrid(np.arange(i0, i1 + 1), np.arange(j0, j1 + 1), indexing='ij')
+            for metric in metrics:
+                corners = np.array([getattr(self.evaluated[node], metric) for node in ((i0, j0), (i1, j0), (i0, j1), (i1, j1))], dtype=float)
+                values[metric][i0:i1 + 1, j0:j1 + 1] = self.bilinear(corners, i0, i1, j0, j1, ii, jj)
+            error[i0:i1 + 1, j0:j1 + 1] = np.maximum(error[i0:i1 + 1, j0:j1 + 1], cellError)
+        for (i, j), result in self.evaluated.items():
+            for metric in metrics:
+                values[metric][i, j] = getattr(result, metric)
+            error[i, j] = 0
+            isEvaluated[i, j] = True
+        return values, error, isEvaluated
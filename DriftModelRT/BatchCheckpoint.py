@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+This class writes the output file of a batch process as the rows are finished, so a long batch doesn't hold every result in memory
+and a crash doesn't lose the rows already calculated. Rows are appended to the output CSV file in blocks, and after each block a small
+JSON checkpoint file next to the output file records how many input rows are done, how long the output file was after that block,
+and the running minimum and maximum of the output columns needed to standardize suitability. The checkpoint is replaced atomically,
+so it always describes a complete block.
+
+When a batch is run again with the same output file, input file, and settings, resume() truncates anything written after the last
+checkpoint and the batch carries on from the next input row. Standardized suitability depends on the maximum over every row, so it's
+left blank as rows are written and filled in by fillColumn, a second pass over the output file once all the rows are done, which is
+cheap compared with running the model. The checkpoint is deleted when that pass is finished.
+"""
+
+import csv
+import json
+import math
+import os
+
+
+class BatchCheckpoint(object):
+
+    DIALECT = {'delimiter': ',', 'quotechar': '|', 'quoting': csv.QUOTE_MINIMAL}  # same format as the other output CSV files
+
+    def __init__(self, outFilePath, fingerprint):
+        """ The fingerprint is a string describing everything that affects the output (the input file and its modification time,
+            the batch method, and the model settings), so a checkpoint is only resumed by the same batch. """
+        self.outFilePath = outFilePath
+        self.checkpointPath = outFilePath + '.checkpoint'
+        self.fingerprint = fingerprint
+        self.rowsDone = 0  # number of input rows (including any skipped as invalid) whose output is in the output file
+        self.rowsWritten = 0  # number of output rows, not counting the header
+        self.outputBytes = 0
+        self.extremes = {}  # {attribute: [minimum, maximum]} of the output values given to appendRows
+
+    @staticmethod
+    def inputFingerprint(*parts):
+        """ Builds a fingerprint from the input file paths (identified by their path, size, and modification time) and any other
+            values, which should have a stable repr. """
+        described = []
+        for part in parts:
+            if isinstance(part, str) and os.path.isfile(part):
+                part = (part, os.path.getsize(part), os.path.getmtime(part))
+            described.append(repr(part))
+        return '|'.join(described)
+
+    def resume(self):
+        """ Loads the checkpoint for the output file if it matches this batch and the output file still holds everything it
+            describes, discarding output written after it. Returns True if the batch can carry on from rowsDone, or False if it must
+            start over. """
+        try:
+            with open(self.checkpointPath) as checkpointFile:
+                saved = json.load(checkpointFile)
+        except (OSError, ValueError):
+            return False
+        if saved.get('fingerprint') != self.fingerprint or not os.path.isfile(self.outFilePath) or os.path.getsize(self.outFilePath) < saved.get('outputBytes', math.inf):
+            return False
+        self.rowsDone = saved['rowsDone']
+        self.rowsWritten = saved['rowsWritten']
+        self.outputBytes = saved['outputBytes']
+        self.extremes = {attribute: [value if value is not None else math.nan for value in bounds] for attribute, bounds in saved['extremes'].items()}
+        with open(self.outFilePath, 'r+b') as outFile:
+            outFile.truncate(self.outputBytes)  # rows after the last checkpoint are calculated again
+        return True
+
+    def start(self, header):
+        """ Starts a new output file with the header row, replacing any earlier one. """
+        with open(self.outFilePath, 'wt', newline='') as outFile:
+            csv.writer(outFile, **BatchCheckpoint.DIALECT).writerow(header)
+        self.rowsDone = 0
+        self.rowsWritten = 0
+        self.outputBytes = os.path.getsize(self.outFilePath)
+        self.extremes = {}
+        self.save()
+
+    def appendRows(self, rows, rowsDone, values=None):
+        """ Appends finished output rows and records a checkpoint saying rowsDone input rows are done. The values are an optional
+            dictionary of {attribute: list of values} whose running minimum and maximum are kept, ignoring NaN. """
+        with open(self.outFilePath, 'at', newline='') as outFile:
+            csv.writer(outFile, **BatchCheckpoint.DIALECT).writerows(rows)
+        for attribute, attributeValues in (values or {}).items():
+            finiteValues = [float(value) for value in attributeValues if not math.isnan(float(value))]
+            if len(finiteValues) > 0:
+                bounds = self.extremes.setdefault(attribute, [math.nan, math.nan])
+                bounds[0] = min(finiteValues) if math.isnan(bounds[0]) else min(bounds[0], min(finiteValues))
+                bounds[1] = max(finiteValues) if math.isnan(bounds[1]) else max(bounds[1], max(finiteValues))
+        self.rowsDone = rowsDone
+        self.rowsWritten += len(rows)
+        self.outputBytes = os.path.getsize(self.outFilePath)
+        self.save()
+
+    def minimum(self, attribute):
+        return self.extremes.get(attribute, [math.nan, math.nan])[0]
+
+    def maximum(self, attribute):
+        return self.extremes.get(attribute, [math.nan, math.nan])[1]
+
+    def save(self):
+        saved = {'fingerprint': self.fingerprint,
+                 'rowsDone': self.rowsDone,
+                 'rowsWritten': self.rowsWritten,
+                 'outputBytes': self.outputBytes,
+                 'extremes': {attribute: [value if not math.isnan(value) else None for value in bounds] for attribute, bounds in self.extremes.items()}}
+        temporaryPath = self.checkpointPath + '.tmp'
+        with open(temporaryPath, 'w') as checkpointFile:
+            json.dump(saved, checkpointFile)
+        os.replace(temporaryPath, self.checkpointPath)
+
+    def fillColumn(self, header, valueForRow):
+        """ Rewrites the output file with the column with this header set to valueForRow(row), where row is a dictionary of the
+            row's values (as strings) keyed by header, and then deletes the checkpoint, since the batch is finished. The new file is
+            written next to the old one and then replaces it, so an interruption leaves the old file and checkpoint intact. """
+        temporaryPath = self.outFilePath + '.tmp'
+        with open(self.outFilePath, newline='') as inFile, open(temporaryPath, 'wt', newline='') as outFile:
+            reader = csv.reader(inFile, **BatchCheckpoint.DIALECT)
+            writer = csv.writer(outFile, **BatchCheckpoint.DIALECT)
+            headers = next(reader)
+            column = headers.index(header)
+            writer.writerow(headers)
+            for row in reader:
+                row[column] = valueForRow(dict(zip(headers, row)))
+                writer.writerow(row)
+        os.replace(temporaryPath, self.outFilePath)
+        self.discardCheckpoint()
+
+    def discardCheckpoint(self):
+        if os.path.exists(self.checkpointPath):
+            os.remove(self.checkpointPath)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+This class splits the rows of a batch method 1 or 3 input file into shards, so a very large batch can be divided by hand among
+several computers, each running the program on the same input file and settings but a different shard. A shard is either a
+contiguous range of rows (shard i of N gets the i-th N-th of the file) or the rows whose labels hash to i (modulo N), which keeps
+rows with the same label together regardless of their order in the file. The hash is CRC-32 rather than Python's hash(), which
+differs between processes, so every computer agrees on the shards.
+
+Each shard writes its own output file, with an extra first column holding each row's number in the input file. A shard's output
+file has its own checkpoint, so each shard can be interrupted and resumed on its own. Once every shard is finished, merge combines
+the shard output files into one, in input order, and standardizes suitability over all the rows: standardizing within each shard
+would use that shard's own maximum, so the merged file's standardized suitability is recalculated from the maximum over every shard.
+"""
+
+import csv
+import heapq
+import math
+import os
+import zlib
+
+from DriftModelRT.BatchCheckpoint import BatchCheckpoint
+
+
+class BatchShard(object):
+
+    ROW_HEADER = 'Input row'  # header of the column of input row numbers added to shard output files
+
+    def __init__(self, index, count, byLabelHash=False, rowCount=None):
+        """ The index counts from 0 up to count - 1. Sharding by row range needs the number of data rows in the input file. """
+        self.index = index
+        self.count = count
+        self.byLabelHash = byLabelHash
+        if not byLabelHash:
+            self.firstRow = index * rowCount // count
+            self.endRow = (index + 1) * rowCount // count
+
+    @staticmethod
+    def countRows(inFilePath):
+        """ Returns the number of data rows (after the header) in a CSV input file. """
+        with open(inFilePath, newline='') as csvFile:
+            reader = csv.reader(csvFile)
+            next(reader, None)
+            return sum(1 for row in reader)
+
+    def contains(self, rowNumber, label):
+        if self.byLabelHash:
+            return zlib.crc32(label.encode('utf-8')) % self.count == self.index
+        return self.firstRow <= rowNumber < self.endRow
+
+    def startRow(self, rowsDone):
+        """ Returns the first input row to read, given the number already done, skipping the rows before a row range. """
+        return rowsDone if self.byLabelHash else max(rowsDone, self.firstRow)
+
+    def rows(self, rows):
+        """ Filters the (row number, inputs) tuples yielded by a batch input generator to those in this shard, given that the label is
+            the first input. A shard by row range stops reading the file after its last row. """
+        for rowNumber, inputs in rows:
+            if not self.byLabelHash and rowNumber >= self.endRow:
+                return
+            if self.contains(rowNumber, inputs[0]):
+                yield rowNumber, inputs
+
+    def description(self):
+        return "shard {0} of {1} by {2}".format(self.index + 1, self.count, "label hash" if self.byLabelHash else "row range")
+
+    @staticmethod
+    def readShards(shardPaths):
+        """ Checks that the shard output files are finished and have the same columns, returning their header. Raises ValueError
+            otherwise. """
+        header = None
+        for shardPath in shardPaths:
+            if os.path.exists(shardPath + '.checkpoint'):
+                raise ValueError("Shard output file {0} isn't finished; run its shard again to complete it.".format(shardPath))
+            with open(shardPath, newline='') as shardFile:
+                shardHeader = next(csv.reader(shardFile, **BatchCheckpoint.DIALECT), None)
+            if shardHeader is None or len(shardHeader) == 0 or shardHeader[0] != BatchShard.ROW_HEADER:
+                raise ValueError("File {0} isn't a shard output file.".format(shardPath))
+            if header is not None and shardHeader != header:
+                raise ValueError("Shard output file {0} has different columns than the other shards.".format(shardPath))
+            header = shardHeader
+        if header is None:
+            raise ValueError("No shard output files were given.")
+        return header
+
+    @staticmethod
+    def shardRows(shardPath):
+        """ Yields the rows of a shard output file as (input row number, row values without the row number). """
+        with open(shardPath, newline='') as shardFile:
+            reader = csv.reader(shardFile, **BatchCheckpoint.DIALECT)
+            next(reader)
+            for row in reader:
+                yield int(row[0]), row[1:]
+
+    @staticmethod
+    def extremes(shardPaths, headers):
+        """ Returns {header: (minimum, maximum)} of the given columns over every row of the shard output files, ignoring NaN. """
+        header = BatchShard.readShards(shardPaths)[1:]
+        columns = {name: header.index(name) for name in headers}
+        bounds = {name: (math.inf, -math.inf) for name in headers}
+        for shardPath in shardPaths:
+            for rowNumber, row in BatchShard.shardRows(shardPath):
+                for name, column in columns.items():
+                    value = float(row[column])
+                    if not math.isnan(value):
+                        bounds[name] = (min(bounds[name][0], value), max(bounds[name][1], value))
+        return {name: (low, high) if low <= high else (math.nan, math.nan) for name, (low, high) in bounds.items()}
+
+    @staticmethod
+    def merge(shardPaths, outFilePath, standardizedHeader, valueForRow):
+        """ Writes the rows of all the shard output files to one output file in input row order, without the row number column,
+            setting the column with standardizedHeader to valueForRow(row), where row is a dictionary of the row's values keyed by
+            header. Each shard file is already in input order, so they're merged a row at a time without loading them. Returns the
+            number of rows written. """
+        header = BatchShard.readShards(shardPaths)[1:]
+        column = header.index(standardizedHeader)
+        rowCount = 0
+        lastRowNumber = None
+        with open(outFilePath, 'wt', newline='') as outFile:
+            writer = csv.writer(outFile, **BatchCheckpoint.DIALECT)
+            writer.writerow(header)
+            for rowNumber, row in heapq.merge(*[BatchShard.shardRows(shardPath) for shardPath in shardPaths], key=lambda numberedRow: numberedRow[0]):
+                if rowNumber == lastRowNumber:
+                    continue  # the same row from overlapping shards, e.g. if a shard file was given twice
+                row[column] = valueForRow(dict(zip(header, row)))
+                writer.writerow(row)
+                lastRowNumber = rowNumber
+                rowCount += 1
+        return rowCount
@@ -41,6 +41,19 @@ class CalculationGrid(object):
         elif velocityProfileMethod == 1:  # uniform water velocity throughout
             return meanColumnVelocity
 
+    @staticmethod
+    def velocitiesAtDepths(velocityProfileMethod, depths, waterDepths, meanColumnVelocities, roughnesses):
+        """ Same as velocityAtDepth, but for arrays of inputs, as used for grids on transects whose water columns all differ. """
+        if velocityProfileMethod == 0:  # logarithmic
+            k = 0.01 * np.where(roughnesses < waterDepths, roughnesses, waterDepths)
+            k[k == 0] = 0.1
+            R = 0.01 * waterDepths
+            H = 0.01 * (waterDepths - depths)
+            vstar = meanColumnVelocities / (5.75 * np.log10(12.27 * R / k))
+            return 5.75 * np.log10(30 * H / k) * vstar
+        elif velocityProfileMethod == 1:  # uniform water velocity throughout
+            return np.array(meanColumnVelocities, dtype=float)
+
     @staticmethod
     @functools.lru_cache(maxsize=2048)
     def constructCells(reactionDistance, focalDepth, waterDepth, meanColumnVelocity, velocityProfileMethod, userGridSize, roughness):
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+This class is a drop-in replacement for ParallelWorkers that spreads model evaluations over several computers, so a lab's ordinary
+Linux boxes can share a large batch or scenario study. The program acts as the coordinator: it listens on a TCP port, and worker
+processes on any machine that can reach it connect, receive one job at a time, run it headless (jobs are the same module-level
+functions and plain-data arguments given to ParallelWorkers, e.g. DriftForager.runPoints on a chunk of batch rows, which build their
+own forager), and send back the result. Some of the workers can be started on the coordinator's own machine, connecting over loopback.
+
+A worker is started on each machine, from the program's folder, with
+
+    python -m DriftModelRT.ClusterWorkers --host <coordinator address> --port 6000 --authkey <password> --processes 8
+
+or with "main worker ..." and the same options for the compiled program. Workers keep trying to connect until the coordinator is
+listening, and reconnect when it's restarted, so they can be left running. Connections are authenticated with the password (the
+jobs and results are pickled, so only machines that know it must be able to connect), but not encrypted, so the port should only
+be reachable from the lab's own network.
+
+Each job is given to one worker at a time. If a worker disconnects (the machine is switched off, say), doesn't finish a job within
+jobTimeout seconds, or the job raises an exception, the job goes back in the queue for another worker, up to maxAttempts times, after
+which imap raises RuntimeError with the last error. Workers on the coordinator's machine that exit are restarted. Results are yielded
+in the order of the jobs, whichever worker finishes first.
+"""
+
+import argparse
+import collections
+import multiprocessing
+import os
+import pickle
+import socket
+import sys
+import threading
+import time
+import traceback
+from multiprocessing.connection import Client, Listener, wait
+
+
+class ClusterWorkers(object):
+
+    def __init__(self, port=6000, authkey='', localWorkers=0, host='', maxAttempts=3, jobTimeout=None, waitTimeout=None, idle=None):
+        """ Starts listening for workers on the port (0 picks a free one; see self.address) of every network interface, or only of the
+            given host, and starts localWorkers worker processes on this machine. If no worker is connected for waitTimeout seconds
+            while there are jobs, imap raises RuntimeError. If given, idle() is called about ten times a second while waiting for
+            results, e.g. to keep a user interface responsive. """
+        self.authkey = authkey.encode('utf-8') if isinstance(authkey, str) else authkey
+        self.maxAttempts = maxAttempts
+        self.jobTimeout = jobTimeout
+        self.waitTimeout = waitTimeout
+        self.idle = idle
+        self.listener = Listener((host, port), authkey=self.authkey)
+        self.address = self.listener.address
+        self.workers = {}  # {connection: (job id, start time) of its current job, or None if it's idle}
+        self.newConnections = collections.deque()  # filled by the thread accepting connections
+        self.nextJobId = 0
+        self.isClosed = False
+        self.acceptThread = threading.Thread(target=self.acceptConnections, daemon=True)
+        self.acceptThread.start()
+        self.loopbackAddress = ('127.0.0.1' if host in ('', '0.0.0.0') else host, self.address[1])
+        self.localProcesses = [self.startLocalWorker() for i in range(localWorkers)]
+
+    def startLocalWorker(self):
+        context = multiprocessing.get_context('spawn')  # like ParallelWorkers, so the workers don't inherit the Qt application
+        process = context.Process(target=ClusterWorkers.runWorker, args=(self.loopbackAddress, self.authkey, False), daemon=True)
+        process.start()
+        return process
+
+    def restartLocalWorkers(self):
+        """ Replaces worker processes on this machine that have exited, e.g. after running out of memory or being dropped for taking
+            too long, so the coordinator always has its own workers. Their jobs were already put back in the queue when they
+            disconnected. """
+        for i, process in enumerate(self.localProcesses):
+            if process.exitcode is not None:
+                self.localProcesses[i] = self.startLocalWorker()
+
+    @property
+    def processes(self):
+        """ The number of workers connected (or starting on this machine), used like ParallelWorkers.processes to size jobs. """
+        self.takeNewConnections()
+        return max(1, len(self.workers), len([process for process in self.localProcesses if process.is_alive()]))
+
+    def acceptConnections(self):
+        while not self.isClosed:
+            try:
+                connection = self.listener.accept()
+            except (OSError, EOFError, multiprocessing.AuthenticationError):
+                continue  # a failed handshake, e.g. a wrong password, or the wake-up connection from close()
+            if self.isClosed:
+                connection.close()
+            else:
+                self.newConnections.append(connection)
+
+    def takeNewConnections(self):
+        while len(self.newConnections) > 0:
+            self.workers[self.newConnections.popleft()] = None
+
+    def dropWorker(self, connection):
+        """ Forgets a worker that disconnected or timed out, returning its current job id (or None). """
+        job = self.workers.pop(connection, None)
+        try:
+            connection.close()
+        except OSError:
+            pass
+        return job[0] if job is not None else None
+
+    def starmap(self, function, argumentTuples):
+        """ Returns [function(*arguments) for arguments in argumentTuples], evaluated by the workers and kept in order. """
+        return list(self.imap(function, argumentTuples))
+
+    def imap(self, function, argumentTuples):
+        """ Like starmap, but yields each result as soon as it and all earlier ones are done, so the caller can report progress. """
+        argumentTuples = list(argumentTuples)
+        payloads = [pickle.dumps((function, arguments)) for arguments in argumentTuples]  # pickled separately, so a worker that can't load a job can still report it
+        jobIds = list(range(self.nextJobId, self.nextJobId + len(argumentTuples)))  # ids are never reused, so late results of abandoned jobs are ignored
+        self.nextJobId += len(argumentTuples)
+        indexByJobId = {jobId: index for index, jobId in enumerate(jobIds)}
+        queue = collections.deque(jobIds)
+        attempts = collections.Counter()
+        results = {}
+        nextIndex = 0
+        lastWorkerTime = time.monotonic()
+        while nextIndex < len(argumentTuples):
+            self.restartLocalWorkers()
+            self.takeNewConnections()
+            for connection, job in list(self.workers.items()):
+                if job is None and len(queue) > 0:
+                    jobId = queue.popleft()
+                    try:
+                        connection.send((jobId, payloads[indexByJobId[jobId]]))
+                        self.workers[connection] = (jobId, time.monotonic())
+                    except OSError:
+                        self.dropWorker(connection)
+                        queue.appendleft(jobId)
+            if len(self.workers) > 0:
+                lastWorkerTime = time.monotonic()
+            elif self.waitTimeout is not None and time.monotonic() - lastWorkerTime > self.waitTimeout:
+                raise RuntimeError("No workers connected to port {0} within {1} seconds.".format(self.address[1], self.waitTimeout))
+            for connection in wait([connection for connection, job in self.workers.items() if job is not None], timeout=0.1):
+                try:
+                    jobId, isSuccessful, value = connection.recv()
+                except (OSError, EOFError):
+                    jobId, isSuccessful, value = self.dropWorker(connection), False, "The worker disconnected."
+                else:
+                    self.workers[connection] = None
+                if jobId not in indexByJobId or indexByJobId[jobId] < nextIndex or indexByJobId[jobId] in results:
+                    continue  # a job from an earlier call, or one already finished by another worker
+                if isSuccessful:
+                    results[indexByJobId[jobId]] = value
+                else:
+                    self.retry(jobId, value, queue, attempts)
+            if self.jobTimeout is not None:
+                for connection, job in list(self.workers.items()):
+                    if job is not None and time.monotonic() - job[1] > self.jobTimeout:
+                        self.dropWorker(connection)
+                        if job[0] in indexByJobId:
+                            self.retry(job[0], "The worker did not finish the job within {0} seconds.".format(self.jobTimeout), queue, attempts)
+            while nextIndex in results:
+                yield results.pop(nextIndex)
+                nextIndex += 1
+            if self.idle is not None:
+                self.idle()
+
+    def retry(self, jobId, error, queue, attempts):
+        attempts[jobId] += 1
+        if attempts[jobId] >= self.maxAttempts:
+            raise RuntimeError("A job failed {0} times. Last error: {1}".format(attempts[jobId], error))
+        queue.append(jobId)
+
+    def close(self):
+        """ Disconnects the workers (the ones on this machine stop, and others wait to reconnect) and stops listening. """
+        self.isClosed = True
+        for connection in list(self.workers.keys()) + list(self.newConnections):
+            self.dropWorker(connection)
+        try:  # wakes the accepting thread, which is blocked waiting for a connection
+            socket.create_connection(('127.0.0.1' if self.address[0] in ('', '0.0.0.0') else self.address[0], self.address[1]), timeout=1).close()
+        except OSError:
+            pass
+        self.acceptThread.join(timeout=1)
+        self.listener.close()
+        for process in self.localProcesses:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exceptionInfo):
+        self.close()
+
+    @staticmethod
+    def runWorker(address, authkey, shouldReconnect=True, retryInterval=5):
+        """ Connects to the coordinator at address, a (host, port) tuple, and runs the jobs it sends until it disconnects. If
+            shouldReconnect is True, waits for it to listen again (or for the first time) and carries on, until interrupted. """
+        authkey = authkey.encode('utf-8') if isinstance(authkey, str) else authkey
+        while True:
+            try:
+                connection = Client(address, authkey=authkey)
+            except (OSError, multiprocessing.AuthenticationError):
+                if not shouldReconnect:
+                    return
+                time.sleep(retryInterval)
+                continue
+            with connection:
+                while True:
+                    try:
+                        jobId, payload = connection.recv()
+                    except (OSError, EOFError):
+                        break
+                    try:
+                        function, arguments = pickle.loads(payload)
+                        reply = (jobId, True, function(*arguments))
+                    except Exception:
+                        reply = (jobId, False, "{0} on {1}".format(traceback.format_exc(), socket.gethostname()))
+                    try:
+                        connection.send(reply)
+                    except OSError:
+                        break
+            if not shouldReconnect:
+                return
+
+    @staticmethod
+    def main(arguments=None):
+        """ Runs worker processes from the command line, as described at the top of this file. """
+        parser = argparse.ArgumentParser(description="Runs drift-foraging model jobs for a BioenergeticHSC coordinator.")
+        parser.add_argument('--host', required=True, help="address of the computer running the coordinator")
+        parser.add_argument('--port', type=int, default=6000)
+        parser.add_argument('--authkey', default=os.environ.get('BIOHSC_AUTHKEY', ''), help="the coordinator's password (default: the BIOHSC_AUTHKEY environment variable)")
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1, help="number of worker processes (default: number of CPU cores)")
+        options = parser.parse_args(arguments)
+        address = (options.host, options.port)
+        if options.processes <= 1:
+            ClusterWorkers.runWorker(address, options.authkey)
+            return 0
+        context = multiprocessing.get_context('spawn')
+        processes = [context.Process(target=ClusterWorkers.runWorker, args=(address, options.authkey)) for i in range(options.processes)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        return 0
+
+
+if __name__ == '__main__':
+    sys.exit(ClusterWorkers.main())
@@ -2,14 +2,16 @@
 # -*- coding: utf-8 -*-
 """
 This class holds the results from each of the 24 hours calculated in a daily model run, along with summaries of the
-daily run such as daily risk and daily net energy intake. The DailyModelSetResult class in turn can combine a number
-of DailyRunResult objects (typically from different depths and velocities) and create graphs based on the DailyRunResult
-values in the same way as InstantaneousModelSetResult objects create graphs from SingleModelResult values. This is a bit
-confusing because there are also SingleModelResult objects nested inside DailyRunResult. So there are basically 2 layers
-to the instantenous model process and 3 in the daily model process:
+daily run such as daily risk and daily net energy intake. The hourly results are kept as a (24 x HOURLY_METRICS) array
+in chronological order, with NaN in hours in which foraging isn't allowed, rather than as 24 SingleModelResult objects.
+The DailyModelSetResult class in turn can combine a number of DailyRunResult objects (typically from different depths
+and velocities) and create graphs based on the DailyRunResult values in the same way as InstantaneousModelSetResult
+objects create graphs from SingleModelResult values. Each hour's SingleModelResult is only kept long enough to copy its
+metrics into the array. So there are basically 2 layers to the instantenous model process and 3 in the daily model
+process, of which the first is transient:
 
 SingleModelResult --> InstantenousModelSetResult (combining many depths, velocities etc)
-SingleModelResult --> DailyRunResult (24 hours of SingleModelResults) --> DailyModelSetResult (combining those over d, v, etc)
+SingleModelResult --> DailyRunResult (24 hours of metrics copied from them) --> DailyModelSetResult (combining those over d, v, etc)
 
 The tricky bit is that DailyRunResult has to mimic some aspects of SingleModelResult so that many of the same plotting
 functions can be used for both in the ModelSetResult superclass.
@@ -17,12 +19,21 @@ functions can be used for both in the ModelSetResult superclass.
 
 class DailyRunResult(object):
 
-    def __init__(self, depth, velocity, hourlyResults, dailyNetEnergyIntake, dailyGrossEnergyIntake, dailyCost, dailyHoursForaging,
+    # Daily summaries given to the constructor after the hourly results, in order, e.g. for building results interpolated between others
+    SUMMARY_METRICS = ('dailyNetEnergyIntake', 'dailyGrossEnergyIntake', 'dailyCost', 'dailyHoursForaging', 'dailyFocalSwimmingCost',
+                       'dailyCaptureManeuverCost', 'dailyRisk', 'dailyRiskBalancingMetric', 'dailySpecificConsumption',
+                       'dailySpecificConsumptionProportional')
+
+    # Columns of the hourly metrics array: rates in J/s from each hour's SingleModelResult, then the hour's risk and the proportion of it foraged
+    HOURLY_METRICS = ('netRateOfEnergyIntake', 'grossRateOfEnergyIntake', 'focalSwimmingCostRate', 'captureManeuverCostRate', 'hourlyRisk',
+                      'proportionOfHourForaged')
+
+    def __init__(self, depth, velocity, hourlyMetrics, dailyNetEnergyIntake, dailyGrossEnergyIntake, dailyCost, dailyHoursForaging,
                  dailyFocalSwimmingCost, dailyCaptureManeuverCost, dailyRisk, dailyRiskBalancingMetric, dailySpecificConsumption,
                  dailySpecificConsumptionProportional):
         self.depth = depth
         self.velocity = velocity
-        self.hourlyResults = hourlyResults
+        self.hourlyMetrics = hourlyMetrics  # None for results interpolated between others
         self.dailyRisk = dailyRisk
         self.dailyRiskOn90DayHorizon = 1 - (1 - self.dailyRisk) ** 90
         self.dailyRiskBalancingMetric = dailyRiskBalancingMetric
@@ -35,19 +46,45 @@ class DailyRunResult(object):
         self.dailySpecificConsumption = dailySpecificConsumption
         self.dailySpecificConsumptionProportional = dailySpecificConsumptionProportional
         self.standardizedSuitability = 0  # Placeholder to be set after all such results are created
+        # Diagnostics comparing the greedy schedule above with the optimal risk-balancing schedule, only set for risk-balancing runs
+        self.optimalDailyRiskBalancingMetric = float('nan')
+        self.greedyScheduleMetricExcess = float('nan')  # proportion by which the greedy schedule's metric exceeds the optimal one
+        self.optimalScheduleIsExact = None
+        self.optimalProportionOfHourForaged = None  # dict of {hour: proportion of the hour foraged} in the optimal schedule
+
+    def hourlyMetric(self, metric):
+        """ Returns the array of the given hourly metric for each hour of the day. """
+        return self.hourlyMetrics[:, DailyRunResult.HOURLY_METRICS.index(metric)]
+
+    @property
+    def actuallyForaged(self):
+        """ Boolean array showing whether the fish foraged in each hour of the day. """
+        return self.hourlyMetric('proportionOfHourForaged') > 0
+
+    def compareWithOptimalSchedule(self, optimalSchedule):
+        """ Stores the comparison with the result of DailySchedule.optimalRiskBalancing for the same cell. """
+        self.optimalDailyRiskBalancingMetric = optimalSchedule['metric']
+        self.optimalScheduleIsExact = optimalSchedule['isExact']
+        self.optimalProportionOfHourForaged = optimalSchedule['proportions']
+        if 0 < self.optimalDailyRiskBalancingMetric < float('inf'):
+            self.greedyScheduleMetricExcess = self.dailyRiskBalancingMetric / self.optimalDailyRiskBalancingMetric - 1
 
     def standardizeSuitability(self, maxDailyNetEnergyIntake, minDailyRiskBalancingMetric, maxDailyRiskBalancingMetric, foragingStrategy):
+        self.standardizedSuitability = DailyRunResult.standardizedSuitabilityFor(self.dailyNetEnergyIntake, self.dailyRiskBalancingMetric, maxDailyNetEnergyIntake,
+                                                                                 minDailyRiskBalancingMetric, maxDailyRiskBalancingMetric, foragingStrategy)
+
+    @staticmethod
+    def standardizedSuitabilityFor(dailyNetEnergyIntake, dailyRiskBalancingMetric, maxDailyNetEnergyIntake, minDailyRiskBalancingMetric, maxDailyRiskBalancingMetric, foragingStrategy):
+        """ Returns the standardized suitability of a result with the given DNEI and risk-balancing metric, so it can also be calculated
+            from the values in an output file. It's 0 in the degenerate cases where it isn't defined. """
         if foragingStrategy == 0:  # Standardize by DNEI, higher = better
             if maxDailyNetEnergyIntake > 0:
-                self.standardizedSuitability = self.dailyNetEnergyIntake / maxDailyNetEnergyIntake
-            else:
-                return 0
+                return dailyNetEnergyIntake / maxDailyNetEnergyIntake
         elif foragingStrategy == 1:  # Standardize by daily risk-balancing metric
             # This one is tricky, because lower values of the risk/reward ratio are better.
             # Standardized suitability is scaled such that minDailyRiskBalancingMetric maps to 1 and maxDailyRiskBalancingMetric maps to 0
             # Thus the distance from the maximum, divided by the size of the range, defines the standardized suitability.
             sizeOfRiskMetricRange = maxDailyRiskBalancingMetric - minDailyRiskBalancingMetric
-            if sizeOfRiskMetricRange == 0:
-                return 1  # call it all equally suitable if the fitness metric is the same everywhere, avoids dividing by 0 in that edge case
-            else:
-                self.standardizedSuitability = (maxDailyRiskBalancingMetric - self.dailyRiskBalancingMetric) / sizeOfRiskMetricRange
\ No newline at end of file
+            if sizeOfRiskMetricRange != 0:  # avoids dividing by 0 in the edge case where the fitness metric is the same everywhere
+                return (maxDailyRiskBalancingMetric - dailyRiskBalancingMetric) / sizeOfRiskMetricRange
+        return 0
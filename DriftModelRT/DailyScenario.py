@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+This class holds everything about a daily model run that is the same for every depth/velocity cell or batch row: the parsed
+hourly details file, the foraging strategy and risk constants from the Daily Settings tab, the prey types from any hourly custom
+drift files, and the illumination table. It is built once per run and passed to DriftForager.runDailyModel for every cell, so
+the per-cell calculations don't reopen files or read settings from the user interface.
+
+The scenario holds only plain data (no references to the user interface), so it can be passed to other processes.
+"""
+
+from copy import deepcopy
+import csv
+import os
+
+import numpy as np
+
+from DriftModelRT.IlluminationTable import IlluminationTable
+from DriftModelRT.PreyType import PreyType
+
+
+class DailyScenario(object):
+
+    @staticmethod
+    def fromUserInterface(ui, monthsAndDays=None):
+        """ Builds the scenario from the current settings on the Daily Settings tab, for the tab's month and day unless a tuple of
+            (month, day) tuples is given to run a range of dates. """
+        if monthsAndDays is None:
+            monthAndDay = ui.deMonthAndDay.date()
+            monthsAndDays = ((monthAndDay.month(), monthAndDay.day()),)
+        return DailyScenario(ui.leHourlyDetailsFile.text(),
+                             ui.cbForagingStrategy.currentIndex(),
+                             float(ui.leMaxHoursToFeed.text()),
+                             float(ui.leBaselineHourlyPredationRiskInTermsOf90DayHorizon.text()),
+                             float(ui.leRiskScaleConstant.text()),
+                             ui.cbConsumptionParameters.currentIndex(),
+                             float(ui.leLatitude.text()),
+                             float(ui.leLongitude.text()),
+                             monthsAndDays,
+                             float(ui.leNighttimeDetectionProbability.text()),
+                             ui,
+                             ui.ckbCompareWithOptimalSchedule.isChecked())
+
+    def __init__(self, hourlyDetailsFile, strategy, maxHoursFeedingIsAllowed, baselineRiskOn90DayHorizon, riskScaleConstantOn90DayHorizon,
+                 consumptionParameters, latitude, longitude, monthsAndDays, nighttimeDetectionProbability, ui=None, shouldCompareWithOptimalSchedule=False):
+        self.strategy = strategy  # 0 for efficiency maximizing, 1 for risk balancing
+        self.shouldCompareWithOptimalSchedule = shouldCompareWithOptimalSchedule  # risk-balancing diagnostic, off by default because it's slow
+        self.maxHoursFeedingIsAllowed = maxHoursFeedingIsAllowed
+        self.consumptionParameters = consumptionParameters  # index of the Wisconsin model parameters used for maximum consumption
+        # Predation risk is input in the interface in terms of easier-to-picture 90-day probabilities of being predated,
+        # but that is converted here to actual hourly probabilities, which can then be modified by hour or location.
+        self.baselineHourlyRisk = 1 - (1 - baselineRiskOn90DayHorizon) ** (1 / (24 * 90))
+        self.dailyRiskScaleConstant = 1 - (1 - riskScaleConstantOn90DayHorizon) ** (1 / 90)
+        self.hourlyDetails = DailyScenario.readHourlyDetails(hourlyDetailsFile, ui)
+        self.specificHoursFeedingIsAllowed = [hour for hour in range(24) if not self.hourlyDetails[hour]['forcedRest']]
+        self.hourlyRisk = np.array([np.clip(self.baselineHourlyRisk * self.hourlyDetails[hour]['riskMultiplier'], 0, 1) for hour in range(24)])  # todo include spatial factor here when implemented
+        self.customPreyTypes = {}  # unfiltered prey types from each hourly custom drift file, keyed by file path
+        for hour in self.specificHoursFeedingIsAllowed:
+            customDriftFile = self.hourlyDetails[hour]['customDriftFile']
+            if customDriftFile != "" and customDriftFile not in self.customPreyTypes:
+                self.customPreyTypes[customDriftFile] = PreyType.loadPreyTypes(customDriftFile, ui)
+        self.filteredCustomPreyTypes = {}  # custom prey types filtered for a given fish, keyed by (file path, fork length)
+        self.monthsAndDays = tuple(monthsAndDays)
+        self.illuminationTable = IlluminationTable.cached(latitude, longitude, self.monthsAndDays, nighttimeDetectionProbability)
+
+    @staticmethod
+    def readHourlyDetails(hourlyDetailsFile, ui=None):
+        """ Process inputs from the custom hourly details specification file, if any, storing in a dictionary keyed by hour. A
+            temperature of None means the hour uses the forager's own water temperature. """
+        hourlyDetails = {}
+        for hour in range(24):          # First, fill the dictionary with default values (i.e. no effect) for blank entries
+            hourlyDetails[hour] = {
+                'temperature': None,
+                'forcedRest': False,
+                'riskMultiplier': 1,
+                'driftMultiplier': 1,
+                'customDriftFile': ""
+            }
+        if hourlyDetailsFile != "" and os.path.exists(hourlyDetailsFile):
+            with open(hourlyDetailsFile, newline='') as csvFile:
+                reader = csv.reader(csvFile)
+                next(reader, None)  # skip the header row
+                for row in reader:
+                    try:
+                        hour = int(row[0])
+                        if row[1] != "":
+                            hourlyDetails[hour]['temperature'] = float(row[1])
+                        if row[2] != "":
+                            hourlyDetails[hour]['forcedRest'] = bool(int(row[2]))
+                        if row[3] != "":
+                            hourlyDetails[hour]['riskMultiplier'] = float(row[3])
+                        if row[4] != "":
+                            hourlyDetails[hour]['driftMultiplier'] = float(row[4])
+                        if row[5] != "":
+                            hourlyDetails[hour]['customDriftFile'] = row[5]
+                    except ValueError as err:
+                        message = "Value encountered in the hourly details file that could not be interpreted! Skipping a row. Error: {0}".format(err)
+                        if ui is not None:
+                            ui.statusError(message)
+                        else:
+                            print(message)
+        return hourlyDetails
+
+    def preyTypesForHour(self, hour, forager):
+        """ Returns the prey types available to the forager in the given hour: its own prey types, or those from the hour's custom
+            drift file filtered for the forager's size. Filtered lists are kept so they're only built once per fish size. """
+        customDriftFile = self.hourlyDetails[hour]['customDriftFile']
+        if customDriftFile == "":
+            return forager.preyTypes
+        key = (customDriftFile, forager.forkLength)
+        if key not in self.filteredCustomPreyTypes:
+            self.filteredCustomPreyTypes[key] = forager.filteredPreyTypes(deepcopy(self.customPreyTypes[customDriftFile]))  # copied because filtering trims prey types in place
+        return self.filteredCustomPreyTypes[key]
+
+    def lightSensitiveDetectionProbability(self, hour, dateIndex=0):
+        """ The multiplier of the forager's base prey detection probability for the hour on the date at dateIndex. This is the only
+            source of light-sensitive detection; foragers outside daily runs use their base detection probability alone. """
+        return self.illuminationTable.detectionProbabilityAt(hour, dateIndex)
+
+    def cacheKey(self):
+        """ Returns a hashable summary of everything in the scenario that affects daily results, so results from an earlier run with
+            the same scenario can be reused (see SweepResultCache). Custom drift files are identified by path and modification time. """
+        hourlyDetails = tuple(tuple(sorted(self.hourlyDetails[hour].items())) for hour in range(24))
+        customDriftFiles = tuple((path, os.path.getmtime(path) if os.path.exists(path) else None) for path in sorted(self.customPreyTypes))
+        table = self.illuminationTable
+        return (self.strategy, self.maxHoursFeedingIsAllowed, self.consumptionParameters, self.baselineHourlyRisk, self.dailyRiskScaleConstant,
+                hourlyDetails, customDriftFiles, self.monthsAndDays, table.latitude, table.longitude, table.nighttimeDetectionProbability,
+                self.shouldCompareWithOptimalSchedule)
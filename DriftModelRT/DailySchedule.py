@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+This class decides which hours of the day a fish forages in, given the results of the foraging model for each hour, and totals up
+the daily net energy intake, costs, consumption, and risk that result. It works on arrays with one row per depth/velocity cell and
+one column per hour of the day, so the schedules for a whole response surface are evaluated at once with NumPy rather than one cell
+at a time in Python.
+
+The schedule logic is as follows. Hours in which foraging is allowed are ranked according to the fish's strategy (best NREI/cost
+ratio first for efficiency maximizing, lowest risk/NREI ratio first for risk balancing). The fish then forages in the ranked hours,
+best first, until it runs out of allowed hours (maxHoursToFeed), reaches an hour in which foraging costs more energy than it gains,
+or has eaten its maximum daily ration (Cmax). In the hour in which it reaches Cmax it only forages for the part of the hour needed
+to fill up. A risk-balancing fish also stops before any hour that would make its risk-balancing metric worse, where the metric is
+(dailyRiskScaleConstant + cumulative daily risk) / cumulative NREI over the hours foraged so far.
+
+That greedy rule is fast but can miss better risk-balancing schedules, for example when skipping a mediocre hour would allow a
+better one later in the ranking. The optimalRiskBalancing function finds the schedule that truly minimizes the risk-balancing
+metric by branch and bound, which is used to report how far the greedy schedule is from the optimum.
+"""
+
+import functools
+import math
+import numpy as np
+
+
+class DailySchedule(object):
+
+    @staticmethod
+    def evaluate(netRateOfEnergyIntake, grossRateOfEnergyIntake, focalSwimmingCostRate, captureManeuverCostRate, hourlyRisk, allowed,
+                 strategy, maxHoursFeedingIsAllowed, Cmax, mass, dailyRiskScaleConstant):
+        """ All hourly inputs are arrays with shape (cells, 24) in chronological order, with rates in J/s. The 'allowed' array is
+            True for hours in which the model was run and foraging is allowed; values in other hours are ignored. Cmax (g/g/day) and
+            mass (g) may be scalars or arrays with one value per cell. Returns a dictionary of daily totals with one value per cell,
+            plus 'actuallyForaged' and 'proportionOfHourForaged' arrays with shape (cells, 24) in chronological order. """
+        netRate = np.atleast_2d(np.asarray(netRateOfEnergyIntake, dtype=float))
+        nCells, nHours = netRate.shape
+        grossRate = np.atleast_2d(np.asarray(grossRateOfEnergyIntake, dtype=float))
+        focalCostRate = np.atleast_2d(np.asarray(focalSwimmingCostRate, dtype=float))
+        maneuverCostRate = np.atleast_2d(np.asarray(captureManeuverCostRate, dtype=float))
+        costRate = focalCostRate + maneuverCostRate
+        risk = np.broadcast_to(np.asarray(hourlyRisk, dtype=float), netRate.shape)
+        allowed = np.broadcast_to(np.asarray(allowed, dtype=bool), netRate.shape)
+        Cmax = np.broadcast_to(np.asarray(Cmax, dtype=float), (nCells,))[:, None]
+        mass = np.broadcast_to(np.asarray(mass, dtype=float), (nCells,))[:, None]
+        # ----------------------------------------------------------------------------------------------------------
+        # Rank the allowed hours in each cell in descending order of preference according to the fish's strategy.
+        # Disallowed hours are ranked last. The sort is stable, so ties keep chronological order.
+        # ----------------------------------------------------------------------------------------------------------
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if strategy == 0:  # Efficiency maximizing: descending by NREI/SC
+                sortKey = -(netRate / costRate)
+            elif strategy == 1:  # Risk balancing: ascending by risk/NREI ratio
+                sortKey = risk / netRate
+            else:
+                sortKey = np.zeros(netRate.shape)
+        order = np.lexsort((sortKey, ~allowed), axis=1)
+        rankedAllowed = np.take_along_axis(allowed, order, axis=1)
+        rankedNetRate = np.take_along_axis(netRate, order, axis=1)
+        rankedGrossRate = np.take_along_axis(grossRate, order, axis=1)
+        rankedCostRate = np.take_along_axis(costRate, order, axis=1)
+        rankedRisk = np.take_along_axis(risk, order, axis=1)
+        # ----------------------------------------------------------------------------------------------------------
+        # Find the first ranked hour in which each fish stops foraging. Because hours are ranked by desirability, it
+        # doesn't forage in any of the hours after that one either.
+        # ----------------------------------------------------------------------------------------------------------
+        hourlySpecificConsumption = (rankedGrossRate / 3626) * 3600 / mass  # g/g/hour, as in DriftForager.specificConsumptionRate
+        hourlySpecificConsumption = np.where(rankedAllowed, hourlySpecificConsumption, 0)
+        consumptionBeforeHour = np.minimum(np.cumsum(hourlySpecificConsumption, axis=1) - hourlySpecificConsumption, Cmax)
+        rank = np.arange(nHours)[None, :]
+        stops = ~rankedAllowed | (rank + 1 > maxHoursFeedingIsAllowed) | (rankedGrossRate < rankedCostRate) | (consumptionBeforeHour >= Cmax)
+        if strategy == 1:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                cumulativeRisk = 1 - np.cumprod(np.where(rankedAllowed, 1 - rankedRisk, 1), axis=1)
+                cumulativeNetRate = np.cumsum(np.where(rankedAllowed, rankedNetRate, 0), axis=1)
+                riskMetric = (dailyRiskScaleConstant + cumulativeRisk) / cumulativeNetRate
+            stops[:, 1:] |= riskMetric[:, 1:] > riskMetric[:, :-1]
+        firstStop = np.where(stops.any(axis=1), stops.argmax(axis=1), nHours)
+        rankedForaged = rank < firstStop[:, None]
+        # ----------------------------------------------------------------------------------------------------------
+        # Total up the day's foraging, including only the part of the hour needed to reach Cmax in the hour when the
+        # fish fills up.
+        # ----------------------------------------------------------------------------------------------------------
+        with np.errstate(divide='ignore', invalid='ignore'):
+            partialHour = (Cmax - consumptionBeforeHour) / hourlySpecificConsumption
+        rankedProportion = np.where(consumptionBeforeHour + hourlySpecificConsumption <= Cmax, 1.0, partialHour)
+        rankedProportion = np.where(rankedForaged, rankedProportion, 0.0)
+        dailyGrossEnergyIntake = (rankedGrossRate * 3600 * rankedProportion).sum(axis=1)
+        dailyCost = (rankedCostRate * 3600 * rankedProportion).sum(axis=1)
+        dailyFocalSwimmingCost = (np.take_along_axis(focalCostRate, order, axis=1) * 3600 * rankedProportion).sum(axis=1)
+        dailyCaptureManeuverCost = (np.take_along_axis(maneuverCostRate, order, axis=1) * 3600 * rankedProportion).sum(axis=1)
+        dailySpecificConsumption = (hourlySpecificConsumption * rankedProportion).sum(axis=1)
+        dailyHoursForaging = rankedProportion.sum(axis=1)
+        dailyNetEnergyIntake = dailyGrossEnergyIntake - dailyCost
+        dailyRisk = 1 - np.prod(np.where(rankedForaged, 1 - rankedRisk, 1), axis=1)  # the partial hour counts fully toward risk
+        with np.errstate(divide='ignore', invalid='ignore'):
+            dailyRiskBalancingMetric = (dailyRiskScaleConstant + dailyRisk) / dailyNetEnergyIntake
+        # Put the per-hour values back in chronological order for diagnostics
+        inverseOrder = np.argsort(order, axis=1)
+        return {'dailyNetEnergyIntake': dailyNetEnergyIntake,
+                'dailyGrossEnergyIntake': dailyGrossEnergyIntake,
+                'dailyCost': dailyCost,
+                'dailyHoursForaging': dailyHoursForaging,
+                'dailyFocalSwimmingCost': dailyFocalSwimmingCost,
+                'dailyCaptureManeuverCost': dailyCaptureManeuverCost,
+                'dailyRisk': dailyRisk,
+                'dailyRiskBalancingMetric': dailyRiskBalancingMetric,
+                'dailySpecificConsumption': dailySpecificConsumption,
+                'dailySpecificConsumptionProportional': dailySpecificConsumption / Cmax[:, 0],
+                'actuallyForaged': np.take_along_axis(rankedForaged, inverseOrder, axis=1),
+                'proportionOfHourForaged': np.take_along_axis(rankedProportion, inverseOrder, axis=1)}
+
+    @staticmethod
+    def optimalRiskBalancing(hourlyMetrics, maxHoursFeedingIsAllowed, Cmax, mass, dailyRiskScaleConstant, incumbentProportions=None, maxNodes=100000):
+        """ Finds the foraging schedule that minimizes the risk-balancing metric (dailyRiskScaleConstant + daily risk) / DNEI for one
+            cell, given its (24 x DailyRunResult.HOURLY_METRICS) array of hourly metrics, with NaN in hours in which foraging isn't
+            allowed. As in the greedy schedule, the fish forages in at most
+            maxHoursFeedingIsAllowed hours, its consumption can't exceed Cmax, and an hour in which it forages only part of the time to
+            reach Cmax still counts fully toward risk. For any set of hours, the energy intake under the Cmax limit is maximized by
+            foraging fully in the hours with the highest ratio of NREI to consumption, so at most one hour is partial.
+
+            The search is a depth-first branch and bound over including or excluding each hour. Hours are explored in the order given
+            by risk_metric_compare, so good schedules are found early, and the search starts from the greedy schedule (given as a dict
+            of {hour: proportion of hour foraged}) as the best known solution. A branch is pruned when a lower bound on the metric of
+            every schedule it contains is no better than the best known solution. The bound assumes that adding m more hours adds the m
+            smallest remaining risks and the m largest remaining NREIs, with intake limited by Cmax times the best NREI/consumption ratio.
+
+            If the search visits more than maxNodes branches, it stops and the result is not guaranteed to be optimal, but the returned
+            'lowerBound' is still a proven lower bound on the optimal metric. Returns a dictionary with the 'metric', 'lowerBound',
+            'isExact', 'dailyNetEnergyIntake', and 'dailyRisk' of the best schedule found, and its 'proportions' as {hour: proportion}. """
+        from DriftModelRT.DriftForager import risk_metric_compare  # imported here because DriftForager imports this module
+        from DriftModelRT.DailyRunResult import DailyRunResult
+        k = dailyRiskScaleConstant
+        maxHours = int(maxHoursFeedingIsAllowed)
+        netRate, grossRate, hourlyRisk = (hourlyMetrics[:, DailyRunResult.HOURLY_METRICS.index(metric)].tolist() for metric in ('netRateOfEnergyIntake', 'grossRateOfEnergyIntake', 'hourlyRisk'))
+        hours = [hour for hour in range(len(netRate)) if netRate[hour] > 0]  # other hours add risk without adding DNEI, and disallowed hours are NaN
+        if len(hours) > 1:
+            otherRisk = 1 - np.prod([1 - hourlyRisk[hour] for hour in hours])
+            otherDNEI = sum(netRate[hour] for hour in hours)
+            compare = functools.partial(risk_metric_compare, other_risk=otherRisk, other_DNEI=otherDNEI, risk_0=k)
+            hours.sort(key=functools.cmp_to_key(lambda a, b: compare((hourlyRisk[a], netRate[a]), (hourlyRisk[b], netRate[b]))), reverse=True)
+        nrei = [netRate[hour] * 3600 for hour in hours]  # J gained by foraging the whole hour
+        consumption = [(grossRate[hour] / 3626) * 3600 / mass for hour in hours]  # g/g consumed by foraging the whole hour
+        hazard = [-math.log(1 - hourlyRisk[hour]) if hourlyRisk[hour] < 1 else math.inf for hour in hours]  # daily risk is 1 - exp(-total hazard)
+        nCandidates = len(hours)
+
+        def metricOf(riskHazard, dnei):
+            return (k + 1 - math.exp(-riskHazard)) / dnei if dnei > 0 else math.inf
+
+        def cappedIntake(included):
+            """ Returns the DNEI and proportion of each hour foraged for the given candidate indices, filling the Cmax limit with the
+                hours that have the best ratio of NREI to consumption first. """
+            remaining = Cmax
+            dnei = 0
+            proportions = {}
+            for i in sorted(included, key=lambda i: nrei[i] / consumption[i], reverse=True):
+                proportion = min(1, max(remaining, 0) / consumption[i])
+                proportions[hours[i]] = proportion
+                dnei += nrei[i] * proportion
+                remaining -= consumption[i] * proportion
+            return dnei, proportions
+
+        # Precompute, for each position in the search order, the cumulative sums of the smallest remaining hazards and largest
+        # remaining NREIs, from which the lower bound for any number of added hours is read directly.
+        smallestHazardSums = []
+        largestNREISums = []
+        for position in range(nCandidates + 1):
+            smallestHazardSums.append(np.concatenate(([0], np.cumsum(sorted(hazard[position:])))).tolist())
+            largestNREISums.append(np.concatenate(([0], np.cumsum(sorted(nrei[position:], reverse=True)))).tolist())
+        intakeLimit = Cmax * max((nrei[i] / consumption[i] for i in range(nCandidates)), default=0)
+
+        def lowerBound(position, count, riskHazard, dnei):
+            bound = math.inf
+            for m in range(min(maxHours - count, nCandidates - position) + 1):
+                bestDNEI = min(dnei + largestNREISums[position][m], intakeLimit)
+                if bestDNEI > 0:
+                    bound = min(bound, (k + 1 - math.exp(-(riskHazard + smallestHazardSums[position][m]))) / bestDNEI)
+            return bound
+
+        best = {'metric': math.inf, 'dailyNetEnergyIntake': 0, 'dailyRisk': 0, 'proportions': {}}
+        if incumbentProportions is not None:
+            foraged = [hour for hour, proportion in incumbentProportions.items() if proportion > 0]
+            incumbentDNEI = sum(netRate[hour] * 3600 * incumbentProportions[hour] for hour in foraged)
+            incumbentHazard = sum(-math.log(1 - hourlyRisk[hour]) if hourlyRisk[hour] < 1 else math.inf for hour in foraged)
+            best = {'metric': metricOf(incumbentHazard, incumbentDNEI), 'dailyNetEnergyIntake': incumbentDNEI,
+                    'dailyRisk': 1 - math.exp(-incumbentHazard), 'proportions': dict(incumbentProportions)}
+        # Each branch is (next position in the search order, included candidate indices, total hazard, uncapped DNEI, consumption)
+        stack = [(0, (), 0.0, 0.0, 0.0)]
+        nodes = 0
+        unexploredBound = math.inf
+        while stack:
+            position, included, riskHazard, dnei, consumed = stack.pop()
+            bound = lowerBound(position, len(included), riskHazard, dnei)
+            if bound >= best['metric']:
+                continue
+            nodes += 1
+            if nodes > maxNodes:
+                unexploredBound = min(unexploredBound, bound)
+                continue
+            if consumed <= Cmax:
+                cappedDNEI, proportions = dnei, {hours[i]: 1 for i in included}
+            else:
+                cappedDNEI, proportions = cappedIntake(included)
+            metric = metricOf(riskHazard, cappedDNEI)
+            if metric < best['metric']:
+                best = {'metric': metric, 'dailyNetEnergyIntake': cappedDNEI, 'dailyRisk': 1 - math.exp(-riskHazard), 'proportions': proportions}
+            if position == nCandidates or len(included) == maxHours:
+                continue
+            # Push the exclusion branch first so the inclusion branch, which follows the preferred order, is explored first
+            stack.append((position + 1, included, riskHazard, dnei, consumed))
+            stack.append((position + 1, included + (position,), riskHazard + hazard[position], dnei + nrei[position], consumed + consumption[position]))
+        best['lowerBound'] = min(best['metric'], unexploredBound)
+        best['isExact'] = (unexploredBound >= best['metric'])
+        return best
@@ -1,31 +1,28 @@
 # -*- coding: utf-8 -*-
 
+from copy import deepcopy
 import numpy as np
 import functools
-from copy import deepcopy
+from scipy.optimize import minimize
 from DriftModelRT.SingleModelResult import SingleModelResult
 from DriftModelRT.SingleModelResult import EmptySingleModelResult
 from DriftModelRT.CalculationGrid import CalculationGrid
 from DriftModelRT.TransectCalculationGrid import TransectCalculationGrid
-from DriftModelRT.PreyType import PreyType
 from DriftModelRT.DailyRunResult import DailyRunResult
-
-import datetime
-import pytz
-from pysolar.solar import get_altitude
-from pysolar.radiation import get_radiation_direct
-from timezonefinder import TimezoneFinder
-import os
-import csv
+from DriftModelRT.DailySchedule import DailySchedule
+from DriftModelRT.DailyScenario import DailyScenario
 
 # Note: to install dependencies for daily calculations, run the following:
-# conda install -c conda-forge pysolar
 # conda install -c conda-forge timezonefinder
 # conda install -c conda-forge pytz
 
+# Columns of the per-prey array returned by DriftForager.preyIntegrals. Each is a total per unit of searching time, weighted by encounter rate.
+PREY_INTEGRAL_COLUMNS = ('encountered', 'ingested', 'handlingTime', 'captureManeuverCost', 'reactionDistance')
+
 def risk_metric_compare(hour_a, hour_b, other_risk=None, other_DNEI=None, risk_0=None):
     """ This function compares the relevant characteristics of two possible hours the fish could forage, hour A and hour B,
-        to determine which is better for minimizing the metric (risk_0 + daily_risk) / DNEI.
+        to determine which is better for minimizing the metric (risk_0 + daily_risk) / DNEI. Each hour is given as a pair of its
+        (hourly risk, NREI), e.g. from the columns of a DailyRunResult's hourly metrics.
 
         The constant risk_0 is included to prevent excessive sensitivity of the combined habitat quality metric to minor variations
         in risk when risk is very low. If we had purely used daily_risk / DNEI, this metric of habitat quality could easily
@@ -46,10 +43,8 @@ def risk_metric_compare(hour_a, hour_b, other_risk=None, other_DNEI=None, risk_0
         This function returns -1 if a < b, 0 if a == b, and 1 if a > b, to fit the definition of a comparison function in Python.
 
         Note that the last 3 parameters with defaults aren't actually optional, but are specified later using functools.partial"""
-    risk_a = hour_a.hourlyRisk
-    NREI_a = hour_a.netRateOfEnergyIntake
-    risk_b = hour_b.hourlyRisk
-    NREI_b = hour_b.netRateOfEnergyIntake
+    risk_a, NREI_a = hour_a
+    risk_b, NREI_b = hour_b
     if risk_a == risk_b and NREI_a == NREI_b:
         return 0
     a_is_better = other_risk * ((other_DNEI + NREI_b) * risk_a - (other_DNEI + NREI_a) * risk_b) > (1 + risk_0) * (NREI_b - NREI_a)  # boolean
@@ -64,6 +59,7 @@ class DriftForager(object):
         self.ui = ui  # the main program user interface; should be minimally referenced here except to send status messages
         self.mass = mass  # mass in grams
         self.forkLength = forkLength  # fork length in cm
+        self.preyLabelsByValue = {}  # tuples of prey type labels given to results, so all the results of a run share one tuple
         if preyTypes is not None:  # pass preyTypes = None to initialize the forager and set prey types later, i.e. for batch runs with different prey type files
             self.filterPreyTypes(preyTypes)  # array of PreyType objects, filtered based on mouth gape / gill raker limitations
         self.waterTemperature = waterTemperature  # water temperature in degrees C
@@ -84,6 +80,61 @@ class DriftForager(object):
         self.hourlyDriftMultiplier = 1  # multiplier optionally used in hourly analyses to reflect time-varying drift; set to 1 for no effect
         self.status("Initialized the DriftForager object.")
 
+    SETTINGS = ('mass', 'forkLength', 'waterTemperature', 'turbidity', 'basePreyDetectionProbability', 'reactionDistanceMultiplier', 'focalVelocityScaler',
+                'focalDepthSpec', 'focalDepthMethod', 'velocityProfileMethod', 'swimmingCostSubmodel', 'turbulenceAdjustment', 'assimilationMethod', 'roughness')
+
+    def settings(self):
+        """ Returns the forager's constructor arguments (other than the user interface and prey types) as a dictionary of plain values,
+            from which fromSettings can build an equivalent forager, for example in another process. """
+        return {name: getattr(self, name) for name in DriftForager.SETTINGS}
+
+    @staticmethod
+    def fromSettings(settings, preyTypes, ui=None, **overrides):
+        """ Builds a forager from a dictionary returned by settings(), with any settings given as keyword arguments replaced. The prey
+            types should be unfiltered, because they're filtered (and partly trimmed in place) for the new forager's size. """
+        settings = dict(settings, **overrides)
+        return DriftForager(ui, preyTypes, *(settings[name] for name in DriftForager.SETTINGS))
+
+    @staticmethod
+    def runPoints(settings, preyTypes, scenario, points, shouldOptimizeDiet, gridSize, transectInterpolations=None):
+        """ Builds a forager from settings() and runs the model at each point, a (depth, velocity, positionOnTransect, transectLabel)
+            tuple in which the last two are None except for transect runs. The daily model is run if a DailyScenario is given, and
+            the instantaneous model otherwise. All points share one forager, so its cached calculations are reused between them.
+            This is a static method taking only plain data so batch points can be run in worker processes. """
+        forager = DriftForager.fromSettings(settings, deepcopy(preyTypes))  # copied because filtering trims prey types in place
+        results = []
+        for depth, velocity, positionOnTransect, transectLabel in points:
+            forager.positionOnTransect = positionOnTransect
+            interpolations = transectInterpolations[transectLabel] if transectInterpolations is not None else None
+            if scenario is None:
+                results.append(forager.runForagingModel(depth, velocity, shouldOptimizeDiet, gridSize, interpolations))
+            else:
+                results.append(forager.runDailyModel(depth, velocity, shouldOptimizeDiet, gridSize, interpolations, scenario))
+        return results
+
+    @staticmethod
+    def sweepTransect(settings, preyTypes, transectInterpolations, interval, shouldOptimizeDiet, gridSize):
+        """ Builds a forager from settings() and runs runTransectSweep on one transect. This is a static method taking only plain
+            data so transects can be swept in worker processes. """
+        forager = DriftForager.fromSettings(settings, deepcopy(preyTypes))
+        return forager.runTransectSweep(transectInterpolations, interval, shouldOptimizeDiet, gridSize)
+
+    @staticmethod
+    def searchTransect(settings, preyTypes, transectInterpolations, coarseInterval, tolerance, count, shouldOptimizeDiet, gridSize, focalDepthSpecs=None):
+        """ Builds a forager from settings() and runs findTransectOptima on one transect, once for each of the focal depth specifications
+            given (in the units of the forager's focal depth method), or just for its own focal depth if there are none. Returns the best
+            optima across all the focal depths (at most count of them), in descending order of NREI, and the total number of model
+            evaluations used. This is a static method taking only plain data so transects can be searched in worker processes. """
+        optima = []
+        evaluations = 0
+        for focalDepthSpec in focalDepthSpecs if focalDepthSpecs else [settings['focalDepthSpec']]:
+            forager = DriftForager.fromSettings(settings, deepcopy(preyTypes), focalDepthSpec=focalDepthSpec)
+            focalDepthOptima, focalDepthEvaluations = forager.findTransectOptima(transectInterpolations, coarseInterval, tolerance, count, shouldOptimizeDiet, gridSize)
+            optima.extend(focalDepthOptima)
+            evaluations += focalDepthEvaluations
+        optima.sort(key=lambda optimum: -optimum['result'].netRateOfEnergyIntake)
+        return optima[:count], evaluations
+
     def filterPreyTypes(self, preyTypes):
         """ This filters prey types to sizes appropriate to the current fish given its mouth gape and gill raker limitations. It's based on
             equations from Wankowski (1979) as adapted by Hayes et al (2000) and used by Hayes et al (2016) with some adjustments for the prey
@@ -93,25 +144,31 @@ class DriftForager(object):
             And if a prey class is partially within and partially outside the constraints, its drift density is adjusted to the proportion that
             falls within the constraints, and its size, energy, etc, are adjusted to reflect that proportion.
             """
+        self.preyTypes = self.filteredPreyTypes(preyTypes)
+
+    def filteredPreyTypes(self, preyTypes):
+        """ Returns the prey types filtered as described in filterPreyTypes, without making them the forager's own prey types. This
+            is used for prey types that only apply to some hours of a daily run. Note that partially excluded types are trimmed in place. """
         minPreyLength = 0.115 * self.forkLength  # min prey length in mm, based on gill raker size
         maxPreyLength = 1.05 * self.forkLength * 4.3  # max prey length in mm, based on mouth gape
-        self.preyTypes = []
+        filteredPreyTypes = []
         numPreyTypesTrimmed = 0
         for preyType in preyTypes:
             if preyType.minLength > minPreyLength and preyType.maxLength < maxPreyLength:  # if the prey type fits totally within the size constraints
-                self.preyTypes.append(preyType)
+                filteredPreyTypes.append(preyType)
             elif preyType.minLength < minPreyLength and preyType.maxLength > minPreyLength:  # if the prey type overlaps the minimum size constraint
                 numPreyTypesTrimmed += 1
                 preyType.trimToSize(minPreyLength, preyType.maxLength)
-                self.preyTypes.append(preyType)
+                filteredPreyTypes.append(preyType)
             elif preyType.maxLength > maxPreyLength and preyType.minLength < maxPreyLength:  # if the prey type overlaps the maximum size constraint
                 numPreyTypesTrimmed += 1
                 preyType.trimToSize(preyType.minLength, maxPreyLength)
-                self.preyTypes.append(preyType)
-        numPreyTypesExcluded = len(preyTypes) - len(self.preyTypes)
-        self.preyTypes.sort(key=lambda x: x.energyContent)
+                filteredPreyTypes.append(preyType)
+        numPreyTypesExcluded = len(preyTypes) - len(filteredPreyTypes)
+        filteredPreyTypes.sort(key=lambda x: x.energyContent)
         if numPreyTypesExcluded > 0 or numPreyTypesTrimmed > 0:
             self.status("Excluded {0} and trimmed {3} prey types on due to gill raker (>{1:.2f} mm) or mouth gape (<{2:.2f} mm) constraints.".format(numPreyTypesExcluded, minPreyLength, maxPreyLength, numPreyTypesTrimmed))
+        return filteredPreyTypes
 
     # Note to future coders: functools.lru_cache() is a Python 'decorator' for use in 'memoizing' (not 'memorizing') results. It basically saves
     # the result of a function call so it doesn't have to be recalculated when called again with the same parameters. It vastly improves speed when 
@@ -193,6 +250,18 @@ class DriftForager(object):
         # self.status("Individual maneuver has swimming cost {0:.2f} based on swimming {3:.2f} s at unsteady velocity {1:.2f} for velocity {2:.2f} with turn cost factor {4:.2f}.".format(swimmingCost,unsteadyVelocity,gridCell['velocity'],totalTime,turnCostFactor))
         return (pursuitTime, swimmingCost)  # returned tuple contains the "handling time" (s) and energy cost (J) of one maneuver
 
+    def handlingStatsArrays(self, preyType, preyVelocities):
+        """ Same as handlingStats, but for an array of prey velocities at once, as used by transect sweeps. The cached swimmingCost
+            can't take arrays, so this calls the function it wraps, which works on arrays because the swimming cost submodels do. """
+        pursuitDistance = (2 / 3) * self.reactionDistance(preyType)
+        pursuitTime = pursuitDistance / preyVelocities
+        returnTime = pursuitDistance / self.optimalVelocity
+        unsteadyPursuitVelocity = np.sqrt(3.0 * preyVelocities ** 2)
+        unsteadyReturnVelocity = np.sqrt(3.0 * self.optimalVelocity ** 2)
+        turnCostFactor = 0.9601 * np.exp(0.022665 * preyVelocities)
+        swimmingCost = (pursuitTime * DriftForager.swimmingCost.__wrapped__(self, unsteadyPursuitVelocity) + returnTime * self.swimmingCost(unsteadyReturnVelocity)) * turnCostFactor
+        return pursuitTime, swimmingCost
+
     @functools.lru_cache(maxsize=2048)
     def swimmingCost(self, velocity):
         """ This function calls out to the selected swimming cost model. """
@@ -300,7 +369,7 @@ class DriftForager(object):
     def proportionOfEnergyAssimilated(self, energyIntakeRate):
         """ Calculates the proportion of the caloric content of the food source that can actually be assimilated and available for growth or other needs to
              the fish. The input energyIntakeRate should be in J/s, and needs to be converted in this function to something else."""
-        assimilationMethod = self.ui.cbAssimilationMethod.currentIndex()
+        assimilationMethod = self.assimilationMethod
         if assimilationMethod == 0:
             return 0.6  # Value from Tucker and Rasmussen 1999 and Hewett and Johnson 1992
         elif assimilationMethod == 1:
@@ -339,7 +408,7 @@ class DriftForager(object):
             S = SDA * (C - F)  # S is the assimilated energy lost to specific dynamic action, from page 2-5
             proportionAssimilated = (C - (F + U + S)) / C if C > 0 else 0  # proportion of consumed calories assimilated and available for respiration or growth
             if C > 0 and not 0 < proportionAssimilated < 1:
-                self.ui.status("Warning, bad assimilation: with C = {0:8.4f}, F = {1:8.4f}, U = {2:8.4f}, S = {3:8.4f}, and p = {5:4.4f}, fish is assimilating {4:4.4f}".format(C, F, U, S, proportionAssimilated, p))
+                self.status("Warning, bad assimilation: with C = {0:8.4f}, F = {1:8.4f}, U = {2:8.4f}, S = {3:8.4f}, and p = {5:4.4f}, fish is assimilating {4:4.4f}".format(C, F, U, S, proportionAssimilated, p))
             return proportionAssimilated
 
     def clear_caches(self):
@@ -352,266 +421,340 @@ class DriftForager(object):
         self.captureSuccess.cache_clear()
         self.maxDailyConsumption.cache_clear()
         self.specificConsumptionRate.cache_clear()
-        self.preyDetectionProbability.cache_clear()
 
-    def runForagingModel(self, waterDepth, meanColumnVelocity, shouldOptimizeDiet, gridSize=10, transectInterpolations=None, hour=None):
+    def runForagingModel(self, waterDepth, meanColumnVelocity, shouldOptimizeDiet, gridSize=10, transectInterpolations=None, roughness=None):
         """ This wrapper function simply calls the correct function from the two below based on whether diet optimization
-            is allowed (which is more computationally expensive) or not."""
+            is allowed (which is more computationally expensive) or not. The roughness of the focal position defaults to the
+            forager's own; positions on a transect give the transect's roughness there instead."""
         if shouldOptimizeDiet:
-            return self.runForagingModelWithDietOptimization(waterDepth, meanColumnVelocity, gridSize, transectInterpolations, hour)
+            return self.runForagingModelWithDietOptimization(waterDepth, meanColumnVelocity, gridSize, transectInterpolations, roughness)
         else:
-            return self.runForagingModelWithFixedDiet(waterDepth, meanColumnVelocity, gridSize, transectInterpolations, hour)
+            return self.runForagingModelWithFixedDiet(waterDepth, meanColumnVelocity, gridSize, transectInterpolations, roughness)
 
-    def runForagingModelWithFixedDiet(self, waterDepth, meanColumnVelocity, gridSize, transectInterpolations, hour):
+    def runForagingModelWithFixedDiet(self, waterDepth, meanColumnVelocity, gridSize, transectInterpolations, roughness=None):
         """ Calculates net rate of energy intake and lots of other internal/diagnostic measures. The 'total' variables
             calculated here are totals across all prey types and grid cells per unit (second) of searching time.
              """
-        if waterDepth <= 0 or meanColumnVelocity <= 0:
-            return EmptySingleModelResult(waterDepth, meanColumnVelocity, self.preyTypes)
+        integrals = self.preyIntegrals(waterDepth, meanColumnVelocity, gridSize, transectInterpolations, roughness=roughness)
+        return self.resultFromPreyIntegrals(waterDepth, meanColumnVelocity, self.preyTypes, integrals, False, self.basePreyDetectionProbability, self.hourlyDriftMultiplier)
+
+    def runForagingModelWithDietOptimization(self, waterDepth, meanColumnVelocity, gridSize, transectInterpolations, roughness=None):
+        """ Applies the logic of Charnov's optimal diet model, looping through prey types and discarding them if it
+            turns out the NREI would be higher without them than with them. The optimization itself is done on the
+            per-prey integrals in resultFromPreyIntegrals, so the grids are only integrated once."""
+        integrals = self.preyIntegrals(waterDepth, meanColumnVelocity, gridSize, transectInterpolations, roughness=roughness)
+        return self.resultFromPreyIntegrals(waterDepth, meanColumnVelocity, self.preyTypes, integrals, True, self.basePreyDetectionProbability, self.hourlyDriftMultiplier)
+
+    def runTransectSweep(self, transectInterpolations, interval, shouldOptimizeDiet, gridSize):
+        """ Runs the instantaneous model for a fish at every interval (cm) along a transect, from its first measured position to its
+            last, and returns the positions (cm) and a list with one result per position. The depth, velocity, and roughness at each
+            position are interpolated from the transect. Rather than building a separate grid for every position, the water columns
+            along the transect are built once per prey type (see TransectCalculationGrid.sweepCells), along with the encounter rates
+            and handling costs of their cells, and each position's integrals are summed from the columns within its reach. """
+        profile = transectInterpolations
+        positions = np.arange(profile['positions'][0], profile['positions'][-1] + 1e-9, interval)
+        depths, velocities, roughnesses = (np.interp(positions, profile['positions'], profile[name], left=0, right=0) for name in ('depth', 'velocity', 'roughness'))
+        canForage = (depths > 0) & (velocities > 0)
+        focalDepths = np.array([self.focalDepth(depth) if isWet else 0 for depth, isWet in zip(depths, canForage)])
+        totals = np.zeros((len(positions), len(self.preyTypes), len(PREY_INTEGRAL_COLUMNS)))
+        for i, preyType in enumerate(self.preyTypes):
+            cells, offsets = TransectCalculationGrid.sweepCells(profile, positions, self.reactionDistance(preyType), focalDepths, self.velocityProfileMethod, gridSize)
+            encounterRate = cells['area'] * cells['velocity'] * (preyType.driftDensity * 1e-6)  # 1e-6 converts prey/m^3 to prey/cm^3
+            handlingTime, captureManeuverCost = self.handlingStatsArrays(preyType, cells['velocity'])
+            for positionIndex, cellIndex, distance in offsets:
+                captureSuccess = DriftForager.captureSuccess.__wrapped__(self, preyType, cells['velocity'][cellIndex], distance)
+                cellEncounterRate = encounterRate[cellIndex]
+                for column, weights in enumerate((cellEncounterRate, cellEncounterRate * captureSuccess, cellEncounterRate * handlingTime[cellIndex],
+                                                  cellEncounterRate * captureManeuverCost[cellIndex], cellEncounterRate * distance)):
+                    totals[:, i, column] += np.bincount(positionIndex, weights=weights, minlength=len(positions))
+        results = []
+        for j in range(len(positions)):
+            integrals = {'preyTotals': totals[j], 'focalSwimmingCost': self.focalSwimmingCost(depths[j], velocities[j], roughnesses[j])} if canForage[j] else None
+            results.append(self.resultFromPreyIntegrals(depths[j], velocities[j], self.preyTypes, integrals, shouldOptimizeDiet, self.basePreyDetectionProbability, self.hourlyDriftMultiplier))
+        return positions, results
+
+    def findTransectOptima(self, transectInterpolations, coarseInterval, tolerance, count, shouldOptimizeDiet, gridSize):
+        """ Finds the focal positions with the highest NREI on a transect, returning a list of up to count local optima in descending
+            order of NREI, each a dictionary with the position (cm), focalDepthSpec, and model result there, along with the number of
+            positions at which the model was evaluated.
+
+            The search is coarse-to-fine. First the transect is swept at coarseInterval (cm) with runTransectSweep, which shares the
+            water column calculations between neighboring positions, and the positions whose NREI is at least that of both neighbors
+            are taken as candidates. The count best candidates are then refined by golden-section search over the interval between
+            their neighbors, running the model at single positions (whose grids are cached in TransectCalculationGrid) until the
+            bracket is narrower than tolerance (cm). NREI is rarely unimodal along a whole transect, but the coarse sweep separates
+            the peaks, and it is nearly always unimodal within one coarse interval of a peak. Both stages use the transect's own
+            roughness at each position, and the best candidate is re-run at a single position to check that they agree. """
+        profile = transectInterpolations
+        positions, sweepResults = self.runTransectSweep(profile, coarseInterval, shouldOptimizeDiet, gridSize)
+        evaluations = len(positions)
+        nrei = np.array([result.netRateOfEnergyIntake for result in sweepResults])
+        isWet = np.array([result.depth > 0 and result.velocity > 0 for result in sweepResults])
+        padded = np.concatenate(([-np.inf], nrei, [-np.inf]))
+        candidates = np.flatnonzero(isWet & (nrei > padded[:-2]) & (nrei >= padded[2:]))
+        candidates = candidates[np.argsort(-nrei[candidates], kind='stable')][:count]
+        evaluated = {}
+
+        def evaluate(position):
+            if position not in evaluated:
+                self.positionOnTransect = position
+                depth, velocity, roughness = (np.interp(position, profile['positions'], profile[name], left=0, right=0) for name in ('depth', 'velocity', 'roughness'))
+                evaluated[position] = self.runForagingModel(depth, velocity, shouldOptimizeDiet, gridSize, profile, roughness=roughness)  # the transect's roughness, as in runTransectSweep
+            return evaluated[position].netRateOfEnergyIntake
+
+        if len(candidates) > 0:  # the refinement must use the same model as the sweep, so the best candidate is checked against it
+            sweepNREI, singleNREI = nrei[candidates[0]], evaluate(positions[candidates[0]])
+            if not np.isclose(sweepNREI, singleNREI, rtol=1e-6, atol=1e-12):
+                self.status("Warning: NREI from the transect sweep ({0:.6f} J/s) differs from a single-position run ({1:.6f} J/s) at position {2:.1f} cm on transect {3}.".format(
+                    sweepNREI, singleNREI, positions[candidates[0]], profile['label']))
+        invPhi = (np.sqrt(5) - 1) / 2
+        optima = []
+        for i in candidates:
+            a, b = positions[max(i - 1, 0)], positions[min(i + 1, len(positions) - 1)]
+            c, d = b - invPhi * (b - a), a + invPhi * (b - a)
+            fc, fd = evaluate(c), evaluate(d)
+            while b - a > tolerance:
+                if fc >= fd:
+                    b, d, fd = d, c, fc
+                    c = b - invPhi * (b - a)
+                    fc = evaluate(c)
+                else:
+                    a, c, fc = c, d, fd
+                    d = a + invPhi * (b - a)
+                    fd = evaluate(d)
+            best = c if fc >= fd else d
+            if all(abs(best - optimum['position']) > tolerance for optimum in optima):  # neighboring candidates can converge on the same peak
+                optima.append({'position': best, 'focalDepthSpec': self.focalDepthSpec, 'result': evaluated[best]})
+        self.positionOnTransect = None
+        optima.sort(key=lambda optimum: -optimum['result'].netRateOfEnergyIntake)
+        return optima, evaluations + len(evaluated)
+
+    def findMaximumNetEnergyIntake(self, depthRange, velocityRange, shouldOptimizeDiet, gridSize, scenario=None, tolerance=0.1, scanCount=8, seedCount=3):
+        """ Finds the maximum NREI over continuous depths (cm) and velocities (cm/s) within the given (min, max) ranges, or the maximum
+            DNEI if a DailyScenario is given, returning a dictionary with the 'depth', 'velocity', 'value', and 'result' at the optimum
+            and the number of model 'evaluations' used.
+
+            The model is first run on a coarse scanCount x scanCount lattice spanning the ranges, and a bounded Powell search is started
+            from each of the seedCount best lattice points, with depth and velocity rescaled to the unit square so one tolerance (cm or
+            cm/s) applies to both. Several seeds guard against the search settling on a local bump, since the discrete calculation grids
+            make the surface slightly jagged at scales finer than the grid size. The lattice maximum is kept if no search improves on it. """
+        evaluated = {}
+
+        def evaluate(depth, velocity):
+            key = (float(depth), float(velocity))
+            if key not in evaluated:
+                if scenario is None:
+                    result = self.runForagingModel(depth, velocity, shouldOptimizeDiet, gridSize)
+                else:
+                    hourlyResults = self.runDailyHours(depth, velocity, shouldOptimizeDiet, gridSize, None, scenario)
+                    result = self.dailyRunResults([depth], [velocity], [hourlyResults], scenario, False)[0]
+                evaluated[key] = result
+            result = evaluated[key]
+            return result.netRateOfEnergyIntake if scenario is None else result.dailyNetEnergyIntake
+
+        lower = np.array([depthRange[0], velocityRange[0]], dtype=float)
+        span = np.array([depthRange[1] - depthRange[0], velocityRange[1] - velocityRange[0]], dtype=float)
+        unitPoints = np.linspace(0, 1, scanCount)
+        scan = np.array([(u, v, evaluate(*(lower + span * (u, v)))) for u in unitPoints for v in unitPoints])
+        seeds = scan[np.argsort(-scan[:, 2], kind='stable')][:seedCount, :2]
+        xtol = tolerance / max(span.max(), tolerance)
+        for seed in seeds:
+            minimize(lambda x: -evaluate(*(lower + span * x)), seed, method='Powell', bounds=[(0, 1), (0, 1)], options={'xtol': xtol, 'ftol': 1e-5})
+        (depth, velocity), result = max(evaluated.items(), key=lambda item: item[1].netRateOfEnergyIntake if scenario is None else item[1].dailyNetEnergyIntake)
+        return {'depth': depth,
+                'velocity': velocity,
+                'value': result.netRateOfEnergyIntake if scenario is None else result.dailyNetEnergyIntake,
+                'result': result,
+                'evaluations': len(evaluated)}
+
+    def focalSwimmingCost(self, waterDepth, meanColumnVelocity, roughness=None):
+        """ Energy cost (J/s) of holding the focal position, which doesn't depend on the prey types or hour. The roughness defaults
+            to the forager's own; transect sweeps and searches give the roughness at each position instead. """
+        roughness = roughness if roughness is not None else self.roughness
+        focalVelocity = CalculationGrid.velocityAtDepth(self.velocityProfileMethod, self.focalDepth(waterDepth), waterDepth, meanColumnVelocity, roughness)
         if self.turbulenceAdjustment == 0:  # No turbulence adjustment applied
-            totalFocalSwimmingCost = self.swimmingCost(CalculationGrid.velocityAtDepth(self.velocityProfileMethod, self.focalDepth(waterDepth), waterDepth, meanColumnVelocity, self.roughness))
+            return self.swimmingCost(focalVelocity)
         elif self.turbulenceAdjustment == 1:  # Webb (1991) factor applied to increase costs due to unsteady focal swimming in turbulent flows
-            totalFocalSwimmingCost = self.swimmingCost(np.sqrt(3 * CalculationGrid.velocityAtDepth(self.velocityProfileMethod, self.focalDepth(waterDepth), waterDepth, meanColumnVelocity, self.roughness) ** 2))
-        totalEnergyIntake = 0
-        totalCaptureManeuverCost = 0
-        totalHandlingTime = 0
-        totalPreyIngested = 0
-        totalPreyEncountered = 0
-        totalReactionDistance = 0
-        for preyType in self.preyTypes:
+            return self.swimmingCost(np.sqrt(3 * focalVelocity ** 2))
+
+    def preyIntegrals(self, waterDepth, meanColumnVelocity, gridSize, transectInterpolations, preyTypes=None, roughness=None):
+        """ Integrates each prey type's foraging quantities over its calculation grid, per unit (second) of searching time, for a
+            detection probability and drift multiplier of 1. Hours of a daily run differ only through those two factors, which scale
+            these integrals linearly (see resultFromPreyIntegrals), so the grids only need to be integrated once per depth/velocity.
+            Returns None if the fish can't forage at this depth and velocity, otherwise a dictionary holding the focal swimming cost
+            and an array with one row per prey type (self.preyTypes unless others are given) and the columns in PREY_INTEGRAL_COLUMNS.
+            The roughness, if given, replaces the forager's own in the focal swimming cost. """
+        if waterDepth <= 0 or meanColumnVelocity <= 0:
+            return None
+        preyTypes = preyTypes if preyTypes is not None else self.preyTypes
+        totals = np.zeros((len(preyTypes), len(PREY_INTEGRAL_COLUMNS)))
+        for i, preyType in enumerate(preyTypes):
             if transectInterpolations == None:
                 grid = CalculationGrid(self.reactionDistance(preyType), self.focalDepth(waterDepth), waterDepth, meanColumnVelocity, self.velocityProfileMethod, gridSize, self.roughness)
             else:
                 grid = TransectCalculationGrid(transectInterpolations, self.positionOnTransect, self.reactionDistance(preyType), self.focalDepth(waterDepth), self.velocityProfileMethod, gridSize)
-            preyType.ingestionCount = 0
+            encountered = ingested = handlingTime = captureManeuverCost = reactionDistance = 0
             for cell in grid.cells:
-                cell.captureSuccess = self.preyDetectionProbability(hour) * self.captureSuccess(preyType, cell.velocity, cell.distance)
-                cell.encounterRate = grid.symmetryFactor * cell.area * cell.velocity * (self.hourlyDriftMultiplier * preyType.driftDensity * 1e-6)  # 1e-6 converts prey/m^3 to prey/cm^3
-                handlingTime, captureManeuverCost = self.handlingStats(preyType, cell.velocity)
-                totalReactionDistance += cell.encounterRate * cell.distance
-                totalPreyEncountered += cell.encounterRate
-                totalPreyIngested += cell.encounterRate * cell.captureSuccess
-                preyType.ingestionCount += cell.encounterRate * cell.captureSuccess
-                totalEnergyIntake += cell.encounterRate * cell.captureSuccess * preyType.energyContent
-                totalHandlingTime += cell.encounterRate * handlingTime
-                totalCaptureManeuverCost += cell.encounterRate * captureManeuverCost
-        proportionAssimilated = self.proportionOfEnergyAssimilated(totalEnergyIntake / (1 + totalHandlingTime))
+                encounterRate = grid.symmetryFactor * cell.area * cell.velocity * (preyType.driftDensity * 1e-6)  # 1e-6 converts prey/m^3 to prey/cm^3
+                cellHandlingTime, cellCaptureManeuverCost = self.handlingStats(preyType, cell.velocity)
+                encountered += encounterRate
+                ingested += encounterRate * self.captureSuccess(preyType, cell.velocity, cell.distance)
+                handlingTime += encounterRate * cellHandlingTime
+                captureManeuverCost += encounterRate * cellCaptureManeuverCost
+                reactionDistance += encounterRate * cell.distance
+            totals[i] = (encountered, ingested, handlingTime, captureManeuverCost, reactionDistance)
+        return {'preyTotals': totals, 'focalSwimmingCost': self.focalSwimmingCost(waterDepth, meanColumnVelocity, roughness)}
+
+    def resultFromPreyIntegrals(self, waterDepth, meanColumnVelocity, preyTypes, integrals, shouldOptimizeDiet, detectionProbability=1, driftMultiplier=1):
+        """ Builds the model result from the integrals calculated by preyIntegrals for the given prey types. The drift multiplier
+            scales every encounter (and thus everything except focal swimming), and the detection probability additionally scales
+            capture success, so both can be applied to the precomputed totals instead of re-integrating the grids.
+
+            If shouldOptimizeDiet is True, this applies the logic of Charnov's optimal diet model, looping through prey types and
+            discarding them if it turns out the NREI would be higher without them than with them. Sometimes, a type might not be
+            removed at first, but later removals end up suggesting that removing the earlier one would have been beneficial as well.
+            For this reason, the 'while' loop runs through until the number of types has stabilized and they're all better to leave
+            in the optimal diet than to eliminate."""
+        preyLabels = self.sharedPreyLabels(preyTypes)
+        if integrals is None:
+            return EmptySingleModelResult(waterDepth, meanColumnVelocity, preyLabels)
+        scaledTotals = integrals['preyTotals'] * driftMultiplier
+        scaledTotals[:, PREY_INTEGRAL_COLUMNS.index('ingested')] *= detectionProbability
+        energyContents = np.array([preyType.energyContent for preyType in preyTypes])
+        focalSwimmingCost = integrals['focalSwimmingCost']
+        diet = list(range(len(preyTypes)))
+        if shouldOptimizeDiet:
+            endPreyTypeCount = None
+            startPreyTypeCount = len(diet)
+            while endPreyTypeCount != startPreyTypeCount:
+                startPreyTypeCount = len(diet)
+                for i in diet:
+                    nreiWithPreyType = self.netRateOfEnergyIntakeFromTotals(scaledTotals[diet], energyContents[diet], focalSwimmingCost)
+                    diet.remove(i)  # temporarily remove the prey type
+                    nreiWithoutPreyType = self.netRateOfEnergyIntakeFromTotals(scaledTotals[diet], energyContents[diet], focalSwimmingCost)
+                    if nreiWithPreyType > nreiWithoutPreyType: diet.insert(0, i)  # put it back in if it was beneficial
+                endPreyTypeCount = len(diet)
+        encountered, ingested, handlingTime, captureManeuverCost, reactionDistance = scaledTotals[diet].sum(axis=0) if len(diet) > 0 else np.zeros(len(PREY_INTEGRAL_COLUMNS))
+        preyIngestionCounts = np.zeros(len(preyTypes))
+        preyIngestionCounts[diet] = scaledTotals[diet, PREY_INTEGRAL_COLUMNS.index('ingested')]
+        totalEnergyIntake = (scaledTotals[diet, PREY_INTEGRAL_COLUMNS.index('ingested')] * energyContents[diet]).sum()
+        proportionAssimilated = self.proportionOfEnergyAssimilated(totalEnergyIntake / (1 + handlingTime))
         totalAssimilableEnergyIntake = totalEnergyIntake * proportionAssimilated
-        return SingleModelResult(waterDepth, meanColumnVelocity, self.preyTypes, totalHandlingTime, totalAssimilableEnergyIntake, totalReactionDistance, totalPreyEncountered, totalPreyIngested, totalCaptureManeuverCost, totalFocalSwimmingCost, proportionAssimilated)
-
-    def runForagingModelWithDietOptimization(self, waterDepth, meanColumnVelocity, gridSize, transectInterpolations, hour):
-        """ Applies the logic of Charnov's optimal diet model, looping through prey types and discarding them if it
-            turns out the NREI would be higher without them than with them. Sometimes, a type might not be removed
-            at first, but later removals end up suggesting that removing the earlier one would have been beneficial
-            as well. For this reason, the 'while' loop runs through until the number of types has stabilized and
-            they're all better to leave in the optimal diet than to eliminate."""
-        originalPreyTypes = deepcopy(self.preyTypes)
-        endPreyTypeCount = None
-        startPreyTypeCount = len(self.preyTypes)
-        while endPreyTypeCount != startPreyTypeCount:
-            startPreyTypeCount = len(self.preyTypes)
-            for preyType in self.preyTypes:
-                nreiWithPreyType = self.runForagingModelWithFixedDiet(waterDepth, meanColumnVelocity, gridSize, transectInterpolations, hour).netRateOfEnergyIntake
-                self.preyTypes.remove(preyType)  # temporarily remove the prey type
-                nreiWithoutPreyType = self.runForagingModelWithFixedDiet(waterDepth, meanColumnVelocity, gridSize, transectInterpolations, hour).netRateOfEnergyIntake
-                if nreiWithPreyType > nreiWithoutPreyType: self.preyTypes.insert(0, preyType)  # put it back in if it was beneficial
-            endPreyTypeCount = len(self.preyTypes)
-        result = self.runForagingModelWithFixedDiet(waterDepth, meanColumnVelocity, gridSize, transectInterpolations, hour)
-        self.preyTypes = deepcopy(originalPreyTypes)  # Restore the forager's prey type options for the next model run
-        return result
-
-    def predictedIllumination(self, hourOfDay):
-        """ Computes illumination in klux
-        Gets date as user input and time from the timeOfDay parameter
-        """
-        #todo improve comment documentation and function name here and for detection prob wilzbach below
-        latitude_deg = float(self.ui.leLatitude.text())  # positive in the northern hemisphere
-        longitude_deg = float(self.ui.leLongitude.text())  # negative reckoning west from prime meridian in Greenwich, England
-        monthAndDay = self.ui.deMonthAndDay.date()
-        timezone_name = TimezoneFinder().timezone_at(lng=longitude_deg, lat=latitude_deg)
-        timezone_object = pytz.timezone(timezone_name)
-        date = datetime.datetime(2000, monthAndDay.month(), monthAndDay.day(), hourOfDay, 0, 0, 0, tzinfo=timezone_object)
-        solar_altitude_deg = get_altitude(latitude_deg, longitude_deg, date)
-        irradiation_wm2 = get_radiation_direct(date, solar_altitude_deg)  # direct solar irradiation in watts/m2
-        # Note that 1000 W/m2 equals approximately 120,000 lux according to https://ieee-dataport.org/open-access/conversion-guide-solar-irradiance-and-lux-illuminance#:~:text=Solar%20Irradiance%20of%201%20Sun,m2)%20equals%20approximately%20120%2C000%20Lux.
-        # but this relationship can vary quite a bit.
-        irradiation_lux = irradiation_wm2 * 120  # applies the conversion above
-        return irradiation_lux
-
-    @functools.lru_cache(maxsize=2048)
-    def preyDetectionProbability(self, hourOfDay):
-        """ Wrapper for consideration of more complex prey detection functions later on; for now it just takes one input
-            and uses the light-based function."""
-        if hourOfDay is not None:
-            return self.basePreyDetectionProbability * self.lightSensitiveDetectionProbability(hourOfDay)
-        else:
-            return self.basePreyDetectionProbability
-
-    def lightSensitiveDetectionProbability(self, hourOfDay):
-        """ Returns the light-sensitive prey capture success from the field experiments of Wilzbach et al 1986 (Fig 4), being
-            interpreted here as detection probabilities, and based on large 7-10 mm Culicid prey. The same study found
-            detection probabilities substantially lower (by around 25 %) for small (3-5 mm) prey, but did not provide
-            a good framework or dataset to combine these effects and model both together. A better model of prey detection
-            is sorely needed, but considering light alone in this case is better than nothing.
-
-            This output is constrained to a max of 1 and a minimum set somewhat arbitrarily to 0.1. The regression equation
-            from Wilzbach was developed under daylight conditions with varied illumination, and extrapolating it to lower light
-            gives an x-intercept (i.e. zero detection probability) of 45.5 lux. Also, the solar illumination model above isn't
-            meant to handle brightness after dark. Combined, these models basically don't say what happens when it gets dim/dark,
-            yet we know the fish feed at those times (maybe preferring more detectable prey, such as on the surface). So we
-            set an arbitrary minimum of 0.1 for the detection rate. The lowest detection rate in the graph from the paper was
-            about 0.34 at 1000 lux. With a threshold of 0.1, we are extrapolating Wilzbach's relationship down to 100 lux
-            (around the brightness of a dimly lit but navigable stairwell or warehouse) and assuming the minimum beyond there."""
-        detection_probability_darkness = float(self.ui.leNighttimeDetectionProbability.text())
-        irradiation_lux = self.predictedIllumination(hourOfDay)
-        if irradiation_lux <= 0:
-            return detection_probability_darkness
-        detection_probability_wilzbach = -0.42 + 0.11 * np.log(irradiation_lux)
-        return min(max(detection_probability_wilzbach, detection_probability_darkness), 1)
-
-    def runDailyModel(self, depth, velocity, shouldOptimizeDiet, gridSize, transectInterpolations):
-        """ This function will run the foraging model at 1-hour intervals for an entire day, based on parameters from the
-            Daily Settings tab. """
-        # ---------------------------------------------------------------------------------------------------------------
-        # Process inputs from the custom hourly details specification file, if any, storing in a dictionary keyed by hour
-        # ---------------------------------------------------------------------------------------------------------------
-        hourlyDetails = {}
-        for hour in range(24):          # First, fill the dictionary with default values (i.e. no effect) for blank entries
-            hourlyDetails[hour] = {
-                'temperature': self.waterTemperature,
-                'forcedRest': False,
-                'riskMultiplier': 1,
-                'driftMultiplier': 1,
-                'customDriftFile': ""
-            }
-        if self.ui.leHourlyDetailsFile.text() != "" and os.path.exists(self.ui.leHourlyDetailsFile.text()):
-            with open(self.ui.leHourlyDetailsFile.text(), newline='') as csvFile:
-                reader = csv.reader(csvFile)
-                next(reader, None)  # skip the header row
-                for row in reader:
-                    try:
-                        hour = int(row[0])
-                        if row[1] != "":
-                            hourlyDetails[hour]['temperature'] = float(row[1])
-                        if row[2] != "":
-                            hourlyDetails[hour]['forcedRest'] = bool(int(row[2]))
-                        if row[3] != "":
-                            hourlyDetails[hour]['riskMultiplier'] = float(row[3])
-                        if row[4] != "":
-                            hourlyDetails[hour]['driftMultiplier'] = float(row[4])
-                        if row[5] != "":
-                            hourlyDetails[hour]['customDriftFile'] = row[5]
-                    except ValueError as err:
-                        message = "Value encountered in the hourly details file that could not be interpreted! Skipping a row. Error: {0}".format(err)
-                        self.ui.statusError(message)
-        # ----------------------------------------------------------------------------------------------------------
-        # Process other inputs from the user interface for hourly settings
-        # ----------------------------------------------------------------------------------------------------------
-        specificHoursFeedingIsAllowed = [hour for hour in range(24) if not hourlyDetails[hour]['forcedRest']]
-        strategy = self.ui.cbForagingStrategy.currentIndex()
-        maxHoursFeedingIsAllowed = float(self.ui.leMaxHoursToFeed.text())
-        # Predation risk is input in the interface in terms of easier-to-picture 90-day probabilities of being predated,
-        # but that is converted here to actual hourly probabilities, which can then be modified by hour or location.
-        baselineHourlyRisk = 1 - (1 - float(self.ui.leBaselineHourlyPredationRiskInTermsOf90DayHorizon.text())) ** (1/(24*90))
-        dailyRiskScaleConstant = 1 - (1 - float(self.ui.leRiskScaleConstant.text())) ** (1 / 90)
-        # ----------------------------------------------------------------------------------------------------------
-        # Compute the results of foraging during every hour of the day in which foraging is allowed.
-        # ----------------------------------------------------------------------------------------------------------
+        return SingleModelResult(waterDepth, meanColumnVelocity, preyLabels, preyIngestionCounts, len(diet), handlingTime, totalAssimilableEnergyIntake, reactionDistance, encountered, ingested, captureManeuverCost, focalSwimmingCost, proportionAssimilated)
+
+    def sharedPreyLabels(self, preyTypes):
+        """ Returns the tuple of the prey types' labels, the same tuple object every time for the same labels. """
+        labels = tuple(preyType.label for preyType in preyTypes)
+        return self.preyLabelsByValue.setdefault(labels, labels)
+
+    def netRateOfEnergyIntakeFromTotals(self, preyTotals, energyContents, focalSwimmingCost):
+        """ Net rate of energy intake for a set of prey types, calculated the same way as in SingleModelResult but without building
+            the whole result. This is used to compare diets quickly during diet optimization. """
+        handlingTime = preyTotals[:, PREY_INTEGRAL_COLUMNS.index('handlingTime')].sum()
+        captureManeuverCost = preyTotals[:, PREY_INTEGRAL_COLUMNS.index('captureManeuverCost')].sum()
+        totalEnergyIntake = (preyTotals[:, PREY_INTEGRAL_COLUMNS.index('ingested')] * energyContents).sum()
+        totalAssimilableEnergyIntake = totalEnergyIntake * self.proportionOfEnergyAssimilated(totalEnergyIntake / (1 + handlingTime))
+        return (totalAssimilableEnergyIntake - captureManeuverCost - focalSwimmingCost) / (1 + handlingTime)
+
+    def runDailyModel(self, depth, velocity, shouldOptimizeDiet, gridSize, transectInterpolations, scenario=None):
+        """ This function will run the foraging model at 1-hour intervals for an entire day, based on the DailyScenario holding
+            parameters from the Daily Settings tab. For runs over many cells, build the scenario once and pass it in for every
+            cell; if none is given, it's built from the user interface here. When evaluating many cells, it's faster to compute
+            each cell's hourly results with runDailyHours and then pass them all to dailyRunResults together. """
+        if scenario is None:
+            scenario = DailyScenario.fromUserInterface(self.ui)
+        hourlyResults = self.runDailyHours(depth, velocity, shouldOptimizeDiet, gridSize, transectInterpolations, scenario)
+        return self.dailyRunResults([depth], [velocity], [hourlyResults], scenario)[0]
+
+    def runDailyHours(self, depth, velocity, shouldOptimizeDiet, gridSize, transectInterpolations, scenario, dateIndex=0, hourIntegrals=None):
+        """ Computes the results of foraging during every hour of the day in which foraging is allowed, in chronological order, for
+            the scenario's date at dateIndex. The grid integrals for each hour don't depend on the date, so when running many dates
+            for the same cell, compute them once with dailyHourIntegrals and pass them in as hourIntegrals. """
+        if hourIntegrals is None:
+            hourIntegrals = self.dailyHourIntegrals(depth, velocity, gridSize, transectInterpolations, scenario)
         hourlyResults = []
-        originalPreyTypes = deepcopy(self.preyTypes)
-        self.ui.pbDailyRunProgressHour.setMaximum(23)
-        for hour in range(24):
-            self.ui.pbDailyRunProgressHour.setValue(hour)
-            if hour in specificHoursFeedingIsAllowed:
-                self.hourlyDriftMultiplier = hourlyDetails[hour]['driftMultiplier']
-                hasCustomPreyTypes = (hourlyDetails[hour]['customDriftFile'] != "")
-                if hasCustomPreyTypes:
-                    self.filterPreyTypes(PreyType.loadPreyTypes(hourlyDetails[hour]['customDriftFile'], self))
-                resultAtHour = self.runForagingModel(depth, velocity, shouldOptimizeDiet, gridSize, transectInterpolations, hour)
-                self.ui.status("Ran model at hour {0} with NREI {1}.".format(hour, resultAtHour.netRateOfEnergyIntake))
-                resultAtHour.hour = hour
-                resultAtHour.hourlyRisk = np.clip(baselineHourlyRisk * hourlyDetails[hour]['riskMultiplier'], 0, 1)  # todo include spatial factor here when implemented
-                hourlyResults.append(resultAtHour)
-                if hasCustomPreyTypes:
-                    self.preyTypes = deepcopy(originalPreyTypes)  # restore the default prey types after each iteration with custom ones
-                self.ui.app.processEvents()  # Forces the progress bar and status window to update with each iteration rather than waiting until the end of the loop.
-        self.ui.pbDailyRunProgressHour.setValue(0)
-        self.hourlyDriftMultiplier = 1  # restore to default value for future calculations
-        Cmax = self.maxDailyConsumption(self.ui.cbConsumptionParameters.currentIndex())
-        # ----------------------------------------------------------------------------------------------------------
-        # Sort the hourly results in descending order of preference according to the fish's strategy.
-        # ----------------------------------------------------------------------------------------------------------
-        if strategy == 0:  # Efficiency maximizing
-            # The efficiency-maximizing fish wants to spend the least energy in order to reach MaxCons, so it feeds in the hours
-            # with the best NREI/SC ratio until it reaches MaxCons.
-            hourlyResults.sort(key=lambda r: r.netRateOfEnergyIntake / r.totalEnergyCostRate, reverse=True)  # sort descending by NREI/SC
-        elif strategy == 1:  # Risk balancing
-            hourlyResults.sort(key=lambda r: r.hourlyRisk / r.netRateOfEnergyIntake, reverse=False)  # sort ascending by risk/NREI ratio
-        # ----------------------------------------------------------------------------------------------------------
-        # Now iterate through the sorted hours (best hours first) totaling the fish's foraging progress until it
-        # either fills up, runs out of hours available to forage, or gets into hours with a negative NREI where
-        # resting is better than foraging. In all those cases it stops foraging in the subsequent hours.
-        # ----------------------------------------------------------------------------------------------------------
-        dailyGrossEnergyIntake = 0
-        dailySpecificConsumption = 0
-        dailyCost = 0
-        dailyFocalSwimmingCost = 0
-        dailyCaptureManeuverCost = 0
-        dailyHoursForaging = 0
-        for i, result in enumerate(hourlyResults):
-            grossRateOfEnergyIntake = result.grossRateOfEnergyIntake
-            focalSwimmingCostRate = result.focalSwimmingCostRate
-            captureManeuverCostRate = result.captureManeuverCostRate
-            costRate = result.totalEnergyCostRate
-            # todo remove maxHourlyRisk
-            if i + 1 > maxHoursFeedingIsAllowed or grossRateOfEnergyIntake < costRate or dailySpecificConsumption >= Cmax:
-                result.actuallyForaged = False
-                # todo add test here for risk metric
-                break  # using 'break' instead of 'continue' because hours are already ranked by desirability
-            if i == 0:
-                riskProductAccumulator = result.risk
-                dneiSumAccumulator = result.netRateOfEnergyIntake
-                previousRiskMetric = (dailyRiskScaleConstant + riskProductAccumulator) / dneiSumAccumulator
-                result.actuallyForaged = True
-            else:
-                riskProductAccumulator *= result.risk
-                dneiSumAccumulator += result.netRateOfEnergyIntake
-                currentRiskMetric = (dailyRiskScaleConstant + riskProductAccumulator) / dneiSumAccumulator
-                if currentRiskMetric <= previousRiskMetric:
-                    result.actuallyForaged = True
-                    previousRiskMetric = currentRiskMetric
-                else:
-                    result.actuallyForaged = False
-                    break
-
-            hourlySpecificConsumption = self.specificConsumptionRate(grossRateOfEnergyIntake, hours=1)
-            if dailySpecificConsumption + hourlySpecificConsumption <= Cmax:
-                dailySpecificConsumption += hourlySpecificConsumption
-                dailyCost += costRate * 3600  # convert J/s to J/h and add to daily total
-                dailyFocalSwimmingCost += focalSwimmingCostRate * 3600
-                dailyCaptureManeuverCost += captureManeuverCostRate * 3600
-                dailyGrossEnergyIntake += grossRateOfEnergyIntake * 3600  # convert J/s to J/h and add to daily total
-                dailyHoursForaging += 1
+        dailyTemperature = self.waterTemperature
+        for hour, (preyTypes, integrals, temperature) in hourIntegrals.items():
+            hourlyDetails = scenario.hourlyDetails[hour]
+            detectionProbability = self.basePreyDetectionProbability * scenario.lightSensitiveDetectionProbability(hour, dateIndex)
+            if temperature is not None:  # assimilation can depend on temperature, so the hour's temperature is used to build its result
+                self.waterTemperature = temperature
+                self.clear_caches()
+            resultAtHour = self.resultFromPreyIntegrals(depth, velocity, preyTypes, integrals, shouldOptimizeDiet, detectionProbability, hourlyDetails['driftMultiplier'])
+            if temperature is not None:
+                self.waterTemperature = dailyTemperature
+                self.clear_caches()
+            resultAtHour.hour = hour
+            resultAtHour.hourlyRisk = scenario.hourlyRisk[hour]
+            hourlyResults.append(resultAtHour)
+        return hourlyResults
+
+    def dailyHourIntegrals(self, depth, velocity, gridSize, transectInterpolations, scenario):
+        """ Computes the per-prey grid integrals for every hour of the day in which foraging is allowed, returning a dictionary keyed
+            by hour (in chronological order) of (prey types, integrals, temperature) tuples, in which temperature is None for hours at
+            the forager's own temperature. Hours with the default prey types and temperature differ only in detection probability and
+            drift multiplier, so they all share one set of integrals. Hours with a custom drift file or temperature are integrated
+            separately. """
+        hourIntegrals = {}
+        dailyTemperature = self.waterTemperature
+        sharedIntegrals = None
+        for hour in scenario.specificHoursFeedingIsAllowed:
+            hourlyDetails = scenario.hourlyDetails[hour]
+            hasCustomPreyTypes = (hourlyDetails['customDriftFile'] != "")
+            hasCustomTemperature = (hourlyDetails['temperature'] is not None and hourlyDetails['temperature'] != dailyTemperature)
+            if hasCustomPreyTypes or hasCustomTemperature:
+                preyTypes = scenario.preyTypesForHour(hour, self)
+                temperature = hourlyDetails['temperature'] if hasCustomTemperature else None
+                if hasCustomTemperature:
+                    self.waterTemperature = temperature
+                    self.clear_caches()
+                hourIntegrals[hour] = (preyTypes, self.preyIntegrals(depth, velocity, gridSize, transectInterpolations, preyTypes), temperature)
+                if hasCustomTemperature:
+                    self.waterTemperature = dailyTemperature
+                    self.clear_caches()
             else:
-                proportionOfHourForaged = (Cmax - dailySpecificConsumption) / hourlySpecificConsumption
-                dailySpecificConsumption = Cmax
-                dailyCost += costRate * 3600 * proportionOfHourForaged
-                dailyFocalSwimmingCost += focalSwimmingCostRate * 3600 * proportionOfHourForaged
-                dailyCaptureManeuverCost += captureManeuverCostRate * 3600 * proportionOfHourForaged
-                dailyGrossEnergyIntake += grossRateOfEnergyIntake * 3600 * proportionOfHourForaged
-                dailyHoursForaging += proportionOfHourForaged
-        # ---------------------------------------------------------------------------------------------------------------
-        # Reset the result plot selection dropdown to values for daily rather than instantaneous model runs
-        # ---------------------------------------------------------------------------------------------------------------
-        self.ui.changePlotOptions(1)
-        # ----------------------------------------------------------------------------------------------------------
-        # Arrange and return the completed results in a useful form
-        # ----------------------------------------------------------------------------------------------------------
-        hourlyResults.sort(key=lambda r: r.hour)  # sort back to chronological order for diagnostics
-        dailyNetEnergyIntake = dailyGrossEnergyIntake - dailyCost
-        dailyRisk = 1 - np.prod([1 - result.hourlyRisk for result in hourlyResults if result.actuallyForaged])
-        dailyRiskBalancingMetric = (dailyRiskScaleConstant + dailyRisk) / dailyNetEnergyIntake
-        return DailyRunResult(depth, velocity, hourlyResults, dailyNetEnergyIntake, dailyGrossEnergyIntake, dailyCost, dailyHoursForaging, dailyFocalSwimmingCost, dailyCaptureManeuverCost, dailyRisk, dailyRiskBalancingMetric, dailySpecificConsumption, dailySpecificConsumption / Cmax)
+                if sharedIntegrals is None:
+                    sharedIntegrals = self.preyIntegrals(depth, velocity, gridSize, transectInterpolations)
+                hourIntegrals[hour] = (self.preyTypes, sharedIntegrals, None)
+        return hourIntegrals
+
+    def dailyRunResults(self, depths, velocities, hourlyResultsByCell, scenario, shouldCompareWithOptimalSchedule=None):
+        """ Decides when the fish forages in each cell and totals up the daily results, given a list of chronological hourly results
+            from runDailyHours for each depth/velocity cell. The hourly rates for all cells are gathered into (cells x 24) arrays and
+            the schedules are evaluated together by DailySchedule.evaluate, which documents the schedule logic. Each daily result keeps
+            its row of those arrays, with the hourly risk and the proportion of each hour foraged, as its hourly metrics; the hourly
+            results themselves aren't kept. For risk-balancing runs, each result can also be compared with the optimal schedule, which
+            takes a median of about 0.07 s per cell (over a second for some), so it's only done if shouldCompareWithOptimalSchedule is
+            True or, by default, if it's turned on in the scenario. """
+        if shouldCompareWithOptimalSchedule is None:
+            shouldCompareWithOptimalSchedule = scenario.shouldCompareWithOptimalSchedule
+        nCells = len(hourlyResultsByCell)
+        netRate, grossRate, focalCostRate, maneuverCostRate = (np.zeros((nCells, 24)) for _ in range(4))
+        allowed = np.zeros((nCells, 24), dtype=bool)
+        for i, hourlyResults in enumerate(hourlyResultsByCell):
+            for result in hourlyResults:
+                netRate[i, result.hour] = result.netRateOfEnergyIntake
+                grossRate[i, result.hour] = result.grossRateOfEnergyIntake
+                focalCostRate[i, result.hour] = result.focalSwimmingCostRate
+                maneuverCostRate[i, result.hour] = result.captureManeuverCostRate
+                allowed[i, result.hour] = True
+        Cmax = self.maxDailyConsumption(scenario.consumptionParameters)
+        daily = DailySchedule.evaluate(netRate, grossRate, focalCostRate, maneuverCostRate, scenario.hourlyRisk, allowed, scenario.strategy,
+                                       scenario.maxHoursFeedingIsAllowed, Cmax, self.mass, scenario.dailyRiskScaleConstant)
+        hourlyRisk = np.broadcast_to(np.asarray(scenario.hourlyRisk, dtype=float), (nCells, 24))
+        hourlyMetrics = np.stack([netRate, grossRate, focalCostRate, maneuverCostRate, hourlyRisk, daily['proportionOfHourForaged']], axis=2)  # in the order of DailyRunResult.HOURLY_METRICS
+        hourlyMetrics[~allowed] = np.nan
+        dailyResults = []
+        for i, (depth, velocity) in enumerate(zip(depths, velocities)):
+            dailyResults.append(DailyRunResult(depth, velocity, hourlyMetrics[i], daily['dailyNetEnergyIntake'][i], daily['dailyGrossEnergyIntake'][i],
+                                               daily['dailyCost'][i], daily['dailyHoursForaging'][i], daily['dailyFocalSwimmingCost'][i],
+                                               daily['dailyCaptureManeuverCost'][i], daily['dailyRisk'][i], daily['dailyRiskBalancingMetric'][i],
+                                               daily['dailySpecificConsumption'][i], daily['dailySpecificConsumptionProportional'][i]))
+            if scenario.strategy == 1 and shouldCompareWithOptimalSchedule:  # Diagnostic comparison of the greedy risk-balancing schedule with the optimal one
+                greedyProportions = {int(hour): daily['proportionOfHourForaged'][i, hour] for hour in np.flatnonzero(allowed[i])}
+                optimalSchedule = DailySchedule.optimalRiskBalancing(hourlyMetrics[i], scenario.maxHoursFeedingIsAllowed, Cmax, self.mass, scenario.dailyRiskScaleConstant, greedyProportions)
+                dailyResults[-1].compareWithOptimalSchedule(optimalSchedule)
+        return dailyResults
 
     def status(self, message):
         if self.ui is not None:
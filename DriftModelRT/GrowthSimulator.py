@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+This class projects the growth of many fish over a season from daily net energy intake, without re-running the daily model for every
+fish on every day. The daily model is instead evaluated once on a lattice of fish mass, water temperature, depth, and velocity values,
+and each fish's DNEI on each day is interpolated (multilinearly) from that table. The table doesn't depend on the number of fish or
+days, so thousands of fish over a whole summer cost little more than the lattice itself.
+
+Each lattice node uses a fish of the node's mass, with fork length from the Fulton condition factor of the forager it's based on,
+at the node's water temperature; all other settings come from that forager and the DailyScenario. The DNEI from the daily model is
+taken as the energy available for growth, converted to mass using the fish's energy density. Hourly temperatures in the hourly
+details file still override the lattice temperature in those hours.
+
+The lattice can be refined adaptively. Along each axis, the error of linear interpolation within an interval is estimated from
+second differences of DNEI at the nodes, as |f''| h^2 / 8 for an interval of width h, taking the largest value across the rest of the
+lattice. Intervals whose estimate exceeds the tolerance are split at their midpoints and only the new nodes are evaluated. Axes that
+start with only 2 nodes have no second differences, so their midpoints are added first to give the curvature something to go on.
+"""
+
+from copy import deepcopy
+import itertools
+
+import numpy as np
+from scipy.interpolate import RegularGridInterpolator
+
+from DriftModelRT.DriftForager import DriftForager
+from DriftModelRT.ParallelWorkers import ParallelWorkers
+
+
+class GrowthSimulator(object):
+
+    AXES = ('mass', 'temperature', 'depth', 'velocity')
+
+    def __init__(self, forager, preyTypes, scenario, masses, temperatures, depths, velocities, gridSize=10, shouldOptimizeDiet=True,
+                 fishEnergyDensity=5900, processes=None, ui=None):
+        """ The forager supplies every setting other than mass, fork length, and temperature. The prey types must be unfiltered (as
+            loaded from the drift density file), since they're filtered separately for each mass in the lattice. Masses (g),
+            temperatures (C), depths (cm), and velocities (cm/s) are the initial lattice values on each axis, with at least 2 each.
+            The fish energy density is in J/g wet mass; the default is a typical value for juvenile salmonids. Processes is the
+            number of worker processes used to evaluate the lattice (default: number of CPU cores). """
+        self.ui = ui
+        self.foragerSettings = forager.settings()
+        self.conditionFactor = 100 * forager.mass / forager.forkLength ** 3  # Fulton's K, with mass in g and fork length in cm
+        self.preyTypes = preyTypes
+        self.scenario = scenario
+        self.gridSize = gridSize
+        self.shouldOptimizeDiet = shouldOptimizeDiet
+        self.fishEnergyDensity = fishEnergyDensity
+        self.workers = ParallelWorkers(processes)
+        self.axes = []
+        for name, values in zip(GrowthSimulator.AXES, (masses, temperatures, depths, velocities)):
+            values = np.unique(np.asarray(values, dtype=float))
+            if len(values) < 2:
+                raise ValueError("The growth lattice needs at least 2 distinct {0} values.".format(name))
+            self.axes.append(values)
+        self.nodeValues = {}  # (mass, temperature, depth, velocity) -> (DNEI, daily specific consumption), kept as the lattice is refined
+        self.evaluateLattice()
+
+    def forkLengthForMass(self, mass):
+        return (100 * mass / self.conditionFactor) ** (1 / 3)
+
+    @staticmethod
+    def evaluateNode(foragerSettings, preyTypes, scenario, gridSize, shouldOptimizeDiet, mass, forkLength, temperature, depthsAndVelocities):
+        """ Runs the daily model at the given depth/velocity pairs for one mass and temperature, returning a list of (DNEI, daily
+            specific consumption) tuples. This is a static method so it can run in a worker process. """
+        forager = DriftForager.fromSettings(foragerSettings, deepcopy(preyTypes), mass=mass, forkLength=forkLength, waterTemperature=temperature)
+        hourlyResultsByCell = [forager.runDailyHours(depth, velocity, shouldOptimizeDiet, gridSize, None, scenario) for depth, velocity in depthsAndVelocities]
+        depths, velocities = zip(*depthsAndVelocities)
+        results = forager.dailyRunResults(depths, velocities, hourlyResultsByCell, scenario, shouldCompareWithOptimalSchedule=False)
+        return [(result.dailyNetEnergyIntake, result.dailySpecificConsumption) for result in results]
+
+    def evaluateLattice(self):
+        """ Evaluates the daily model at every lattice node that hasn't been evaluated yet, in parallel by mass and temperature, and
+            rebuilds the interpolation tables. """
+        missing = {}
+        for node in itertools.product(*self.axes):
+            if node not in self.nodeValues:
+                missing.setdefault(node[:2], []).append(node[2:])
+        if len(missing) > 0:
+            self.status("Evaluating the daily model at {0} new growth lattice nodes.".format(sum(len(pairs) for pairs in missing.values())))
+            tasks = [(self.foragerSettings, self.preyTypes, self.scenario, self.gridSize, self.shouldOptimizeDiet, mass, self.forkLengthForMass(mass), temperature, pairs)
+                     for (mass, temperature), pairs in missing.items()]
+            for ((mass, temperature), pairs), values in zip(missing.items(), self.workers.starmap(GrowthSimulator.evaluateNode, tasks)):
+                for (depth, velocity), value in zip(pairs, values):
+                    self.nodeValues[(mass, temperature, depth, velocity)] = value
+        shape = tuple(len(axis) for axis in self.axes)
+        table = np.array([self.nodeValues[node] for node in itertools.product(*self.axes)]).reshape(shape + (2,))
+        self.dailyNetEnergyIntake = table[..., 0]
+        self.dailySpecificConsumption = table[..., 1]
+        self.dneiInterpolator = RegularGridInterpolator(self.axes, self.dailyNetEnergyIntake)
+        self.consumptionInterpolator = RegularGridInterpolator(self.axes, self.dailySpecificConsumption)
+
+    def interpolationErrorEstimates(self):
+        """ Returns a list with one array per axis, giving the estimated maximum error in DNEI (J) from linear interpolation within each
+            interval between adjacent nodes on that axis. Axes with only 2 nodes have no second differences, so their error is unknown
+            and returned as NaN. """
+        estimates = []
+        for a, x in enumerate(self.axes):
+            f = np.moveaxis(self.dailyNetEnergyIntake, a, 0)
+            if len(x) < 3:
+                estimates.append(np.full(len(x) - 1, np.nan))
+                continue
+            h1 = (x[1:-1] - x[:-2]).reshape((-1,) + (1,) * (f.ndim - 1))
+            h2 = (x[2:] - x[1:-1]).reshape(h1.shape)
+            secondDerivative = 2 * (f[2:] / (h2 * (h1 + h2)) - f[1:-1] / (h1 * h2) + f[:-2] / (h1 * (h1 + h2)))
+            curvature = np.abs(secondDerivative).reshape(len(x) - 2, -1).max(axis=1)  # largest across the rest of the lattice
+            curvatureAtNodes = np.concatenate(([curvature[0]], curvature, [curvature[-1]]))  # end nodes use their neighbor's estimate
+            intervalCurvature = np.maximum(curvatureAtNodes[:-1], curvatureAtNodes[1:])
+            estimates.append(intervalCurvature * np.diff(x) ** 2 / 8)
+        return estimates
+
+    def refine(self, tolerance, maxRounds=3, maxNodesPerAxis=33):
+        """ Splits lattice intervals whose estimated DNEI interpolation error exceeds the tolerance (J), evaluating only the new nodes,
+            until no interval exceeds it, maxRounds rounds have run, or every axis that needs refinement has maxNodesPerAxis nodes.
+            Intervals with an unknown error (on axes with only 2 nodes) are always split. Returns the number of rounds in which nodes
+            were added. """
+        for refinementRound in range(maxRounds):
+            added = False
+            for a, errors in enumerate(self.interpolationErrorEstimates()):
+                x = self.axes[a]
+                midpoints = [(x[i] + x[i + 1]) / 2 for i in np.argsort(-np.nan_to_num(errors, nan=np.inf)) if not errors[i] <= tolerance]  # NaN (unknown) sorts first and is split
+                midpoints = midpoints[:max(maxNodesPerAxis - len(x), 0)]  # refine the worst intervals first if limited
+                if len(midpoints) > 0:
+                    self.axes[a] = np.unique(np.concatenate((x, midpoints)))
+                    added = True
+            if not added:
+                return refinementRound
+            self.evaluateLattice()
+        return maxRounds
+
+    def simulate(self, initialMasses, depths, velocities, temperatures, days):
+        """ Steps the growth of each fish daily for the given number of days. Depths, velocities, and temperatures may be single values,
+            one value per fish, or arrays with one row per fish and one column per day. Values outside the lattice are clamped to its
+            edges and counted in the result's 'outsideLattice'. Returns a dictionary of arrays with one row per fish: 'mass' and
+            'forkLength' with one column per day plus the initial values, and 'dailyNetEnergyIntake' and 'dailySpecificConsumption'
+            with one column per day. """
+        mass = np.array(initialMasses, dtype=float)
+        nFish = len(mass)
+
+        def perFishPerDay(values):
+            values = np.asarray(values, dtype=float)
+            if values.ndim == 1:
+                values = values[:, None]
+            return np.broadcast_to(values, (nFish, days))
+
+        depths, velocities, temperatures = perFishPerDay(depths), perFishPerDay(velocities), perFishPerDay(temperatures)
+        masses = np.zeros((nFish, days + 1))
+        masses[:, 0] = mass
+        dailyNetEnergyIntake = np.zeros((nFish, days))
+        dailySpecificConsumption = np.zeros((nFish, days))
+        outsideLattice = 0
+        for day in range(days):
+            points = np.column_stack((mass, temperatures[:, day], depths[:, day], velocities[:, day]))
+            clampedPoints = np.column_stack([np.clip(points[:, a], axis[0], axis[-1]) for a, axis in enumerate(self.axes)])
+            outsideLattice += np.count_nonzero(np.any(clampedPoints != points, axis=1))
+            dailyNetEnergyIntake[:, day] = self.dneiInterpolator(clampedPoints)
+            dailySpecificConsumption[:, day] = self.consumptionInterpolator(clampedPoints)
+            mass = np.maximum(mass + dailyNetEnergyIntake[:, day] / self.fishEnergyDensity, 1e-6)  # a starving fish loses mass, but never all of it
+            masses[:, day + 1] = mass
+        if outsideLattice > 0:
+            self.status("Clamped {0} of {1} daily fish states to the edges of the growth lattice.".format(outsideLattice, nFish * days))
+        return {'mass': masses,
+                'forkLength': self.forkLengthForMass(masses),
+                'dailyNetEnergyIntake': dailyNetEnergyIntake,
+                'dailySpecificConsumption': dailySpecificConsumption,
+                'outsideLattice': outsideLattice}
+
+    def status(self, message):
+        if self.ui is not None:
+            self.ui.status(message)
+        else:
+            print(message)
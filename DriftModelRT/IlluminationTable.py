@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+This class precomputes solar illumination and light-sensitive prey detection probabilities for every hour of one or more days
+at a given location. Previously, each hour of each daily model run (and thus each depth/velocity cell and batch row) located the
+time zone from scratch and called pysolar separately, which took a large fraction of the time of a daily run. Here the time zone
+is resolved once per location and pysolar's solar altitude is computed once for every hour and date of the table (about 10 ms
+per date), after which the irradiance and detection probabilities are computed in a single vectorized pass.
+
+The solar altitude is pysolar's full-precision, refraction-corrected get_altitude, as before, and the direct irradiance follows
+Masters (2004, p. 412) as in pysolar's get_radiation_direct. The low-precision declination and equation-of-time formulas (as in
+pysolar's get_altitude_fast) aren't used: they're off by up to about 2 degrees of altitude, which near sunrise and sunset, where
+the detection curve is steepest, changes detection probabilities by up to about 0.4.
+
+Results do differ from the earlier per-hour calculation in one deliberate way. It attached the pytz time zone directly to each
+date, which gives the zone's historical local mean time rather than its standard time and ignores daylight saving time, so the
+hours were off by about half an hour in winter (for the default location, in Alberta) and an hour and a half in summer. Here local
+clock hours are localized properly, including daylight saving time. At the default location that changes detection probabilities
+by 0.04 on average over all hours of the year, and by up to about 0.7 in the hours around sunrise and sunset.
+
+Tables are cached by location, dates, and nighttime detection probability, so the same table is shared by every forager,
+depth/velocity cell, and batch row that uses the same daily settings.
+"""
+
+import datetime
+import functools
+import numpy as np
+import pytz
+from pysolar.solar import get_altitude
+from timezonefinder import TimezoneFinder
+
+
+class IlluminationTable(object):
+
+    timezoneFinder = None  # created once when first needed, because loading its polygon data is slow
+
+    @staticmethod
+    @functools.lru_cache(maxsize=256)
+    def timezoneAt(latitude, longitude):
+        """ Returns the pytz time zone object for a location, resolving it only once per location. """
+        if IlluminationTable.timezoneFinder is None:
+            IlluminationTable.timezoneFinder = TimezoneFinder()
+        return pytz.timezone(IlluminationTable.timezoneFinder.timezone_at(lng=longitude, lat=latitude))
+
+    @staticmethod
+    @functools.lru_cache(maxsize=64)
+    def cached(latitude, longitude, monthsAndDays, nighttimeDetectionProbability):
+        """ Returns a shared table for the given settings. The monthsAndDays argument must be a tuple of (month, day) tuples so
+            it can be used as a cache key. """
+        return IlluminationTable(latitude, longitude, monthsAndDays, nighttimeDetectionProbability)
+
+    def __init__(self, latitude, longitude, monthsAndDays, nighttimeDetectionProbability):
+        """ Latitude is positive in the northern hemisphere and longitude is negative west of Greenwich. Dates are given as
+            (month, day) pairs and computed for the year 2000 (a leap year, so February 29 is allowed), matching the date
+            input on the Daily Settings tab. Hours are whole local clock hours 0-23, including daylight saving time. """
+        self.latitude = latitude
+        self.longitude = longitude
+        self.monthsAndDays = tuple(monthsAndDays)
+        self.nighttimeDetectionProbability = nighttimeDetectionProbability
+        timezone = IlluminationTable.timezoneAt(latitude, longitude)
+        # Convert every local clock hour to UTC, from which the solar position and day of year are calculated
+        utcTimes = [[timezone.localize(datetime.datetime(2000, month, day, hour)).astimezone(pytz.utc) for hour in range(24)] for month, day in self.monthsAndDays]
+        dayOfYear = np.array([[when.timetuple().tm_yday for when in row] for row in utcTimes], dtype=float)
+        self.solarAltitude = np.array([[get_altitude(latitude, longitude, when) for when in row] for row in utcTimes], dtype=float)
+        irradiation_wm2 = IlluminationTable.directIrradiation(dayOfYear, self.solarAltitude)  # direct solar irradiation in watts/m2
+        # Note that 1000 W/m2 equals approximately 120,000 lux according to https://ieee-dataport.org/open-access/conversion-guide-solar-irradiance-and-lux-illuminance#:~:text=Solar%20Irradiance%20of%201%20Sun,m2)%20equals%20approximately%20120%2C000%20Lux.
+        # but this relationship can vary quite a bit.
+        self.illumination = irradiation_wm2 * 120  # illumination in lux, with shape (number of dates, 24)
+        self.detectionProbability = IlluminationTable.wilzbachDetectionProbability(self.illumination, nighttimeDetectionProbability)
+
+    @staticmethod
+    def directIrradiation(dayOfYear, altitudeDegrees):
+        """ Vectorized direct solar irradiation (W/m2), which is 0 whenever the sun is below the horizon. """
+        flux = 1160 + 75 * np.sin(2 * np.pi / 365 * (dayOfYear - 275))  # apparent extraterrestrial flux
+        opticalDepth = 0.174 + 0.035 * np.sin(2 * np.pi / 365 * (dayOfYear - 100))
+        sunIsUp = altitudeDegrees > 0
+        airMassRatio = np.ones_like(altitudeDegrees)
+        airMassRatio[sunIsUp] = 1 / np.sin(np.radians(altitudeDegrees[sunIsUp]))
+        return np.where(sunIsUp, flux * np.exp(-opticalDepth * airMassRatio), 0.0)
+
+    @staticmethod
+    def wilzbachDetectionProbability(illumination, nighttimeDetectionProbability):
+        """ Returns the light-sensitive prey capture success from the field experiments of Wilzbach et al 1986 (Fig 4), being
+            interpreted here as detection probabilities, and based on large 7-10 mm Culicid prey. The same study found
+            detection probabilities substantially lower (by around 25 %) for small (3-5 mm) prey, but did not provide
+            a good framework or dataset to combine these effects and model both together. A better model of prey detection
+            is sorely needed, but considering light alone in this case is better than nothing.
+
+            This output is constrained to a max of 1 and a minimum set somewhat arbitrarily to 0.1. The regression equation
+            from Wilzbach was developed under daylight conditions with varied illumination, and extrapolating it to lower light
+            gives an x-intercept (i.e. zero detection probability) of 45.5 lux. Also, the solar illumination model above isn't
+            meant to handle brightness after dark. Combined, these models basically don't say what happens when it gets dim/dark,
+            yet we know the fish feed at those times (maybe preferring more detectable prey, such as on the surface). So we
+            set an arbitrary minimum of 0.1 for the detection rate. The lowest detection rate in the graph from the paper was
+            about 0.34 at 1000 lux. With a threshold of 0.1, we are extrapolating Wilzbach's relationship down to 100 lux
+            (around the brightness of a dimly lit but navigable stairwell or warehouse) and assuming the minimum beyond there.
+            The minimum is the nighttime detection probability from the Daily Settings tab, and the illumination is an array. """
+        litIllumination = np.where(illumination > 0, illumination, 1)  # placeholder to avoid taking the log of 0 in hours that are dark anyway
+        detectionProbability = np.clip(-0.42 + 0.11 * np.log(litIllumination), nighttimeDetectionProbability, 1)
+        return np.where(illumination > 0, detectionProbability, nighttimeDetectionProbability)
+
+    def illuminationAt(self, hourOfDay, dateIndex=0):
+        return self.illumination[dateIndex, hourOfDay]
+
+    def detectionProbabilityAt(self, hourOfDay, dateIndex=0):
+        return self.detectionProbability[dateIndex, hourOfDay]
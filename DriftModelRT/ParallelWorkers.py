@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+This class runs independent model evaluations in a pool of worker processes. The drift-foraging model is pure Python, so threads
+don't help, but separate processes can use every core. Work is passed to the workers as plain data (forager settings, prey types,
+a DailyScenario, and the inputs to evaluate), never the user interface, so the function given to the workers must be a module-level
+function or a static method that builds its own forager.
+
+Workers are started with the 'spawn' method so they don't inherit a copy of the running Qt application. With one process, or only
+one task, everything runs in the calling process instead, which avoids the start-up cost of the pool and makes debugging easier.
+"""
+
+import multiprocessing
+import os
+
+
+class ParallelWorkers(object):
+
+    def __init__(self, processes=None):
+        """ The number of processes defaults to the number of CPU cores. """
+        self.processes = processes if processes is not None else (os.cpu_count() or 1)
+
+    def starmap(self, function, argumentTuples):
+        """ Returns [function(*arguments) for arguments in argumentTuples], evaluated in parallel and kept in order. """
+        argumentTuples = list(argumentTuples)
+        if self.processes <= 1 or len(argumentTuples) <= 1:
+            return [function(*arguments) for arguments in argumentTuples]
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(min(self.processes, len(argumentTuples))) as pool:
+            return pool.starmap(function, argumentTuples)
+
+    def imap(self, function, argumentTuples):
+        """ Like starmap, but yields each result as soon as it and all earlier ones are done, so the caller can report progress. """
+        argumentTuples = list(argumentTuples)
+        if self.processes <= 1 or len(argumentTuples) <= 1:
+            for arguments in argumentTuples:
+                yield function(*arguments)
+            return
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(min(self.processes, len(argumentTuples))) as pool:
+            for result in pool.imap(ParallelWorkers.callWithArguments, [(function, arguments) for arguments in argumentTuples]):
+                yield result
+
+    @staticmethod
+    def callWithArguments(functionAndArguments):
+        function, arguments = functionAndArguments
+        return function(*arguments)
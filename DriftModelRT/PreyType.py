@@ -40,8 +40,6 @@ class PreyType(object):
         self.driftDensity = driftDensity  # Number of items of prey in this class per m^3 of water.
         self.energyDensityJoules = energyDensityCalories * 4.184 / 1000  # Convert from gram-calories per gram to Joules (4.184J/calorie) per milligram
         self.setDimensions(minLength, maxLength)
-        self.ingestionCount = None  # Intermediate value for the number below
-        self.ingestionRate = None  # Rate at which this type is ingested, optionally added by NREI model to keep track
 
     def setDimensions(self, minLength, maxLength):
         self.length = (minLength + maxLength) / 2  # Mean length in mm of prey in this class.
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+This class supports batch processing of very large point sets, such as the nodes of a hydraulic model mesh, in which many points
+have nearly identical depth, velocity, and roughness. Inputs are rounded to user-specified resolutions to form a key, the model is
+run once for each unique key, and the result is shared by every input row with the same key. Inputs other than depth, velocity,
+and roughness (fish size, temperature, turbidity, drift file) are included in the key exactly as given, without rounding.
+"""
+
+import copy
+
+
+class QuantizedInputCache(object):
+
+    def __init__(self, depthResolution, velocityResolution, roughnessResolution):
+        """ Resolutions are in model units (cm for depth and roughness, cm/s for velocity). A resolution of 0 disables quantization of
+            that input, so exact values are used in the key. """
+        self.resolutions = (depthResolution, velocityResolution, roughnessResolution)
+        self.results = {}
+        self.rowCount = 0
+
+    @staticmethod
+    def quantize(value, resolution):
+        """ Returns the value rounded to the nearest multiple of the resolution. Positive values are never rounded down to 0, because
+            a depth or velocity of 0 would turn a real (if shallow or slow) point into an empty result with no foraging. """
+        if resolution <= 0:
+            return value
+        steps = int(round(value / resolution))
+        if steps == 0 and value > 0:
+            steps = 1
+        return steps * resolution
+
+    def key(self, depth, velocity, roughness, *otherInputs):
+        """ Returns the tuple used to look up results. Its first three elements are the quantized depth, velocity, and roughness at
+            which the model is actually evaluated. """
+        quantized = tuple(QuantizedInputCache.quantize(value, resolution) for value, resolution in zip((depth, velocity, roughness), self.resolutions))
+        return quantized + tuple(otherInputs)
+
+    def lookup(self, key):
+        """ Returns a shallow copy of the stored result for this key, or None if the key hasn't been evaluated yet. The copy lets each
+            input row carry its own label and other per-row attributes without changing the result shared by other rows. """
+        self.rowCount += 1
+        result = self.results.get(key)
+        return copy.copy(result) if result is not None else None
+
+    def store(self, key, result):
+        self.results[key] = result
+        return copy.copy(result)
+
+    @property
+    def uniqueCount(self):
+        return len(self.results)
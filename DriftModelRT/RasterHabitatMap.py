@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+This class maps instantaneous model results over gridded depth, velocity, and (optionally) roughness rasters, such as the output of
+a 2-D hydraulic model for a whole reach, which may have tens of millions of cells. Inputs are NumPy .npy files of identical 2-D shape
+that are memory-mapped rather than loaded, so only the tile being worked on is in memory. Inputs in .npz files can't be memory-mapped
+and are loaded whole, so .npy files should be used for large rasters. Cells with a missing (NaN) or non-positive depth or velocity are
+treated as dry or invalid and get NaN results.
+
+The raster is processed in rectangular tiles spread across worker processes. Tiles are sized so that all the workers together stay
+within a fixed memory budget, and each worker writes its results directly into memory-mapped .npy output rasters (one per metric) in
+the output folder. Within each tile, results are interpolated from a SurrogateTable if one is given and applies, and the remaining
+cells are modeled once per unique combination of depth, velocity, and roughness after rounding them to the quantization resolutions.
+
+A progress file in the output folder records the configuration and the tiles that are finished, so a run that's interrupted can be
+resumed by running it again with the same inputs and output folder; only unfinished tiles are processed again. Standardized
+suitability is calculated in a final pass once the maximum NREI over the whole raster is known.
+"""
+
+from functools import lru_cache
+import json
+import os
+
+import numpy as np
+
+from DriftModelRT.DriftForager import DriftForager
+from DriftModelRT.ParallelWorkers import ParallelWorkers
+from DriftModelRT.SurrogateTable import SurrogateTable
+
+
+class RasterHabitatMap(object):
+
+    OUTPUTS = SurrogateTable.METRICS
+    BYTES_PER_CELL = 1024  # conservative peak memory per tile cell in a worker, including inputs, outputs, and interpolation temporaries
+    PROGRESS_FILE = 'progress.json'
+
+    def __init__(self, outputFolder, depthPath, velocityPath, roughnessPath, foragerSettings, preyTypes, driftFile, gridSize=10, shouldOptimizeDiet=True,
+                 surrogateTablePath=None, resolutions=(0, 0, 0), memoryBudget=1024, processes=None, ui=None):
+        """ Paths are to .npy (or .npz) files with depth (cm), velocity (cm/s), and roughness (cm) rasters; roughnessPath may be None to
+            use the roughness in foragerSettings everywhere. The prey types must be unfiltered, as loaded from driftFile. Resolutions
+            are the (depth, velocity, roughness) quantization steps, as in QuantizedInputCache, with 0 meaning exact values. The memory
+            budget is in MB for all workers combined. """
+        self.ui = ui
+        self.outputFolder = outputFolder
+        self.inputPaths = {'depth': depthPath, 'velocity': velocityPath, 'roughness': roughnessPath}
+        self.foragerSettings = foragerSettings
+        self.preyTypes = preyTypes
+        self.driftFile = driftFile
+        self.gridSize = gridSize
+        self.shouldOptimizeDiet = shouldOptimizeDiet
+        self.surrogateTablePath = surrogateTablePath
+        self.resolutions = tuple(resolutions)
+        self.workers = ParallelWorkers(processes)
+        shapes = {name: RasterHabitatMap.openRaster(path).shape for name, path in self.inputPaths.items() if path is not None}
+        if len(set(shapes.values())) > 1:
+            raise ValueError("The input rasters must all have the same shape, but they have shapes {0}.".format(shapes))
+        self.shape = shapes['depth']
+        if len(self.shape) != 2:
+            raise ValueError("The input rasters must be 2-dimensional, but they have shape {0}.".format(self.shape))
+        tileCells = max(1, int(memoryBudget * 1024 ** 2 / (RasterHabitatMap.BYTES_PER_CELL * self.workers.processes)))
+        tileColumns = min(self.shape[1], tileCells)
+        self.setTileShape((max(1, min(self.shape[0], tileCells // tileColumns)), tileColumns))
+
+    def setTileShape(self, tileShape):
+        self.tileShape = tuple(tileShape)
+        self.tiles = [(rowStart, min(rowStart + self.tileShape[0], self.shape[0]), columnStart, min(columnStart + self.tileShape[1], self.shape[1]))
+                      for rowStart in range(0, self.shape[0], self.tileShape[0])
+                      for columnStart in range(0, self.shape[1], self.tileShape[1])]
+
+    @staticmethod
+    def openRaster(path):
+        """ Returns the raster in a .npy file memory-mapped read-only, or the first array in a .npz file loaded into memory. """
+        if path.endswith('.npz'):
+            with np.load(path) as data:
+                return data[data.files[0]]
+        return np.load(path, mmap_mode='r')
+
+    def outputPath(self, metric):
+        return os.path.join(self.outputFolder, metric + '.npy')
+
+    def configuration(self):
+        """ Everything that affects the results, so a run is only resumed with the same configuration. """
+        return {'inputPaths': self.inputPaths,
+                'shape': list(self.shape),
+                'foragerSettings': self.foragerSettings,
+                'driftFile': self.driftFile,
+                'gridSize': self.gridSize,
+                'shouldOptimizeDiet': self.shouldOptimizeDiet,
+                'surrogateTablePath': self.surrogateTablePath,
+                'resolutions': list(self.resolutions)}
+
+    def loadProgress(self):
+        """ Returns the set of finished tile indices from an earlier run with the same configuration, or an empty set otherwise. A
+            resumed run keeps the earlier run's tiles, even if the memory budget or number of processes has changed. """
+        progressPath = os.path.join(self.outputFolder, RasterHabitatMap.PROGRESS_FILE)
+        if not os.path.isfile(progressPath):
+            return set()
+        with open(progressPath) as progressFile:
+            progress = json.load(progressFile)
+        if progress['configuration'] != json.loads(json.dumps(self.configuration())):
+            self.status("The output folder holds an unfinished raster run with different inputs or settings, so starting over.")
+            return set()
+        if not all(os.path.isfile(self.outputPath(metric)) for metric in RasterHabitatMap.OUTPUTS):
+            return set()
+        self.setTileShape(progress['tileShape'])
+        return set(progress['finishedTiles'])
+
+    def saveProgress(self, finishedTiles, isStandardized=False):
+        """ Writes the progress file to a temporary file and then replaces the old one, so an interruption never leaves it corrupted. """
+        progressPath = os.path.join(self.outputFolder, RasterHabitatMap.PROGRESS_FILE)
+        with open(progressPath + '.tmp', 'w') as progressFile:
+            json.dump({'configuration': self.configuration(), 'tileShape': list(self.tileShape), 'finishedTiles': sorted(finishedTiles), 'isStandardized': isStandardized}, progressFile)
+        os.replace(progressPath + '.tmp', progressPath)
+
+    def run(self, progress=None):
+        """ Processes every unfinished tile and then standardizes suitability. If given, progress(done, total) is called as tiles
+            finish. Returns the maximum NREI (J/s) over the raster. """
+        os.makedirs(self.outputFolder, exist_ok=True)
+        finishedTiles = self.loadProgress()
+        for metric in RasterHabitatMap.OUTPUTS + ('standardizedSuitability',):
+            if len(finishedTiles) == 0 or not os.path.isfile(self.outputPath(metric)):
+                output = np.lib.format.open_memmap(self.outputPath(metric), mode='w+', dtype=np.float32, shape=self.shape)
+                output[:] = np.nan
+                output.flush()
+                del output
+        if len(finishedTiles) > 0:
+            self.status("Resuming the raster run with {0} of {1} tiles already finished.".format(len(finishedTiles), len(self.tiles)))
+        else:
+            self.status("Mapping a {0} x {1} raster in {2} tiles of up to {3} x {4} cells.".format(*self.shape, len(self.tiles), *self.tileShape))
+        unfinished = [i for i in range(len(self.tiles)) if i not in finishedTiles]
+        tasks = [(self.outputFolder, self.inputPaths, self.tiles[i], self.foragerSettings, self.preyTypes, self.gridSize, self.shouldOptimizeDiet,
+                  self.surrogateTablePath, self.driftFile, self.resolutions) for i in unfinished]
+        for tileIndex, (modeledCount, interpolatedCount) in zip(unfinished, self.workers.imap(RasterHabitatMap.processTile, tasks)):
+            finishedTiles.add(tileIndex)
+            self.saveProgress(finishedTiles)
+            self.status("Finished raster tile {0} of {1}: modeled {2} unique inputs and interpolated {3} cells.".format(len(finishedTiles), len(self.tiles), modeledCount, interpolatedCount))
+            if progress is not None:
+                progress(len(finishedTiles), len(self.tiles))
+        return self.standardizeSuitability(finishedTiles)
+
+    def standardizeSuitability(self, finishedTiles):
+        """ Divides NREI by its maximum over the raster, one tile at a time to stay within the memory budget. """
+        netRate = np.load(self.outputPath('netRateOfEnergyIntake'), mmap_mode='r')
+        maxNetRateOfEnergyIntake = np.nan
+        for r0, r1, c0, c1 in self.tiles:
+            block = netRate[r0:r1, c0:c1]
+            if np.any(np.isfinite(block)):
+                maxNetRateOfEnergyIntake = np.fmax(maxNetRateOfEnergyIntake, np.nanmax(block))
+        suitability = np.load(self.outputPath('standardizedSuitability'), mmap_mode='r+')
+        for r0, r1, c0, c1 in self.tiles:
+            suitability[r0:r1, c0:c1] = netRate[r0:r1, c0:c1] / maxNetRateOfEnergyIntake
+        suitability.flush()
+        del suitability, netRate
+        self.saveProgress(finishedTiles, isStandardized=True)
+        self.status("Finished the raster habitat map with maximum NREI = {0:.4f} J/s. Results are in {1}.".format(maxNetRateOfEnergyIntake, self.outputFolder))
+        return maxNetRateOfEnergyIntake
+
+    @staticmethod
+    @lru_cache(maxsize=4)
+    def loadSurrogateTable(path):
+        """ Cached so each worker process loads a lookup table only once, no matter how many tiles it processes. """
+        return SurrogateTable.load(path)
+
+    @staticmethod
+    def quantize(values, resolution):
+        """ Vectorized QuantizedInputCache.quantize. """
+        if resolution <= 0:
+            return values
+        steps = np.round(values / resolution)
+        steps[(steps == 0) & (values > 0)] = 1
+        return steps * resolution
+
+    @staticmethod
+    def processTile(outputFolder, inputPaths, tile, foragerSettings, preyTypes, gridSize, shouldOptimizeDiet, surrogateTablePath, driftFile, resolutions):
+        """ Computes the results for one tile and writes them into the output rasters. Returns the number of unique inputs modeled and
+            the number of cells interpolated. This is a static method so it can run in a worker process. """
+        r0, r1, c0, c1 = tile
+        depth = np.array(RasterHabitatMap.openRaster(inputPaths['depth'])[r0:r1, c0:c1], dtype=float).ravel()
+        velocity = np.array(RasterHabitatMap.openRaster(inputPaths['velocity'])[r0:r1, c0:c1], dtype=float).ravel()
+        if inputPaths['roughness'] is not None:
+            roughness = np.array(RasterHabitatMap.openRaster(inputPaths['roughness'])[r0:r1, c0:c1], dtype=float).ravel()
+        else:
+            roughness = np.full(depth.shape, float(foragerSettings['roughness']))
+        values = {metric: np.full(depth.shape, np.nan) for metric in RasterHabitatMap.OUTPUTS}
+        remaining = np.isfinite(depth) & np.isfinite(velocity) & np.isfinite(roughness) & (depth > 0) & (velocity > 0)
+        interpolatedCount = 0
+        if surrogateTablePath is not None:
+            table = RasterHabitatMap.loadSurrogateTable(surrogateTablePath)
+            tableRoughness = table.metadata['foragerSettings']['roughness']
+            eligible = remaining.copy()
+            if 'roughness' not in table.axisNames:
+                eligible &= np.isclose(roughness, tableRoughness)  # a table without a roughness axis only applies at its own roughness
+            if table.appliesTo(dict(foragerSettings, roughness=tableRoughness), driftFile, gridSize, shouldOptimizeDiet) and np.any(eligible):
+                temperature = np.full(np.count_nonzero(eligible), float(foragerSettings['waterTemperature']))
+                points = table.points(depth[eligible], velocity[eligible], roughness[eligible], temperature)
+                inside = table.contains(points)
+                cells = np.flatnonzero(eligible)[inside]
+                for metric, metricValues in table.query(points[inside], RasterHabitatMap.OUTPUTS).items():
+                    values[metric][cells] = metricValues
+                remaining[cells] = False
+                interpolatedCount = len(cells)
+        modeledCount = 0
+        if np.any(remaining):
+            quantized = np.column_stack([RasterHabitatMap.quantize(inputValues[remaining], resolution)
+                                         for inputValues, resolution in zip((depth, velocity, roughness), resolutions)])
+            uniqueInputs, inverse = np.unique(quantized, axis=0, return_inverse=True)
+            inverse = inverse.ravel()
+            uniqueValues = {metric: np.zeros(len(uniqueInputs)) for metric in RasterHabitatMap.OUTPUTS}
+            for uniqueRoughness in np.unique(uniqueInputs[:, 2]):
+                indices = np.flatnonzero(uniqueInputs[:, 2] == uniqueRoughness)
+                points = [(uniqueInputs[i, 0], uniqueInputs[i, 1], None, None) for i in indices]
+                results = DriftForager.runPoints(dict(foragerSettings, roughness=float(uniqueRoughness)), preyTypes, None, points, shouldOptimizeDiet, gridSize)
+                for metric in RasterHabitatMap.OUTPUTS:
+                    uniqueValues[metric][indices] = [getattr(result, metric) for result in results]
+            cells = np.flatnonzero(remaining)
+            for metric in RasterHabitatMap.OUTPUTS:
+                values[metric][cells] = uniqueValues[metric][inverse]
+            modeledCount = len(uniqueInputs)
+        for metric in RasterHabitatMap.OUTPUTS:
+            output = np.load(os.path.join(outputFolder, metric + '.npy'), mmap_mode='r+')
+            output[r0:r1, c0:c1] = values[metric].reshape(r1 - r0, c1 - c0)
+            output.flush()
+            del output
+        return modeledCount, interpolatedCount
+
+    def status(self, message):
+        if self.ui is not None:
+            self.ui.status(message)
+        else:
+            print(message)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+This class holds the results of a model run over a grid of depths and velocities in columnar form: sorted depth and velocity axes and
+one (depth x velocity) NumPy array per metric. It replaces lists of SingleModelResult or DailyRunResult objects once a run is finished,
+so plots and exports read whole arrays instead of collecting an attribute from every result, and a surface of 10^5 cells takes a few
+megabytes rather than holding every result object (with its prey types and, for daily runs, 24 hourly results).
+
+Tables are exported in long format, with one row per depth/velocity cell and one column per metric, either as a CSV file or as a
+compressed binary columnar file: a Parquet file if pyarrow is installed, or otherwise a NumPy .npz file holding one array per column
+(plus the two axes), which np.load reads back in milliseconds.
+"""
+
+import csv
+import numpy as np
+
+
+class ResultTable(object):
+
+    @staticmethod
+    def fromResults(results, metrics):
+        """ Builds a table from result objects with depth and velocity attributes, keeping the given metrics. Cells of the grid with
+            no result are NaN. """
+        values = {}
+        for metric in metrics:
+            values[metric] = np.array([getattr(result, metric) for result in results])
+            if values[metric].dtype == object:  # e.g. None from results that don't define a metric
+                values[metric] = np.array([value if value is not None else np.nan for value in values[metric]], dtype=float)
+        return ResultTable.fromColumns([result.depth for result in results], [result.velocity for result in results], values)
+
+    @staticmethod
+    def fromColumns(depthValues, velocityValues, values):
+        """ Builds a table from long-format columns: the depth and velocity of each cell, and a dictionary of arrays of each metric's
+            values in the same order. Cells of the grid with no value are NaN. """
+        depthValues, velocityValues = np.asarray(depthValues, dtype=float), np.asarray(velocityValues, dtype=float)
+        depths, velocities = np.unique(depthValues), np.unique(velocityValues)
+        i, j = np.searchsorted(depths, depthValues), np.searchsorted(velocities, velocityValues)
+        isComplete = len(depthValues) == len(depths) * len(velocities)
+        columns = {}
+        for metric, metricValues in values.items():
+            metricValues = np.asarray(metricValues)
+            column = np.empty((len(depths), len(velocities)), dtype=metricValues.dtype) if isComplete else np.full((len(depths), len(velocities)), np.nan)
+            column[i, j] = metricValues
+            columns[metric] = column
+        return ResultTable(depths, velocities, columns)
+
+    @staticmethod
+    def binaryExtension():
+        """ Returns the extension of the binary columnar format that can be written: Parquet if pyarrow is installed, .npz otherwise. """
+        try:
+            import pyarrow.parquet  # optional dependency
+            return '.parquet'
+        except ImportError:
+            return '.npz'
+
+    @staticmethod
+    def load(path):
+        """ Reads a table saved by saveBinary, as a Parquet or .npz file depending on the extension. """
+        if path.endswith('.parquet'):
+            import pyarrow.parquet
+            data = pyarrow.parquet.read_table(path)
+            columns = {name: data.column(name).to_numpy() for name in data.column_names}
+            depthValues, velocityValues = columns.pop('depth'), columns.pop('velocity')
+            return ResultTable.fromColumns(depthValues, velocityValues, columns)
+        with np.load(path) as data:
+            depths, velocities = data['depths'], data['velocities']
+            metrics = [name for name in data.files if name not in ('depths', 'velocities', 'depth', 'velocity')]
+            return ResultTable(depths, velocities, {metric: data[metric].reshape(len(depths), len(velocities)) for metric in metrics})
+
+    def __init__(self, depths, velocities, columns):
+        self.depths = np.asarray(depths, dtype=float)
+        self.velocities = np.asarray(velocities, dtype=float)
+        self.columns = columns  # dictionary of (depth x velocity) arrays keyed by metric
+        depthGrid, velocityGrid = np.meshgrid(self.depths, self.velocities, indexing='ij')
+        self.flatDepths = depthGrid.ravel()  # depth and velocity of each cell, in the same order as column(metric).ravel()
+        self.flatVelocities = velocityGrid.ravel()
+        self.depthIndices = {ResultTable.axisKey(depth): i for i, depth in enumerate(self.depths)}  # axis value -> index, for slice lookups
+        self.velocityIndices = {ResultTable.axisKey(velocity): j for j, velocity in enumerate(self.velocities)}
+
+    @staticmethod
+    def axisKey(value):
+        return round(float(value), 9)  # rounded so values from slider positions match values from np.arange
+
+    @property
+    def metrics(self):
+        return tuple(self.columns.keys())
+
+    def column(self, metric):
+        return self.columns[metric]
+
+    def depthIndex(self, depth):
+        """ Returns the index of this depth on the table's axis, or None if it isn't one of the table's depths. Exact values are found
+            in the precomputed index, so slider moves don't scan the axis; others are matched within floating-point tolerance. """
+        i = self.depthIndices.get(ResultTable.axisKey(depth))
+        if i is None:
+            matches = np.flatnonzero(np.isclose(self.depths, depth))
+            i = matches[0] if len(matches) > 0 else None
+        return i
+
+    def velocityIndex(self, velocity):
+        j = self.velocityIndices.get(ResultTable.axisKey(velocity))
+        if j is None:
+            matches = np.flatnonzero(np.isclose(self.velocities, velocity))
+            j = matches[0] if len(matches) > 0 else None
+        return j
+
+    def depthCurve(self, metric, velocity):
+        """ Returns the depths and the metric's values along them at the given velocity, or None if it isn't one of the table's
+            velocities. """
+        j = self.velocityIndex(velocity)
+        return (self.depths, self.columns[metric][:, j]) if j is not None else None
+
+    def velocityCurve(self, metric, depth):
+        i = self.depthIndex(depth)
+        return (self.velocities, self.columns[metric][i, :]) if i is not None else None
+
+    def saveBinary(self, path):
+        """ Writes all the metrics to a compressed binary columnar file in long format, as Parquet if the path ends with .parquet and
+            as .npz otherwise. The .npz file also holds the depth and velocity axes, so the (depth x velocity) arrays can be recovered by
+            reshaping the columns to (len(depths), len(velocities)). """
+        columns = {'depth': self.flatDepths, 'velocity': self.flatVelocities}
+        columns.update({metric: column.ravel() for metric, column in self.columns.items()})
+        if path.endswith('.parquet'):
+            import pyarrow
+            import pyarrow.parquet
+            pyarrow.parquet.write_table(pyarrow.table(columns), path, compression='zstd')
+        else:
+            np.savez_compressed(path, depths=self.depths, velocities=self.velocities, **columns)
+
+    def exportCSV(self, path):
+        """ Writes all the metrics to a CSV file in long format, with one row per depth/velocity cell. """
+        with open(path, 'wt', newline='') as outFile:
+            writer = csv.writer(outFile)
+            writer.writerow(['depth', 'velocity'] + list(self.metrics))
+            writer.writerows(np.column_stack([self.flatDepths, self.flatVelocities] + [column.ravel().astype(float) for column in self.columns.values()]).tolist())
@@ -3,14 +3,20 @@
 """
 This class holds the result of a single model run and calculates the final model performance metrics and internal
 statistics based on the totals of various quantities over a single unit of searching time.
+
+The diet is kept as a read-only array of the ingestion rate (items/s) of each prey type offered to the fish, which is 0 for types
+left out of the optimal diet, along with a tuple of the prey types' labels in the same order. The label tuple is shared by all the
+results of a run, so each result only holds its own small array rather than references to the forager's PreyType objects.
 """
 
 import numpy as np
 
 class SingleModelResult(object):
     
-    def __init__(self, depth, velocity, preyTypes, totalHandlingTime, totalEnergyIntake, totalReactionDistance, totalPreyEncountered, totalPreyIngested, totalCaptureManeuverCost, totalFocalSwimmingCost, proportionAssimilated):
-        """ All of the 'total' inputs here refer to the total of the given quantity resulting from 1 unit (second) of searching time. """ 
+    def __init__(self, depth, velocity, preyLabels, preyIngestionCounts, numPreyTypes, totalHandlingTime, totalEnergyIntake, totalReactionDistance, totalPreyEncountered, totalPreyIngested, totalCaptureManeuverCost, totalFocalSwimmingCost, proportionAssimilated):
+        """ All of the 'total' inputs here refer to the total of the given quantity resulting from 1 unit (second) of searching time,
+            including preyIngestionCounts, which has the number of items of each prey type in preyLabels ingested (0 for types not in
+            the diet of numPreyTypes types). """ 
         self.depth = depth
         self.velocity = velocity
         totalTime = 1 + totalHandlingTime  # total time involved is 1 unit of search time plus corresponding handling time
@@ -25,15 +31,19 @@ class SingleModelResult(object):
         self.encounterRate = totalPreyEncountered / totalTime
         self.meanPreyEnergyValue = totalEnergyIntake / totalPreyIngested if totalPreyIngested > 0 else np.nan  # gross energy intake per item ingested
         self.captureSuccess = self.ingestionRate / self.encounterRate if self.encounterRate > 0 else np.nan
-        self.preyTypes = preyTypes
-        self.numPreyTypes = len(preyTypes) 
+        self.preyLabels = preyLabels
+        self.preyIngestionRates = np.asarray(preyIngestionCounts, dtype=float) / totalTime
+        self.preyIngestionRates.flags.writeable = False
+        self.numPreyTypes = numPreyTypes
         self.proportionAssimilated = proportionAssimilated
-        for preyType in self.preyTypes: preyType.ingestionRate = preyType.ingestionCount / totalTime
         self.pointLabel = None  # for temporary storage of point label when processing from a batch file
         # The following are placeholders for numbers set externally when processing Daily NEI and risk
         self.hour = None
         self.hourlyRisk = None
-        self.actuallyForaged = None
+
+    def preyIngestionRate(self, label):
+        """ Returns the ingestion rate (items/s) of the prey type with this label, or 0 if it wasn't offered to the fish. """
+        return self.preyIngestionRates[self.preyLabels.index(label)] if label in self.preyLabels else 0
         
     def standardizeSuitability(self, maxNetRateOfEnergyIntake):
         ''' This standardizes habitat suitability to a maximum of 1. It's set in a separate function because the standardized suitability for each model result
@@ -45,7 +55,7 @@ class SingleModelResult(object):
 
 class EmptySingleModelResult:
 
-    def __init__(self, depth, velocity, preyTypes):
+    def __init__(self, depth, velocity, preyLabels):
         """ Placeholder for batch 3 results calculated on the input points defined at the edges of the grid, with depth/velocity 0. The fish
             can't actually occupy these, but they have to be included in the grid to define the conditions between the edges and adjacent points.
             Only their positionOnTransect is actually important."""
@@ -62,16 +72,43 @@ class EmptySingleModelResult:
         self.encounterRate = 0
         self.meanPreyEnergyValue = np.nan
         self.captureSuccess = np.nan
-        self.preyTypes = preyTypes
-        self.numPreyTypes = len(preyTypes)
+        self.preyLabels = preyLabels
+        self.preyIngestionRates = np.zeros(len(preyLabels))
+        self.preyIngestionRates.flags.writeable = False
+        self.numPreyTypes = len(preyLabels)
         self.proportionAssimilated = np.nan
-        for preyType in self.preyTypes: preyType.ingestionRate = 0
         self.pointLabel = None  # for temporary storage of point label when processing from a batch file
         self.standardizedSuitability = 0
         # Again, placeholders for hourly analysis below
+        self.hour = None
         self.hourlyRisk = None
-        self.actuallyForaged = None
+
+    def preyIngestionRate(self, label):
+        return 0
 
     def standardizeSuitability(self, dummyNREI):
         """ Exists so results from this class can be treated the same as for normal results in the rest of the code."""
         self.standardizedSuitability = 0
+
+class InterpolatedModelResult:
+
+    def __init__(self, depth, velocity, values, interpolationError):
+        """ Holds a result interpolated from a SurrogateTable rather than modeled directly. The values are a dictionary of the table's
+            metrics at this point, and interpolationError is the estimated error in NREI (J/s). There are no prey types, so the diet
+            and per-prey outputs aren't available for these results. """
+        self.depth = depth
+        self.velocity = velocity
+        for metric, value in values.items():
+            setattr(self, metric, value)
+        self.interpolationError = interpolationError
+        self.preyLabels = ()
+        self.preyIngestionRates = np.zeros(0)
+        self.pointLabel = None  # for temporary storage of point label when processing from a batch file
+        self.hour = None
+        self.hourlyRisk = None
+
+    def preyIngestionRate(self, label):
+        return np.nan
+
+    def standardizeSuitability(self, maxNetRateOfEnergyIntake):
+        self.standardizedSuitability = self.netRateOfEnergyIntake / maxNetRateOfEnergyIntake
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+This class stores the instantaneous model results for one fish and drift file on a dense lattice of depth and velocity (and optionally
+roughness and temperature), and answers queries at any number of points by multilinear interpolation. NREI and the other results are
+smooth functions of these inputs, so a table with modest spacing reproduces the model closely, while a query over millions of points
+from a hydraulic model takes seconds instead of hours.
+
+Tables are built in parallel with DriftForager.runPoints and saved as compressed NumPy .npz files holding the axes, one array per
+result metric, and the settings they were built with (as JSON), so a batch run can check whether a table applies to its inputs.
+
+Each query can also return an estimate of its interpolation error. At each node, the error of linear interpolation along each axis is
+estimated from the second difference there, as |f''| h^2 / 8 with h the wider of the two adjacent intervals, and these are summed over
+the axes. The error at a query point is interpolated from those node values in the same way as the metric itself.
+"""
+
+import datetime
+import json
+
+import numpy as np
+from scipy.interpolate import RegularGridInterpolator
+
+from DriftModelRT.DriftForager import DriftForager
+from DriftModelRT.ParallelWorkers import ParallelWorkers
+
+
+class SurrogateTable(object):
+
+    METRICS = ('netRateOfEnergyIntake', 'grossRateOfEnergyIntake', 'captureManeuverCostRate', 'focalSwimmingCostRate', 'totalEnergyCostRate',
+               'meanReactionDistance', 'captureSuccess', 'proportionOfTimeSpentHandling', 'ingestionRate', 'encounterRate',
+               'meanPreyEnergyValue', 'numPreyTypes', 'proportionAssimilated')
+
+    @staticmethod
+    def build(foragerSettings, preyTypes, driftFile, depths, velocities, roughnesses=None, temperatures=None, gridSize=10, shouldOptimizeDiet=True,
+              processes=None, progress=None):
+        """ Runs the instantaneous model at every combination of the given depths (cm) and velocities (cm/s), and of the roughnesses (cm)
+            and temperatures (C) if given; otherwise those stay fixed at the values in foragerSettings. The prey types must be unfiltered,
+            as loaded from driftFile. If given, progress(done, total) is called as the work finishes, e.g. to update a progress bar. """
+        axisNames = ['depth', 'velocity']
+        axes = [np.unique(np.asarray(depths, dtype=float)), np.unique(np.asarray(velocities, dtype=float))]
+        for name, values in (('roughness', roughnesses), ('temperature', temperatures)):
+            if values is not None:
+                axisNames.append(name)
+                axes.append(np.unique(np.asarray(values, dtype=float)))
+        for name, axis in zip(axisNames, axes):
+            if len(axis) < 2:
+                raise ValueError("A lookup table needs at least 2 distinct {0} values.".format(name))
+        roughnessAxis = axes[axisNames.index('roughness')] if 'roughness' in axisNames else [foragerSettings['roughness']]
+        temperatureAxis = axes[axisNames.index('temperature')] if 'temperature' in axisNames else [foragerSettings['waterTemperature']]
+        workers = ParallelWorkers(processes)
+        depthVelocityPoints = [(depth, velocity, None, None) for depth in axes[0] for velocity in axes[1]]
+        chunkSize = max(1, int(np.ceil(len(depthVelocityPoints) * len(roughnessAxis) * len(temperatureAxis) / (4 * workers.processes))))
+        tasks = []
+        for roughness in roughnessAxis:
+            for temperature in temperatureAxis:
+                settings = dict(foragerSettings, roughness=float(roughness), waterTemperature=float(temperature))
+                for start in range(0, len(depthVelocityPoints), chunkSize):
+                    tasks.append((settings, preyTypes, None, depthVelocityPoints[start:start + chunkSize], shouldOptimizeDiet, gridSize))
+        results = []
+        for i, chunkResults in enumerate(workers.imap(DriftForager.runPoints, tasks)):
+            results.extend(chunkResults)
+            if progress is not None:
+                progress(i + 1, len(tasks))
+        # Results are ordered by roughness, temperature, depth, velocity; rearrange to the order of the table's axes
+        shape = (len(roughnessAxis), len(temperatureAxis), len(axes[0]), len(axes[1]))
+        values = {}
+        for metric in SurrogateTable.METRICS:
+            table = np.array([getattr(result, metric) for result in results], dtype=float).reshape(shape).transpose(2, 3, 0, 1)
+            values[metric] = table.reshape([len(axis) for axis in axes])  # drops the roughness/temperature axes if they're fixed
+        metadata = {'axes': axisNames,
+                    'foragerSettings': foragerSettings,
+                    'driftFile': driftFile,
+                    'gridSize': gridSize,
+                    'shouldOptimizeDiet': shouldOptimizeDiet,
+                    'created': datetime.datetime.now().isoformat(timespec='seconds')}
+        return SurrogateTable(axes, values, metadata)
+
+    @staticmethod
+    def load(path):
+        with np.load(path, allow_pickle=False) as data:
+            metadata = json.loads(str(data['metadata']))
+            axes = [data['axis_' + name] for name in metadata['axes']]
+            values = {metric: data[metric] for metric in SurrogateTable.METRICS}
+        return SurrogateTable(axes, values, metadata)
+
+    def __init__(self, axes, values, metadata):
+        self.axes = axes
+        self.values = values  # dictionary of arrays over the axes, keyed by metric
+        self.metadata = metadata
+        self.axisNames = metadata['axes']
+        self.interpolators = {}  # created when first queried
+        self.errorInterpolators = {}
+
+    def save(self, path):
+        arrays = {'axis_' + name: axis for name, axis in zip(self.axisNames, self.axes)}
+        arrays.update(self.values)
+        np.savez_compressed(path, metadata=np.array(json.dumps(self.metadata)), **arrays)
+
+    def appliesTo(self, foragerSettings, driftFile, gridSize, shouldOptimizeDiet):
+        """ Returns True if the table was built with these settings. Roughness and temperature only need to match if they're not axes
+            of the table, in which case inputs must also be within the table's range to be looked up (see contains). """
+        tableSettings = self.metadata['foragerSettings']
+        variableSettings = {'roughness': 'roughness', 'temperature': 'waterTemperature'}
+        for name, value in foragerSettings.items():
+            if name in [variableSettings[axisName] for axisName in self.axisNames if axisName in variableSettings]:
+                continue
+            if name not in tableSettings or not np.isclose(value, tableSettings[name]):
+                return False
+        return driftFile == self.metadata['driftFile'] and gridSize == self.metadata['gridSize'] and shouldOptimizeDiet == self.metadata['shouldOptimizeDiet']
+
+    def points(self, depth, velocity, roughness=None, temperature=None):
+        """ Returns an array of query points with one row per point and one column per table axis. """
+        inputs = {'depth': depth, 'velocity': velocity, 'roughness': roughness, 'temperature': temperature}
+        columns = []
+        for name in self.axisNames:
+            if inputs[name] is None:
+                raise ValueError("This lookup table requires {0} values.".format(name))
+            columns.append(np.atleast_1d(np.asarray(inputs[name], dtype=float)))
+        return np.column_stack(np.broadcast_arrays(*columns))
+
+    def contains(self, points):
+        """ Returns a boolean array that is True for points (from the points method) within the range of the table. """
+        inside = np.ones(len(points), dtype=bool)
+        for a, axis in enumerate(self.axes):
+            inside &= (points[:, a] >= axis[0]) & (points[:, a] <= axis[-1])
+        return inside
+
+    def query(self, points, metrics=None):
+        """ Returns a dictionary of arrays of the interpolated metrics (all of them by default) at the points, with NaN for points
+            outside the table. """
+        values = {}
+        for metric in metrics if metrics is not None else SurrogateTable.METRICS:
+            if metric not in self.interpolators:
+                self.interpolators[metric] = RegularGridInterpolator(self.axes, self.values[metric], bounds_error=False, fill_value=np.nan)
+            values[metric] = self.interpolators[metric](points)
+        return values
+
+    def queryErrors(self, points, metrics=('netRateOfEnergyIntake',)):
+        """ Returns a dictionary of arrays of the estimated interpolation errors of the given metrics at the points. """
+        errors = {}
+        for metric in metrics:
+            if metric not in self.errorInterpolators:
+                self.errorInterpolators[metric] = RegularGridInterpolator(self.axes, SurrogateTable.interpolationErrorAtNodes(self.axes, self.values[metric]),
+                                                                          bounds_error=False, fill_value=np.nan)
+            errors[metric] = self.errorInterpolators[metric](points)
+        return errors
+
+    @staticmethod
+    def interpolationErrorAtNodes(axes, values):
+        """ Estimates the linear interpolation error near each node of the table as described at the top of this file. Axes with only
+            2 nodes have no second differences and don't contribute. """
+        totalError = np.zeros(values.shape)
+        for a, x in enumerate(axes):
+            if len(x) < 3:
+                continue
+            f = np.moveaxis(values, a, 0)
+            h1 = (x[1:-1] - x[:-2]).reshape((-1,) + (1,) * (f.ndim - 1))
+            h2 = (x[2:] - x[1:-1]).reshape(h1.shape)
+            secondDerivative = np.abs(2 * (f[2:] / (h2 * (h1 + h2)) - f[1:-1] / (h1 * h2) + f[:-2] / (h1 * (h1 + h2))))
+            axisError = secondDerivative * np.maximum(h1, h2) ** 2 / 8
+            axisError = np.concatenate((axisError[:1], axisError, axisError[-1:]))  # end nodes use their neighbor's estimate
+            totalError += np.nan_to_num(np.moveaxis(axisError, 0, a))
+        return totalError
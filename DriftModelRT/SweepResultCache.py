@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+This class keeps the results of depth/velocity sweeps on the Inputs tab between runs, so that extending the maximum depth or velocity,
+or refining the intervals, only runs the model at the new depth/velocity pairs. Results are indexed by a configuration key built from
+everything that affects them (the forager's settings, its filtered prey types, the spatial grid size, diet optimization, and for daily
+runs the DailyScenario), so changing anything else, like the plotted response or the sweep's range, reuses them. Only the results of a
+few recent configurations are kept, so switching back and forth between two fish or drift files is also incremental.
+"""
+
+import collections
+
+
+class SweepResultCache(object):
+
+    def __init__(self, maxConfigurations=4):
+        self.maxConfigurations = maxConfigurations
+        self.configurations = collections.OrderedDict()  # {configuration key: {(depth, velocity): result}}, most recently used last
+
+    @staticmethod
+    def configurationKey(forager, gridSize, shouldOptimizeDiet, scenario=None):
+        """ Returns the key for results of this forager, including its prey types as filtered for its size, so a different drift file
+            (or the same file edited) only matches if the prey types it gives the fish are the same. """
+        preyTypes = tuple((preyType.label, preyType.minLength, preyType.maxLength, preyType.driftDensity, preyType.energyContent) for preyType in forager.preyTypes)
+        return (tuple(forager.settings().items()), preyTypes, gridSize, bool(shouldOptimizeDiet), scenario.cacheKey() if scenario is not None else None)
+
+    @staticmethod
+    def pointKey(depth, velocity):
+        return (round(float(depth), 9), round(float(velocity), 9))  # rounded so depths from different np.arange calls match
+
+    def resultsFor(self, configurationKey):
+        """ Returns the dictionary of stored results for the configuration, creating it (and forgetting the least recently used
+            configuration, if there are too many) if necessary. """
+        if configurationKey not in self.configurations:
+            self.configurations[configurationKey] = {}
+            while len(self.configurations) > self.maxConfigurations:
+                self.configurations.popitem(last=False)
+        self.configurations.move_to_end(configurationKey)
+        return self.configurations[configurationKey]
+
+    def lookup(self, configurationKey, depth, velocity):
+        """ Returns the stored result at this depth and velocity, or None if it hasn't been calculated. """
+        return self.resultsFor(configurationKey).get(SweepResultCache.pointKey(depth, velocity))
+
+    def store(self, configurationKey, depth, velocity, result):
+        self.resultsFor(configurationKey)[SweepResultCache.pointKey(depth, velocity)] = result
+        return result
+
+    def evaluate(self, configurationKey, points, evaluate):
+        """ Returns the results at a list of (depth, velocity) points, calling evaluate with the list of points that haven't been
+            calculated yet (if any), which must return their results in the same order. """
+        results = self.resultsFor(configurationKey)
+        missing = [point for point in dict.fromkeys(points) if SweepResultCache.pointKey(*point) not in results]
+        if len(missing) > 0:
+            for point, result in zip(missing, evaluate(missing)):
+                results[SweepResultCache.pointKey(*point)] = result
+        return [results[SweepResultCache.pointKey(*point)] for point in points]
@@ -1,7 +1,12 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-""" This class recreates some of functionality of CalculationGrid, but for values on a transect. """
+""" This class recreates some of functionality of CalculationGrid, but for values on a transect.
+
+    Each transect is described by a dictionary from transectInterpolations (see below), holding its label and the depth, velocity,
+    and roughness measured at each position along it, which are linearly interpolated between positions and 0 beyond its ends. The
+    transects are registered by a key built from their label and data, so grids can be memoized with lru_cache by that key and the
+    focal parameters, regardless of which dictionary object (or which worker process's copy of it) they come from. """
 
 import functools
 import numpy as np
@@ -11,8 +16,24 @@ from DriftModelRT.CalculationGrid import CalculationGrid
 
 class TransectCalculationGrid(object):
 
+    profiles = {}  # transect data keyed by transectInterpolations['key'], registered when a grid on that transect is first built
+
+    @staticmethod
+    def transectInterpolations(label, positions, depths, velocities, roughnesses):
+        """ Returns the dictionary describing one transect, with the measurements sorted by position. The key identifies both the
+            label and the data, so transects with the same label from different batch files never share cached grids. """
+        order = np.argsort(positions, kind='stable')
+        profile = {'label': label,
+                   'positions': np.asarray(positions, dtype=float)[order],
+                   'depth': np.asarray(depths, dtype=float)[order],
+                   'velocity': np.asarray(velocities, dtype=float)[order],
+                   'roughness': np.asarray(roughnesses, dtype=float)[order]}
+        profile['key'] = (label, hash(tuple(profile[name].tobytes() for name in ('positions', 'depth', 'velocity', 'roughness'))))
+        return profile
+
+    @staticmethod
     @functools.lru_cache(maxsize=2048)
-    def constructCells(self, focalPositionOnTransect, reactionDistance, focalDepth, velocityProfileMethod, userGridSize):
+    def constructCells(transectKey, focalPositionOnTransect, reactionDistance, focalDepth, velocityProfileMethod, userGridSize):
         """ This method builds the grid cells. It really contains everything we want to do in __init__, but it has to be
             abstracted out of __init__ so we can memoize previously calculated results with lru_cache, which vastly speeds
             up the program's calculation of the full model.
@@ -20,38 +41,88 @@ class TransectCalculationGrid(object):
             Note that unlike with regular CalculationGrid, this one isn't doing calculations on a half-grid and then doubling.
             It calculates both sides, since they may have different depth/velocity/roughness. An x grid size will in effect
             be doubled here, in comparison to the same size in the symmetric case.
+
+            Depth, velocity, and roughness are interpolated for all the columns at once, and each column's cells are laid out
+            in one flat array (with column-specific vertical spacing), so the cells are selected with masks rather than loops.
             """
+        profile = TransectCalculationGrid.profiles[transectKey]
+        xGridSize = userGridSize if userGridSize < reactionDistance / 5 else reactionDistance / 5  # Make sure calculations don't fail from too few grid cells
+        xVertices = np.arange(-(reactionDistance + xGridSize), reactionDistance + xGridSize, xGridSize)
+        xCenters = (xVertices[:-1] + xVertices[1:]) / 2
+        widths = np.diff(xVertices)
+        xPositionsOnTransect = focalPositionOnTransect + xCenters
+        depthAtX, meanColumnVelocityAtX, roughnessAtX = (np.interp(xPositionsOnTransect, profile['positions'], profile[name], left=0, right=0)
+                                                         for name in ('depth', 'velocity', 'roughness'))
+        columns = np.flatnonzero((depthAtX > 0) & (meanColumnVelocityAtX > 0))  # skip columns on transect edges with 0 depth, on land, or with glitched velocities
+        if len(columns) == 0:
+            return []
+        depthAtX, meanColumnVelocityAtX, roughnessAtX = depthAtX[columns], meanColumnVelocityAtX[columns], roughnessAtX[columns]
+        zGridSizes = np.where(userGridSize < depthAtX / 5, userGridSize, depthAtX / 5)  # Make sure calculations don't fail from too few grid cells
+        zCounts = np.ceil((depthAtX + zGridSizes) / zGridSizes).astype(int) - 1  # number of z cells from np.arange(0, depth + zGridSize, zGridSize)
+        column = np.repeat(np.arange(len(columns)), zCounts)
+        j = np.arange(len(column)) - np.repeat(np.cumsum(zCounts) - zCounts, zCounts)  # index of each cell within its column
+        x = xCenters[columns][column]
+        z = (j + 0.5) * zGridSizes[column]
+        depth = depthAtX[column]
+        distance = np.sqrt(x ** 2 + (z - (depth - focalDepth)) ** 2)  # the focal point is at x = 0, focalDepth below the surface
+        inGrid = (0 < z) & (z < depth) & (distance <= reactionDistance)
+        column, z, depth, distance = column[inGrid], z[inGrid], depth[inGrid], distance[inGrid]
+        velocity = CalculationGrid.velocitiesAtDepths(velocityProfileMethod, depth - z, depth, meanColumnVelocityAtX[column], roughnessAtX[column])
+        area = zGridSizes[column] * widths[columns][column]
+        return [GridCell(cellDistance, cellVelocity, cellArea) for cellDistance, cellVelocity, cellArea in zip(distance, velocity, area)]
+
+    @staticmethod
+    def sweepCells(transectInterpolations, positions, reactionDistance, focalDepths, velocityProfileMethod, userGridSize):
+        """ Builds the grids for a sweep across evenly spaced focal positions on a transect all at once. Neighboring positions share
+            almost all of their water columns, because the grid just shifts sideways, so the columns are laid out once on a lattice
+            along the whole transect whose spacing divides the distance between positions, and each grid is a window of that lattice.
+            The spacing is the largest that does so without exceeding the usual grid size, so it may be a little finer.
+
+            Returns a dictionary of arrays for every cell in the lattice ('velocity' and 'area'), and a generator that yields one
+            (positionIndex, cellIndex, distance) tuple of arrays for each lateral column offset within the grids, covering every cell
+            in the foraging area of each position's grid. Quantities that depend only on the cell (like its velocity or handling costs)
+            can therefore be calculated once per lattice cell, and only those that depend on the distance from the fish are calculated
+            per position. The focal depths are those of the fish at each position. """
+        profile = TransectCalculationGrid.profiles.setdefault(transectInterpolations['key'], transectInterpolations)
+        positions = np.asarray(positions, dtype=float)
         xGridSize = userGridSize if userGridSize < reactionDistance / 5 else reactionDistance / 5  # Make sure calculations don't fail from too few grid cells
+        columnsPerStep = 1
+        if len(positions) > 1:
+            step = positions[1] - positions[0]
+            columnsPerStep = int(np.ceil(step / xGridSize - 1e-9))
+            xGridSize = step / columnsPerStep
         xVertices = np.arange(-(reactionDistance + xGridSize), reactionDistance + xGridSize, xGridSize)
-        xCenters = [(xVertices[i] + xVertices[i + 1]) / 2 for i in range(len(xVertices) - 1)]
-        cells = []
-        for i, x in enumerate(xCenters):
-            xPositionOnTransect = focalPositionOnTransect + x
-            depthAtX = float(self.transectInterpolations['depth'](xPositionOnTransect))
-            if depthAtX <= 0:
-                continue  # skip the rest of cell construction for this point if we're on a transect edge with 0 depth, or on land
-            meanColumnVelocityAtX = float(self.transectInterpolations['velocity'](xPositionOnTransect))
-            if meanColumnVelocityAtX <= 0:
-                continue  # likewise skip this x point if velocity is 0, or less due to any input glitches
-            roughnessAtX = float(self.transectInterpolations['roughness'](xPositionOnTransect))
-            focalPoint = (0, depthAtX - focalDepth)
-            zGridSize = userGridSize if userGridSize < depthAtX / 5 else depthAtX / 5  # Make sure calculations don't fail from too few grid cells
-            zVertices = np.arange(0, depthAtX + zGridSize, zGridSize)
-            zCenters = [(zVertices[i] + zVertices[i + 1]) / 2 for i in range(len(zVertices) - 1)]
-            width = xVertices[i + 1] - xVertices[i]
-            for j, z in enumerate(zCenters):
-                height = zVertices[j + 1] - zVertices[j]
-                rectArea = height * width
-                distance = ((x - focalPoint[0]) ** 2 + (z - focalPoint[1]) ** 2) ** 0.5
-                velocity = CalculationGrid.velocityAtDepth(velocityProfileMethod, depthAtX - z, depthAtX, meanColumnVelocityAtX, roughnessAtX)
-                if 0 < z < depthAtX and ((x - focalPoint[0]) ** 2 + (z - focalPoint[1]) ** 2) ** 0.5 <= reactionDistance:
-                    cells.append(GridCell(distance, velocity, rectArea))
-        return cells
+        xCenters = (xVertices[:-1] + xVertices[1:]) / 2
+        latticePositions = positions[0] + xCenters[0] + xGridSize * np.arange((len(positions) - 1) * columnsPerStep + len(xCenters))
+        depthAtX, meanColumnVelocityAtX, roughnessAtX = (np.interp(latticePositions, profile['positions'], profile[name], left=0, right=0)
+                                                         for name in ('depth', 'velocity', 'roughness'))
+        isWet = (depthAtX > 0) & (meanColumnVelocityAtX > 0)
+        zGridSizes = np.where(userGridSize < depthAtX / 5, userGridSize, depthAtX / 5)
+        zCounts = np.where(isWet, np.ceil((depthAtX + zGridSizes) / np.where(isWet, zGridSizes, 1)) - 1, 0).astype(int)
+        columnStarts = np.cumsum(zCounts) - zCounts
+        column = np.repeat(np.arange(len(latticePositions)), zCounts)
+        z = (np.arange(len(column)) - columnStarts[column] + 0.5) * zGridSizes[column]
+        depth = depthAtX[column]
+        cells = {'velocity': CalculationGrid.velocitiesAtDepths(velocityProfileMethod, depth - z, depth, meanColumnVelocityAtX[column], roughnessAtX[column]),
+                 'area': zGridSizes[column] * xGridSize}
+        focalDepths = np.asarray(focalDepths, dtype=float)
+
+        def offsets():
+            for k, x in enumerate(xCenters):
+                columns = np.arange(len(positions)) * columnsPerStep + k
+                counts = zCounts[columns]
+                positionIndex = np.repeat(np.arange(len(positions)), counts)
+                cellIndex = np.repeat(columnStarts[columns], counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+                distance = np.sqrt(x ** 2 + (z[cellIndex] - (depth[cellIndex] - focalDepths[positionIndex])) ** 2)
+                inGrid = (0 < z[cellIndex]) & (z[cellIndex] < depth[cellIndex]) & (distance <= reactionDistance)
+                yield positionIndex[inGrid], cellIndex[inGrid], distance[inGrid]
+
+        return cells, offsets()
 
     def __init__(self, transectInterpolations, focalPositionOnTransect, reactionDistance, focalDepth, velocityProfileMethod, userGridSize):
         """The default symmetryFactor of 2 allows for performing the calculations on half the grid (i.e., to the fish's right) and
             then doubling the results when using a symmetric grid. Grids used by batch method 3, with fish foraging along an asymmetrical
             transect, have a symmetryFactor of 1."""
-        self.transectInterpolations = transectInterpolations
-        self.cells = self.constructCells(focalPositionOnTransect, reactionDistance, focalDepth, velocityProfileMethod, userGridSize)
-        self.symmetryFactor = 1
\ No newline at end of file
+        TransectCalculationGrid.profiles.setdefault(transectInterpolations['key'], transectInterpolations)
+        self.cells = TransectCalculationGrid.constructCells(transectInterpolations['key'], focalPositionOnTransect, reactionDistance, focalDepth, velocityProfileMethod, userGridSize)
+        self.symmetryFactor = 1
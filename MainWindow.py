@@ -13,13 +13,26 @@ from PyQt5 import QtWidgets
 from PyQt5.QtGui import QDoubleValidator, QIntValidator
 from DriftModelRT.DriftForager import DriftForager
 from DriftModelRT.PreyType import PreyType
+from DriftModelRT.QuantizedInputCache import QuantizedInputCache
+from DriftModelRT.DailyScenario import DailyScenario
+from DriftModelRT.ParallelWorkers import ParallelWorkers
+from DriftModelRT.ClusterWorkers import ClusterWorkers
+from DriftModelRT.TransectCalculationGrid import TransectCalculationGrid
+from DriftModelRT.SurrogateTable import SurrogateTable
+from DriftModelRT.RasterHabitatMap import RasterHabitatMap
+from DriftModelRT.SingleModelResult import InterpolatedModelResult
+from DriftModelRT.AdaptiveSurfaceSampler import AdaptiveSurfaceSampler
+from DriftModelRT.SweepResultCache import SweepResultCache
+from DriftModelRT.DailyRunResult import DailyRunResult
+from DriftModelRT.BatchCheckpoint import BatchCheckpoint
+from DriftModelRT.BatchShard import BatchShard
 from ModelSetResult import InstantaneousModelSetResult, DailyModelSetResult
 import os
 import csv
 import pickle
+import socket
 import sys
 import datetime
-from scipy.interpolate import interp1d
 
 def resource_path(relative_path):  ## Function necessary for Pyinstaller to find .ui file during compilation
     """ Get absolute path to resource, works for dev and for PyInstaller """
@@ -33,6 +46,34 @@ Ui_MainWindow, QMainWindow = loadUiType(ui_path)  # Load the classes defined by
 
 class MainWindow(QMainWindow, Ui_MainWindow):
 
+    # (header, result attribute) pairs for the model outputs written to batch method 1 and 3 output files
+    INSTANTANEOUS_OUTPUT_COLUMNS = (('Net rate of energy intake (J/s)', 'netRateOfEnergyIntake'),
+                                    ('Standardized habitat suitability', 'standardizedSuitability'),
+                                    ('Gross rate of energy intake (J/s)', 'grossRateOfEnergyIntake'),
+                                    ('Energy cost of maneuvering (J/s)', 'captureManeuverCostRate'),
+                                    ('Energy cost of focal swimming (J/s)', 'focalSwimmingCostRate'),
+                                    ('Total energy costs (J/s)', 'totalEnergyCostRate'),
+                                    ('Mean reaction distance (cm)', 'meanReactionDistance'),
+                                    ('Prey capture success proportion', 'captureSuccess'),
+                                    ('Proportion of time handling prey', 'proportionOfTimeSpentHandling'),
+                                    ('Prey ingestion rate (items/s)', 'ingestionRate'),
+                                    ('Prey encounter rate (items/s)', 'encounterRate'),
+                                    ('Mean prey energy value (J)', 'meanPreyEnergyValue'),
+                                    ('Number of prey types in diet', 'numPreyTypes'),
+                                    ('Proportion of energy assimilated', 'proportionAssimilated'))
+    DAILY_OUTPUT_COLUMNS = (('Daily net energy intake (J)', 'dailyNetEnergyIntake'),
+                            ('Standardized habitat suitability', 'standardizedSuitability'),
+                            ('Daily risk-balancing metric', 'dailyRiskBalancingMetric'),
+                            ('Predation risk per day', 'dailyRisk'),
+                            ('Predation risk per 90 days', 'dailyRiskOn90DayHorizon'),
+                            ('Daily gross energy intake (J)', 'dailyGrossEnergyIntake'),
+                            ('Daily total energy cost (J)', 'dailyCost'),
+                            ('Daily focal swimming cost (J)', 'dailyFocalSwimmingCost'),
+                            ('Daily capture maneuver cost (J)', 'dailyCaptureManeuverCost'),
+                            ('Daily hours foraging', 'dailyHoursForaging'),
+                            ('Daily specific consumption (g/g/day)', 'dailySpecificConsumption'),
+                            ('Proportion of maximum ration', 'dailySpecificConsumptionProportional'))
+
     def __init__(self, app):
         super(MainWindow, self).__init__()
         self.setupUi(self)
@@ -49,11 +90,19 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.btnBatchMethod2File.clicked.connect(lambda: self.chooseFile('batch method 2'))
         self.btnBatchMethod3File.clicked.connect(lambda: self.chooseFile('batch method 3'))
         self.btnHourlyDetailsFile.clicked.connect(lambda: self.chooseFile('hourly details'))
+        self.btnSurrogateTableFile.clicked.connect(lambda: self.chooseFile('lookup table'))
+        self.btnBuildSurrogateTable.clicked.connect(self.buildSurrogateTable)
+        self.btnRasterDepthFile.clicked.connect(lambda: self.chooseFile('depth raster'))
+        self.btnRasterVelocityFile.clicked.connect(lambda: self.chooseFile('velocity raster'))
+        self.btnRasterRoughnessFile.clicked.connect(lambda: self.chooseFile('roughness raster'))
+        self.btnRunRasterMap.clicked.connect(self.runRasterMap)
         self.btnRunModel.clicked.connect(lambda: self.runModel(shouldShowPlots=True, shouldConfigureForager=True, gotPreyTypesFromBatchFile=False))
         self.btnRunDailyModel.clicked.connect(lambda: self.runDailyModel(shouldShowPlots=True, shouldConfigureForager=True, gotPreyTypesFromBatchFile=False))
+        self.btnRunDailyCalendar.clicked.connect(self.runDailyCalendar)
         self.btnRunModelOnBatchMethod1.clicked.connect(self.runBatchMethod1)
         self.btnRunModelOnBatchMethod2.clicked.connect(self.runBatchMethod2)
         self.btnRunModelOnBatchMethod3.clicked.connect(self.runBatchMethod3)
+        self.btnMergeBatchShards.clicked.connect(self.mergeBatchShards)
         self.btnShowDefaultCurves.clicked.connect(self.showDefaultCurves)
         self.hsDepthForVelocityPlot.valueChanged.connect(lambda: self.plotSliceSliderChanged('depth'))
         self.hsVelocityForDepthPlot.valueChanged.connect(lambda: self.plotSliceSliderChanged('velocity'))
@@ -67,6 +116,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.actionReset_all_to_defaults.triggered.connect(self.setDefaults)
         self.actionClear_status_log.triggered.connect(self.clearStatusLog)
         self.actionExport_Depth_and_Velocity_Suitability_Spreadsheet.triggered.connect(lambda: self.exportResult('spreadsheet'))
+        self.actionExport_All_Responses.triggered.connect(lambda: self.exportResult('all responses'))
         self.actionExport_Depth_Curve_Plot.triggered.connect(lambda: self.exportResult('depth curve plot'))
         self.actionExport_Velocity_Curve_Plot.triggered.connect(lambda: self.exportResult('velocity curve plot'))
         self.actionExport_Depth_Velocity_Response_Surface_Plot.triggered.connect(lambda: self.exportResult('response surface plot'))
@@ -95,10 +145,26 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.leBaselineHourlyPredationRiskInTermsOf90DayHorizon.setValidator(QDoubleValidator(0.0, 1.0, 2, self.leBaselineHourlyPredationRiskInTermsOf90DayHorizon))
         self.leMaxHourlyRiskInTermsOf90DayHorizon.setValidator(QDoubleValidator(0.0, 1.0, 2, self.leMaxHourlyRiskInTermsOf90DayHorizon))
         self.leRiskScaleConstant.setValidator(QDoubleValidator(0.0, 1.0, 2, self.leRiskScaleConstant))
+        self.leBatchQuantizeDepth.setValidator(QDoubleValidator(0.0, 100.0, 2, self.leBatchQuantizeDepth))
+        self.leBatchQuantizeVelocity.setValidator(QDoubleValidator(0.0, 100.0, 2, self.leBatchQuantizeVelocity))
+        self.leBatchQuantizeRoughness.setValidator(QDoubleValidator(0.0, 50.0, 2, self.leBatchQuantizeRoughness))
+        self.leBatchWorkerProcesses.setValidator(QIntValidator(1, 256, self.leBatchWorkerProcesses))
+        self.leBatchShardIndex.setValidator(QIntValidator(1, 10000, self.leBatchShardIndex))
+        self.leBatchShardCount.setValidator(QIntValidator(1, 10000, self.leBatchShardCount))
+        self.leClusterPort.setValidator(QIntValidator(1024, 65535, self.leClusterPort))
+        self.leRasterMemoryBudget.setValidator(QIntValidator(64, 1048576, self.leRasterMemoryBudget))
+        self.leTransectSweepInterval.setValidator(QDoubleValidator(0.1, 1000.0, 1, self.leTransectSweepInterval))
+        self.leAdaptiveSamplingTolerance.setValidator(QDoubleValidator(0.01, 50.0, 2, self.leAdaptiveSamplingTolerance))
+        self.leTransectOptimaCount.setValidator(QIntValidator(1, 100, self.leTransectOptimaCount))
+        self.leTransectOptimaTolerance.setValidator(QDoubleValidator(0.01, 100.0, 2, self.leTransectOptimaTolerance))
         # Tell the response variable picker to check for changes
         self.cbResponseVariableToPlot.currentIndexChanged.connect(self.showPlots)
         # Set up variable to track if there's an active forager configured
         self.foragerIsConfigured = False
+        # Results of previous runs on the Inputs tab, reused when the same configuration is run again over an extended or refined range
+        self.sweepResultCache = SweepResultCache()
+        self.clusterWorkers = None  # coordinator for networked workers, kept between batches so the workers stay connected
+        self.clusterWorkersConfiguration = None
 
     def setDefaults(self):
         """ Gives all the options default values for when the program is loaded without opening a previous file. """
@@ -119,6 +185,9 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.leRoughness.setText("5.0")
         self.cbVelocityProfileMethod.setCurrentIndex(0)
         self.ckbOptimizeDiet.setChecked(True)
+        self.ckbStandardizeByContinuousMaximum.setChecked(False)
+        self.ckbAdaptiveSampling.setChecked(False)
+        self.leAdaptiveSamplingTolerance.setText("2")
         self.loadFishPreset('18 cm Dolly Varden')
         self.loadGridPreset('Fast Calculation Grid')
         self.cbTurbulenceAdjustment.setCurrentIndex(1)
@@ -126,12 +195,43 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.leLatitude.setText("48.553453")
         self.leLongitude.setText("-113.022861")
         self.deMonthAndDay.setDate(datetime.date(2000, 7, 15))
+        self.deCalendarEndDate.setDate(datetime.date(2000, 8, 15))
         self.leMaxHoursToFeed.setText("24")  # todo change input file back to allowing more hours after testing
         self.leNighttimeDetectionProbability.setText("0.05")
         self.cbForagingStrategy.setCurrentIndex(0)
+        self.ckbCompareWithOptimalSchedule.setChecked(False)
         self.leBaselineHourlyPredationRiskInTermsOf90DayHorizon.setText("0.3")
         self.leMaxHourlyRiskInTermsOf90DayHorizon.setText("0.9")
         self.leRiskScaleConstant.setText("0.6")
+        # Defaults for the batch processing tab
+        self.ckbBatchQuantizeInputs.setChecked(False)
+        self.leBatchQuantizeDepth.setText("0.5")
+        self.leBatchQuantizeVelocity.setText("0.5")
+        self.leBatchQuantizeRoughness.setText("0.5")
+        self.ckbBatchMethod1Daily.setChecked(False)
+        self.ckbBatchMethod3Daily.setChecked(False)
+        self.ckbBatchMethod3Sweep.setChecked(False)
+        self.leTransectSweepInterval.setText("5")
+        self.ckbBatchMethod3Optima.setChecked(False)
+        self.ckbBatchMethod2AllResponses.setChecked(False)
+        self.leTransectOptimaCount.setText("3")
+        self.leTransectOptimaTolerance.setText("1")
+        self.leTransectOptimaFocalDepths.setText("")
+        self.leBatchWorkerProcesses.setText(str(os.cpu_count() or 1))
+        self.leBatchShardIndex.setText("1")
+        self.leBatchShardCount.setText("1")
+        self.cbBatchShardMethod.setCurrentIndex(0)
+        self.ckbBatchUseClusterWorkers.setChecked(False)
+        self.leClusterPort.setText("6000")
+        self.leClusterAuthKey.setText(os.environ.get('BIOHSC_AUTHKEY', ''))  # like the workers; never saved with the settings, which are shared
+        self.ckbBatchUseSurrogateTable.setChecked(False)
+        self.leSurrogateTableFile.setText('Click button to select a lookup table, or build one from the current settings')
+        self.leSurrogateRoughnessValues.setText("")
+        self.leSurrogateTemperatureValues.setText("")
+        self.leRasterDepthFile.setText('Click button to select depth raster (.npy)')
+        self.leRasterVelocityFile.setText('Click button to select velocity raster (.npy)')
+        self.leRasterRoughnessFile.setText('')
+        self.leRasterMemoryBudget.setText("1024")
         # todo undo these default files when I'm done testing
         self.leDriftDensityFile.setText("/Users/Jason/Dropbox/UBC Project/BioenergeticHSC/DriftModelRT/resources/DemoPreyTypesChenaFromDriftPump.csv")
         self.leHourlyDetailsFile.setText("/Users/Jason/Dropbox/UBC Project/BioenergeticHSC/DriftModelRT/resources/DemoHourlyDetails.csv")
@@ -198,10 +298,40 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                          'cbTurbulenceAdjustment': self.cbTurbulenceAdjustment.currentIndex(),
                          'cbAssimilationMethod': self.cbAssimilationMethod.currentIndex(),
                          'ckbOptimizeDiet': self.ckbOptimizeDiet.isChecked(),
+                         'ckbStandardizeByContinuousMaximum': self.ckbStandardizeByContinuousMaximum.isChecked(),
+                         'ckbAdaptiveSampling': self.ckbAdaptiveSampling.isChecked(),
+                         'leAdaptiveSamplingTolerance': self.leAdaptiveSamplingTolerance.text(),
                          'leDriftDensityFile': self.leDriftDensityFile.text(),
                          'leBatchMethod1File': self.leBatchMethod1File.text(),
                          'leBatchMethod2File': self.leBatchMethod2File.text(),
                          'leBatchMethod3File': self.leBatchMethod3File.text(),
+                         'ckbBatchQuantizeInputs': self.ckbBatchQuantizeInputs.isChecked(),
+                         'leBatchQuantizeDepth': self.leBatchQuantizeDepth.text(),
+                         'leBatchQuantizeVelocity': self.leBatchQuantizeVelocity.text(),
+                         'leBatchQuantizeRoughness': self.leBatchQuantizeRoughness.text(),
+                         'ckbBatchMethod1Daily': self.ckbBatchMethod1Daily.isChecked(),
+                         'ckbBatchMethod3Daily': self.ckbBatchMethod3Daily.isChecked(),
+                         'ckbBatchMethod3Sweep': self.ckbBatchMethod3Sweep.isChecked(),
+                         'leTransectSweepInterval': self.leTransectSweepInterval.text(),
+                         'ckbBatchMethod3Optima': self.ckbBatchMethod3Optima.isChecked(),
+                         'ckbBatchMethod2AllResponses': self.ckbBatchMethod2AllResponses.isChecked(),
+                         'leTransectOptimaCount': self.leTransectOptimaCount.text(),
+                         'leTransectOptimaTolerance': self.leTransectOptimaTolerance.text(),
+                         'leTransectOptimaFocalDepths': self.leTransectOptimaFocalDepths.text(),
+                         'leBatchWorkerProcesses': self.leBatchWorkerProcesses.text(),
+                         'leBatchShardIndex': self.leBatchShardIndex.text(),
+                         'leBatchShardCount': self.leBatchShardCount.text(),
+                         'cbBatchShardMethod': self.cbBatchShardMethod.currentIndex(),
+                         'ckbBatchUseClusterWorkers': self.ckbBatchUseClusterWorkers.isChecked(),
+                         'leClusterPort': self.leClusterPort.text(),
+                         'ckbBatchUseSurrogateTable': self.ckbBatchUseSurrogateTable.isChecked(),
+                         'leSurrogateTableFile': self.leSurrogateTableFile.text(),
+                         'leSurrogateRoughnessValues': self.leSurrogateRoughnessValues.text(),
+                         'leSurrogateTemperatureValues': self.leSurrogateTemperatureValues.text(),
+                         'leRasterDepthFile': self.leRasterDepthFile.text(),
+                         'leRasterVelocityFile': self.leRasterVelocityFile.text(),
+                         'leRasterRoughnessFile': self.leRasterRoughnessFile.text(),
+                         'leRasterMemoryBudget': self.leRasterMemoryBudget.text(),
                          }
         outFilePath = QtWidgets.QFileDialog.getSaveFileName(self, "Choose a name and location to save the model settings (.hsc file)", os.path.expanduser("~"), "Habitat suitability curve settings (*.hsc)")[0]
         file = open(outFilePath, 'wb')
@@ -236,10 +366,40 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             if 'cbTurbulenceAdjustment' in keys: self.cbTurbulenceAdjustment.setCurrentIndex(savedSettings['cbTurbulenceAdjustment'])
             if 'cbAssimilationMethod' in keys: self.cbAssimilationMethod.setCurrentIndex(savedSettings['cbAssimilationMethod'])
             if 'ckbOptimizeDiet' in keys: self.ckbOptimizeDiet.setChecked(savedSettings['ckbOptimizeDiet'])
+            if 'ckbStandardizeByContinuousMaximum' in keys: self.ckbStandardizeByContinuousMaximum.setChecked(savedSettings['ckbStandardizeByContinuousMaximum'])
+            if 'ckbAdaptiveSampling' in keys: self.ckbAdaptiveSampling.setChecked(savedSettings['ckbAdaptiveSampling'])
+            if 'leAdaptiveSamplingTolerance' in keys: self.leAdaptiveSamplingTolerance.setText(savedSettings['leAdaptiveSamplingTolerance'])
             if 'leDriftDensityFile' in keys: self.leDriftDensityFile.setText(savedSettings['leDriftDensityFile'])
             if 'leBatchMethod1File' in keys: self.leBatchMethod1File.setText(savedSettings['leBatchMethod1File'])
             if 'leBatchMethod2File' in keys: self.leBatchMethod2File.setText(savedSettings['leBatchMethod2File'])
             if 'leBatchMethod3File' in keys: self.leBatchMethod3File.setText(savedSettings['leBatchMethod3File'])
+            if 'ckbBatchQuantizeInputs' in keys: self.ckbBatchQuantizeInputs.setChecked(savedSettings['ckbBatchQuantizeInputs'])
+            if 'leBatchQuantizeDepth' in keys: self.leBatchQuantizeDepth.setText(savedSettings['leBatchQuantizeDepth'])
+            if 'leBatchQuantizeVelocity' in keys: self.leBatchQuantizeVelocity.setText(savedSettings['leBatchQuantizeVelocity'])
+            if 'leBatchQuantizeRoughness' in keys: self.leBatchQuantizeRoughness.setText(savedSettings['leBatchQuantizeRoughness'])
+            if 'ckbBatchMethod1Daily' in keys: self.ckbBatchMethod1Daily.setChecked(savedSettings['ckbBatchMethod1Daily'])
+            if 'ckbBatchMethod3Daily' in keys: self.ckbBatchMethod3Daily.setChecked(savedSettings['ckbBatchMethod3Daily'])
+            if 'ckbBatchMethod3Sweep' in keys: self.ckbBatchMethod3Sweep.setChecked(savedSettings['ckbBatchMethod3Sweep'])
+            if 'leTransectSweepInterval' in keys: self.leTransectSweepInterval.setText(savedSettings['leTransectSweepInterval'])
+            if 'ckbBatchMethod3Optima' in keys: self.ckbBatchMethod3Optima.setChecked(savedSettings['ckbBatchMethod3Optima'])
+            if 'ckbBatchMethod2AllResponses' in keys: self.ckbBatchMethod2AllResponses.setChecked(savedSettings['ckbBatchMethod2AllResponses'])
+            if 'leTransectOptimaCount' in keys: self.leTransectOptimaCount.setText(savedSettings['leTransectOptimaCount'])
+            if 'leTransectOptimaTolerance' in keys: self.leTransectOptimaTolerance.setText(savedSettings['leTransectOptimaTolerance'])
+            if 'leTransectOptimaFocalDepths' in keys: self.leTransectOptimaFocalDepths.setText(savedSettings['leTransectOptimaFocalDepths'])
+            if 'leBatchWorkerProcesses' in keys: self.leBatchWorkerProcesses.setText(savedSettings['leBatchWorkerProcesses'])
+            if 'leBatchShardIndex' in keys: self.leBatchShardIndex.setText(savedSettings['leBatchShardIndex'])
+            if 'leBatchShardCount' in keys: self.leBatchShardCount.setText(savedSettings['leBatchShardCount'])
+            if 'cbBatchShardMethod' in keys: self.cbBatchShardMethod.setCurrentIndex(savedSettings['cbBatchShardMethod'])
+            if 'ckbBatchUseClusterWorkers' in keys: self.ckbBatchUseClusterWorkers.setChecked(savedSettings['ckbBatchUseClusterWorkers'])
+            if 'leClusterPort' in keys: self.leClusterPort.setText(savedSettings['leClusterPort'])
+            if 'ckbBatchUseSurrogateTable' in keys: self.ckbBatchUseSurrogateTable.setChecked(savedSettings['ckbBatchUseSurrogateTable'])
+            if 'leSurrogateTableFile' in keys: self.leSurrogateTableFile.setText(savedSettings['leSurrogateTableFile'])
+            if 'leSurrogateRoughnessValues' in keys: self.leSurrogateRoughnessValues.setText(savedSettings['leSurrogateRoughnessValues'])
+            if 'leSurrogateTemperatureValues' in keys: self.leSurrogateTemperatureValues.setText(savedSettings['leSurrogateTemperatureValues'])
+            if 'leRasterDepthFile' in keys: self.leRasterDepthFile.setText(savedSettings['leRasterDepthFile'])
+            if 'leRasterVelocityFile' in keys: self.leRasterVelocityFile.setText(savedSettings['leRasterVelocityFile'])
+            if 'leRasterRoughnessFile' in keys: self.leRasterRoughnessFile.setText(savedSettings['leRasterRoughnessFile'])
+            if 'leRasterMemoryBudget' in keys: self.leRasterMemoryBudget.setText(savedSettings['leRasterMemoryBudget'])
             self.status("Loaded model settings from {0}".format(inFilePath))
 
     def chooseFile(self, whichFile):
@@ -258,6 +418,13 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         elif whichFile == 'hourly details':
             filePath = QtWidgets.QFileDialog.getOpenFileName(self, "Choose the CSV file containing the houry-by-hour temporal variation details.", os.path.expanduser("~"), "CSV Files (*.csv)")[0]
             if filePath != "": self.leHourlyDetailsFile.setText(filePath)
+        elif whichFile == 'lookup table':
+            filePath = QtWidgets.QFileDialog.getOpenFileName(self, "Choose the lookup table file.", os.path.expanduser("~"), "Lookup tables (*.npz)")[0]
+            if filePath != "": self.leSurrogateTableFile.setText(filePath)
+        elif whichFile in ('depth raster', 'velocity raster', 'roughness raster'):
+            filePath = QtWidgets.QFileDialog.getOpenFileName(self, "Choose the NumPy file containing the {0}.".format(whichFile), os.path.expanduser("~"), "NumPy arrays (*.npy *.npz)")[0]
+            lineEdits = {'depth raster': self.leRasterDepthFile, 'velocity raster': self.leRasterVelocityFile, 'roughness raster': self.leRasterRoughnessFile}
+            if filePath != "": lineEdits[whichFile].setText(filePath)
         if filePath != "":
             self.status("Set {0} file to {1}.".format(whichFile, filePath))
 
@@ -301,14 +468,29 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         results = []
         self.pbModelRunProgress.setMaximum(len(dv) - 1)
         self.pbModelRunProgress.setValue(0)
-        for i in range(len(dv)):
-            self.pbModelRunProgress.setValue(i)
-            self.app.processEvents()  # Forces the progress bar and status window to update with each iteration rather than waiting until the end of the loop.
-            depth, velocity = dv[i]
-            result = self.currentForager.runForagingModel(depth, velocity, self.ckbOptimizeDiet.isChecked(), self.modelGridSize)
-            results.append(result)
-            self.status("Calculated NREI = {0:.4f} j/s at depth = {1:.2f} cm and velocity = {2:.2f} cm/s.".format(result.netRateOfEnergyIntake, depth, velocity))
+        configurationKey = SweepResultCache.configurationKey(self.currentForager, self.modelGridSize, self.ckbOptimizeDiet.isChecked())
+        reusedCount = 0
+        if self.ckbAdaptiveSampling.isChecked():
+            def evaluate(points):
+                return self.sweepResultCache.evaluate(configurationKey, points, lambda missing: [self.currentForager.runForagingModel(depth, velocity, self.ckbOptimizeDiet.isChecked(), self.modelGridSize) for depth, velocity in missing])
+            results = self.adaptiveSurfaceResults(depths, velocities, evaluate, 'netRateOfEnergyIntake', SurrogateTable.METRICS, InterpolatedModelResult, self.pbModelRunProgress)
+        else:
+            for i in range(len(dv)):
+                self.pbModelRunProgress.setValue(i)
+                self.app.processEvents()  # Forces the progress bar and status window to update with each iteration rather than waiting until the end of the loop.
+                depth, velocity = dv[i]
+                result = self.sweepResultCache.lookup(configurationKey, depth, velocity)
+                if result is not None:
+                    reusedCount += 1
+                else:
+                    result = self.sweepResultCache.store(configurationKey, depth, velocity, self.currentForager.runForagingModel(depth, velocity, self.ckbOptimizeDiet.isChecked(), self.modelGridSize))
+                    self.status("Calculated NREI = {0:.4f} j/s at depth = {1:.2f} cm and velocity = {2:.2f} cm/s.".format(result.netRateOfEnergyIntake, depth, velocity))
+                results.append(result)
+        if reusedCount > 0:
+            self.status("Reused {0} results from previous runs with the same settings.".format(reusedCount))
         maxNetRateOfEnergyIntake = max([result.netRateOfEnergyIntake for result in results])
+        if self.ckbStandardizeByContinuousMaximum.isChecked():
+            maxNetRateOfEnergyIntake = max(maxNetRateOfEnergyIntake, self.continuousMaximum())
         for result in results:
             result.standardizeSuitability(maxNetRateOfEnergyIntake)  # Calculate the standardized suitability for each result after the overall maximum is known
         self.status("Completed NREI calculations for {0} depth/velocity combinations with maximun NREI = {1:.2f} J/s.".format(len(dv), maxNetRateOfEnergyIntake))
@@ -316,12 +498,12 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         if shouldShowPlots:
             self.hsDepthForVelocityPlot.setMaximum(maxDepth / self.depthInterval)
             self.hsVelocityForDepthPlot.setMaximum(maxVelocity / self.velocityInterval)
-            self.currentResult = InstantaneousModelSetResult(self, results)
+            self.currentResult = InstantaneousModelSetResult.fromResults(self, results)
             self.showPlots()
             self.swResultsControls.setCurrentIndex(1)  # Make the sliders/buttons to control the 'Results' plots visible by switching the stacked widget to the non-blank page
             self.mainTabWidget.setCurrentIndex(2)  # Switch user to 'Results' tab
         else:
-            self.currentResult = InstantaneousModelSetResult(self, results)
+            self.currentResult = InstantaneousModelSetResult.fromResults(self, results)
 
     def runDailyModel(self, shouldShowPlots=True, shouldConfigureForager=True, gotPreyTypesFromBatchFile=False):
         if not os.path.exists(self.leDriftDensityFile.text()) and not gotPreyTypesFromBatchFile:
@@ -338,17 +520,40 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         dg, vg = np.meshgrid(depths, velocities)
         dv = np.array([dg.flatten(), vg.flatten()]).T
         self.status("Calculating NREI for {0} depth/velocity combinations.".format(len(dv)))
-        results = []
+        scenario = DailyScenario.fromUserInterface(self)  # hourly details, daily settings, and illumination are read once for all cells
+        self.changePlotOptions(1)  # Reset the result plot selection dropdown to values for daily rather than instantaneous model runs
+        hourlyResultsByCell = []
         self.pbDailyRunProgressOverall.setMaximum(len(dv) - 1)
         self.pbDailyRunProgressOverall.setValue(0)
-        for i in range(len(dv)):
-            self.pbDailyRunProgressOverall.setValue(i)
-            self.app.processEvents()  # Forces the progress bar and status window to update with each iteration rather than waiting until the end of the loop.
-            depth, velocity = dv[i]   # todo repeat the processEvents line above for batch processing in general and add progress bars for those
-            result = self.currentForager.runDailyModel(depth, velocity, self.ckbOptimizeDiet.isChecked(), self.modelGridSize, None)  # todo add transect interpolations here where useful
-            results.append(result)
-            self.status("Calculated DNEI = {0:.4f} J at depth = {1:.2f} cm and velocity = {2:.2f} cm/s, with consumption {3:.2f} of maximum ration.".format(result.dailyNetEnergyIntake, depth, velocity, result.dailySpecificConsumptionProportional))
+        configurationKey = SweepResultCache.configurationKey(self.currentForager, self.modelGridSize, self.ckbOptimizeDiet.isChecked(), scenario)
+
+        def evaluate(points):  # the daily schedules for all the points are evaluated together
+            hourlyResults = [self.currentForager.runDailyHours(depth, velocity, self.ckbOptimizeDiet.isChecked(), self.modelGridSize, None, scenario) for depth, velocity in points]
+            return self.currentForager.dailyRunResults([depth for depth, velocity in points], [velocity for depth, velocity in points], hourlyResults, scenario)
+
+        if self.ckbAdaptiveSampling.isChecked():
+            # Under risk balancing, standardized suitability follows the risk-balancing metric (lower is better), so it guides refinement along with DNEI
+            response = ('dailyNetEnergyIntake', 'dailyRiskBalancingMetric') if scenario.strategy == 1 else 'dailyNetEnergyIntake'
+            results = self.adaptiveSurfaceResults(depths, velocities, lambda points: self.sweepResultCache.evaluate(configurationKey, points, evaluate), response, DailyRunResult.SUMMARY_METRICS,
+                                                  lambda depth, velocity, values, error: DailyRunResult(depth, velocity, None, *(values[metric] for metric in DailyRunResult.SUMMARY_METRICS)),
+                                                  self.pbDailyRunProgressOverall, lowerIsBetter=('dailyRiskBalancingMetric',))
+        else:
+            newPoints = [(depth, velocity) for depth, velocity in dv if self.sweepResultCache.lookup(configurationKey, depth, velocity) is None]
+            if len(newPoints) < len(dv):
+                self.status("Reusing {0} results from previous runs with the same settings.".format(len(dv) - len(newPoints)))
+            for i, (depth, velocity) in enumerate(newPoints):
+                self.pbDailyRunProgressOverall.setValue(i)
+                self.app.processEvents()  # Forces the progress bar and status window to update with each iteration rather than waiting until the end of the loop.
+                hourlyResultsByCell.append(self.currentForager.runDailyHours(depth, velocity, self.ckbOptimizeDiet.isChecked(), self.modelGridSize, None, scenario))  # todo add transect interpolations here where useful
+            newResults = self.currentForager.dailyRunResults([depth for depth, velocity in newPoints], [velocity for depth, velocity in newPoints], hourlyResultsByCell, scenario) if len(newPoints) > 0 else []  # daily schedules for all new cells are evaluated at once
+            for (depth, velocity), result in zip(newPoints, newResults):
+                self.sweepResultCache.store(configurationKey, depth, velocity, result)
+            results = [self.sweepResultCache.lookup(configurationKey, depth, velocity) for depth, velocity in dv]
+            for result in newResults:
+                self.status("Calculated DNEI = {0:.4f} J at depth = {1:.2f} cm and velocity = {2:.2f} cm/s, with consumption {3:.2f} of maximum ration.".format(result.dailyNetEnergyIntake, result.depth, result.velocity, result.dailySpecificConsumptionProportional))
         maxDailyNetEnergyIntake = max([result.dailyNetEnergyIntake for result in results])
+        if self.ckbStandardizeByContinuousMaximum.isChecked():
+            maxDailyNetEnergyIntake = max(maxDailyNetEnergyIntake, self.continuousMaximum(scenario))
         minDailyRiskBalancingMetric = min([result.dailyRiskBalancingMetric for result in results])
         maxDailyRiskBalancingMetric = max([result.dailyRiskBalancingMetric for result in results])
         maxDailyConsumptionProportional = max([result.dailySpecificConsumptionProportional for result in results])
@@ -359,48 +564,83 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         if shouldShowPlots:
             self.hsDepthForVelocityPlot.setMaximum(maxDepth / self.depthInterval)
             self.hsVelocityForDepthPlot.setMaximum(maxVelocity / self.velocityInterval)
-            self.currentResult = DailyModelSetResult(self, results)
+            self.currentResult = DailyModelSetResult.fromResults(self, results)
             self.showPlots()
             self.swResultsControls.setCurrentIndex(1)  # Make the sliders/buttons to control the 'Results' plots visible by switching the stacked widget to the non-blank page
             self.mainTabWidget.setCurrentIndex(2)  # Switch user to 'Results' tab
         else:
-            self.currentResult = DailyModelSetResult(self, results)
+            self.currentResult = DailyModelSetResult.fromResults(self, results)
+
+    def adaptiveSurfaceResults(self, depths, velocities, evaluate, response, metrics, interpolatedResult, progressBar, lowerIsBetter=()):
+        """ Samples the response surface with an AdaptiveSurfaceSampler at the tolerance on the Inputs tab, given a function evaluating
+            a list of (depth, velocity) points. Returns a result for every depth/velocity combination, in the same order as the regular
+            grid in runModel, using the model results where the model was run and building the rest with
+            interpolatedResult(depth, velocity, values, interpolationError) from the interpolated metrics. """
+        sampler = AdaptiveSurfaceSampler(depths, velocities, float(self.leAdaptiveSamplingTolerance.text() or 2) / 100)
+
+        def progress(evaluations, gridSize):
+            progressBar.setValue(evaluations - 1)
+            self.status("Ran the model at {0} of {1} depth/velocity combinations so far.".format(evaluations, gridSize))
+            self.app.processEvents()
+
+        evaluated = sampler.run(evaluate, response, progress, lowerIsBetter)
+        values, error, isEvaluated = sampler.resample(metrics)
+        results = []
+        for j, velocity in enumerate(velocities):
+            for i, depth in enumerate(depths):
+                results.append(evaluated[(i, j)] if isEvaluated[i, j] else interpolatedResult(depth, velocity, {metric: values[metric][i, j] for metric in metrics}, error[i, j]))
+        self.status("Sampled the response adaptively, running the model at {0} of {1} depth/velocity combinations and interpolating the rest.".format(len(evaluated), len(results)))
+        return results
+
+    def runDailyCalendar(self):
+        """ Runs the daily model over the depth/velocity grid for every date from the month and day through the calendar end date on
+            the Daily Settings tab, and saves the daily metrics as (date x depth x velocity) arrays in a NumPy .npz file. Illumination
+            for all dates is computed together in the scenario's IlluminationTable, and each cell's grid integrals are computed once and
+            reused for every date, because only the light-sensitive detection probability changes from one date to the next. Hourly
+            temperatures from the hourly details file apply to every date. """
+        if not os.path.exists(self.leDriftDensityFile.text()):
+            self.alertBox("Cannot run the model without prey types specified in the inputs tab.")
+            return
+        startDate = self.deMonthAndDay.date()
+        endDate = self.deCalendarEndDate.date()
+        if endDate < startDate:
+            self.alertBox("The calendar end date must be on or after the month and day on the Daily Settings tab.")
+            return
+        outFilePath = QtWidgets.QFileDialog.getSaveFileName(self, "Choose a name and location for the calendar results file", os.path.expanduser("~"), ".npz")[0]
+        if outFilePath == '':
+            return
+        self.status("Running calendar model...")
+        self.configureForager()
+        dates = [startDate.addDays(i) for i in range(startDate.daysTo(endDate) + 1)]
+        monthsAndDays = tuple((date.month(), date.day()) for date in dates)
+        self.depthInterval = int(self.leIntervalDepth.text())
+        self.velocityInterval = int(self.leIntervalVelocity.text())
+        depths = np.arange(self.depthInterval, int(self.leMaxDepth.text()) + 0.0001, self.depthInterval)
+        velocities = np.arange(self.velocityInterval, int(self.leMaxWaterVelocity.text()) + 0.0001, self.velocityInterval)
+        scenario = DailyScenario.fromUserInterface(self, monthsAndDays)
+        metrics = ('dailyNetEnergyIntake', 'dailyRiskBalancingMetric', 'dailyRisk', 'dailyRiskOn90DayHorizon', 'dailyGrossEnergyIntake', 'dailyCost',
+                   'dailyFocalSwimmingCost', 'dailyCaptureManeuverCost', 'dailyHoursForaging', 'dailySpecificConsumption', 'dailySpecificConsumptionProportional')
+        calendar = {metric: np.full((len(dates), len(depths), len(velocities)), np.nan) for metric in metrics}
+        self.status("Calculating daily results for {0} dates at {1} depth/velocity combinations.".format(len(dates), len(depths) * len(velocities)))
+        self.pbDailyRunProgressOverall.setMaximum(len(depths) * len(velocities) - 1)
+        shouldOptimizeDiet = self.ckbOptimizeDiet.isChecked()
+        for i, depth in enumerate(depths):
+            for j, velocity in enumerate(velocities):
+                self.pbDailyRunProgressOverall.setValue(i * len(velocities) + j)
+                self.app.processEvents()
+                hourIntegrals = self.currentForager.dailyHourIntegrals(depth, velocity, self.modelGridSize, None, scenario)
+                hourlyResultsByDate = [self.currentForager.runDailyHours(depth, velocity, shouldOptimizeDiet, self.modelGridSize, None, scenario, dateIndex, hourIntegrals) for dateIndex in range(len(dates))]
+                results = self.currentForager.dailyRunResults([depth] * len(dates), [velocity] * len(dates), hourlyResultsByDate, scenario, shouldCompareWithOptimalSchedule=False)  # schedules for all dates at once; the optimal-schedule diagnostics aren't saved
+                for metric in metrics:
+                    calendar[metric][:, i, j] = [getattr(result, metric) for result in results]
+        self.pbDailyRunProgressOverall.setValue(0)
+        np.savez(outFilePath, dates=np.array([date.toString("MM-dd") for date in dates]), depths=depths, velocities=velocities, **calendar)
+        self.status("Saved daily results for {0} dates from {1} to {2} to {3}.".format(len(dates), startDate.toString("M/d"), endDate.toString("M/d"), outFilePath))
 
     def showPlots(self):
         if not self.currentResult:
             return
-        if isinstance(self.currentResult, InstantaneousModelSetResult):
-            responseDict = {0: 'netRateOfEnergyIntake',
-                            1: 'standardizedSuitability',
-                            2: 'grossRateOfEnergyIntake',
-                            3: 'captureManeuverCostRate',
-                            4: 'focalSwimmingCostRate',
-                            5: 'totalEnergyCostRate',
-                            6: 'meanReactionDistance',
-                            7: 'captureSuccess',
-                            8: 'proportionOfTimeSpentHandling',
-                            9: 'ingestionRate',
-                            10: 'encounterRate',
-                            11: 'meanPreyEnergyValue',
-                            12: 'numPreyTypes',
-                            13: 'proportionAssimilated'}
-        elif isinstance(self.currentResult, DailyModelSetResult):
-            responseDict = {0: 'dailyNetEnergyIntake',
-                            1: 'dailyRiskBalancingMetric',
-                            2: 'standardizedSuitability',
-                            3: 'dailyRisk',
-                            4: 'dailyRiskOn90DayHorizon',
-                            5: 'dailyGrossEnergyIntake',
-                            6: 'dailyCost',
-                            7: 'dailyFocalSwimmingCost',
-                            8: 'dailyCaptureManeuverCost',
-                            9: 'dailyHoursForaging',
-                            10: 'dailySpecificConsumption',
-                            11: 'dailySpecificConsumptionProportional'
-                            }
-        else:
-            return # shouldn't ever reach this line, but just in case
-        self.currentResult.setResponse(responseDict[self.cbResponseVariableToPlot.currentIndex()])
+        self.currentResult.setResponse(self.currentResult.RESPONSES[self.cbResponseVariableToPlot.currentIndex()])  # in the same order as the options in changePlotOptions
         self.currentResult.plotSuitabilityCurve('depth', self.hsVelocityForDepthPlot.value() * self.velocityInterval, self.mplDepthLayout)
         self.currentResult.plotSuitabilityCurve('velocity', self.hsDepthForVelocityPlot.value() * self.depthInterval, self.mplVelocityLayout)
         self.currentResult.plotResponseSurface(self.mplDepthAndVelocityLayout)
@@ -437,136 +677,309 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                                                    'Daily capture maneuver cost',
                                                    'Daily hours foraging',
                                                    'Daily specific consumption',
-                                                   'Proportion of max consumption'
+                                                   'Proportion of max consumption',
+                                                   'Optimal-schedule risk-balancing metric',
+                                                   'Greedy schedule excess over optimal metric'
                                                     ))
 
+    BATCH_BLOCK_SIZE = 1000  # number of input rows batch methods 1 and 3 evaluate and write together before recording a checkpoint
+    CLUSTER_JOB_TIMEOUT = 3600  # seconds a networked worker may take on one job before it's dropped and the job given to another
+    CLUSTER_WAIT_TIMEOUT = 300  # seconds the coordinator waits with no workers connected before stopping the batch
+
     def runBatchMethod1(self):
         inFilePath = self.leBatchMethod1File.text()
         if not os.path.exists(inFilePath):
             self.alertBox("You must specify a valid batch method 2 input file before you can run the model. An example is in the 'resources' folder.")
             return
+        if not self.hasValidBatchShard():
+            return
         outFilePath = QtWidgets.QFileDialog.getSaveFileName(self, "Choose a name and location for the output CSV file", os.path.expanduser("~"), ".csv")[0]
         if outFilePath == '':
             self.status("Canceled batch method 1 process because no output file was selected.")
+            return
+        self.configureForager()
+        shard = self.batchShard(inFilePath)
+        shouldRunDailyModel = self.ckbBatchMethod1Daily.isChecked()
+        if self.ckbBatchQuantizeInputs.isChecked():
+            # Rows sharing the same rounded depth/velocity/roughness (and identical other inputs) are only evaluated once
+            quantizedInputCache = QuantizedInputCache(float(self.leBatchQuantizeDepth.text() or 0), float(self.leBatchQuantizeVelocity.text() or 0), float(self.leBatchQuantizeRoughness.text() or 0))
         else:
-            inputs = []
-            self.configureForager()
-            with open(inFilePath, newline='') as csvFile:
-                reader = csv.reader(csvFile)
-                next(reader, None)  # skip the header row
-                for row in reader:
+            quantizedInputCache = None
+        shouldUseSurrogateTable = self.ckbBatchUseSurrogateTable.isChecked() and not shouldRunDailyModel
+        if self.ckbBatchUseSurrogateTable.isChecked() and shouldRunDailyModel:
+            self.status("Lookup tables hold instantaneous results only, so the daily model will be run for every row.")
+        outputColumns = MainWindow.DAILY_OUTPUT_COLUMNS if shouldRunDailyModel else MainWindow.INSTANTANEOUS_OUTPUT_COLUMNS
+        quantizationHeaders = ['Evaluated depth (cm)',
+                               'Evaluated velocity (cm/s)',
+                               'Evaluated roughness (cm)',
+                               'Depth offset from evaluated (cm)',
+                               'Velocity offset from evaluated (cm/s)',
+                               'Roughness offset from evaluated (cm)'] if quantizedInputCache is not None else []
+        interpolationHeaders = ['NREI interpolation error estimate (J/s)'] if shouldUseSurrogateTable else []
+        header = ([BatchShard.ROW_HEADER] if shard is not None else []) + ['Label',
+                  'Depth (cm)',
+                  'Velocity (cm/s)',
+                  'Roughness (cm)'] + quantizationHeaders + [
+                  'Fork length (cm)',
+                  'Mass (g)',
+                  'Temperature',
+                  'Turbidity',
+                  'Drift file'] + [header for header, attribute in outputColumns] + interpolationHeaders
+        checkpoint = self.batchCheckpoint(outFilePath, header, shouldRunDailyModel, 1, inFilePath, quantizedInputCache.resolutions if quantizedInputCache is not None else None,
+                                          self.leSurrogateTableFile.text() if shouldUseSurrogateTable else None, shard.description() if shard is not None else None)
+        self.status("Calculating {0} for the rows of the batch method 1 input file{1}.".format("DNEI" if shouldRunDailyModel else "NREI", ", " + shard.description() if shard is not None else ""))
+        inputRows = self.batchMethod1Rows(inFilePath, shard.startRow(checkpoint.rowsDone) if shard is not None else checkpoint.rowsDone)
+        try:
+            for rowsDone, rowNumbers, inputs in self.batchBlocks(shard.rows(inputRows) if shard is not None else inputRows):
+                if not self.hasBatchDriftFiles(inputs):
+                    return
+                results = self.batchMethod1Results(inputs, shouldRunDailyModel, quantizedInputCache, shouldUseSurrogateTable)
+                rows = []
+                for rowNumber, result in zip(rowNumbers, results):
+                    quantizationValues = [result.evaluatedDepth,
+                                          result.evaluatedVelocity,
+                                          result.evaluatedRoughness,
+                                          result.depth - result.evaluatedDepth,
+                                          result.velocity - result.evaluatedVelocity,
+                                          result.roughness - result.evaluatedRoughness] if quantizedInputCache is not None else []
+                    interpolationValues = [getattr(result, 'interpolationError', 0)] if shouldUseSurrogateTable else []  # 0 for modeled rows
+                    rows.append(([rowNumber] if shard is not None else []) + [result.pointLabel,
+                                 result.depth,
+                                 result.velocity,
+                                 result.roughness] + quantizationValues + [
+                                 result.forkLength,
+                                 result.mass,
+                                 result.temperature,
+                                 result.turbidity,
+                                 result.driftFile] + MainWindow.batchOutputValues(result, outputColumns) + interpolationValues)
+                checkpoint.appendRows(rows, rowsDone, MainWindow.standardizationValues(results, shouldRunDailyModel))
+                self.status("Saved results for {0} rows of the batch method 1 input file so far.".format(checkpoint.rowsWritten))
+        except Exception as err:  # raised by the model in a worker process, or by networked workers that keep failing
+            self.batchWorkerError("Batch method 1", err, checkpoint)
+            return
+        if quantizedInputCache is not None:
+            self.status("Evaluated the model for {0} unique rounded inputs to fill {1} rows.".format(quantizedInputCache.uniqueCount, quantizedInputCache.rowCount))
+        self.finishBatchOutput(checkpoint, shouldRunDailyModel, "Batch method 1")
+
+    def batchMethod1Rows(self, inFilePath, startRow=0):
+        """ Yields (row number, inputs) for each row of the batch method 1 input file from startRow onward, counting rows from 0
+            after the header, with the inputs as a tuple of the label, depth, velocity, roughness, fork length, mass, temperature,
+            turbidity, and custom drift file (or None). Rows with values that aren't numbers are reported and skipped. """
+        with open(inFilePath, newline='') as csvFile:
+            reader = csv.reader(csvFile)
+            next(reader, None)  # skip the header row
+            for rowNumber, row in enumerate(reader):
+                if rowNumber < startRow:
+                    continue
+                try:
+                    label = row[0]
+                    depth = float(row[1])
+                    velocity = float(row[2])
+                    try:  # use custom length/mass if both are specified in CSV file
+                        forkLength = float(row[4])
+                        mass = float(row[5])
+                    except ValueError:  # otherwise use the ones from the main window
+                        mass = self.currentForager.mass
+                        forkLength = self.currentForager.forkLength
                     try:
-                        label = row[0]
-                        depth = float(row[1])
-                        velocity = float(row[2])
-                        try:  # use custom length/mass if both are specified in CSV file
-                            forkLength = float(row[4])
-                            mass = float(row[5])
-                        except ValueError:  # otherwise use the ones from the main window
-                            mass = self.currentForager.mass
-                            forkLength = self.currentForager.forkLength
-                        try:
-                            roughness = float(row[3])
-                        except ValueError:
-                            roughness = self.currentForager.roughness
-                        try:  # use custom temperature if specified in CSV file
-                            temperature = float(row[6])
-                        except ValueError:  # otherwise use the temperature from the main window
-                            temperature = self.currentForager.waterTemperature
-                        try:  # use custom turbidity if specified in CSV file
-                            turbidity = float(row[7])
-                        except ValueError:  # otherwise use the turbidity from the main window
-                            turbidity = self.currentForager.turbidity
-                        if row[8] != "":
-                            if os.path.isfile(row[8]):
-                                customDriftFile = row[8]
-                            else:
-                                customDriftFile = None
+                        roughness = float(row[3])
+                    except ValueError:
+                        roughness = self.currentForager.roughness
+                    try:  # use custom temperature if specified in CSV file
+                        temperature = float(row[6])
+                    except ValueError:  # otherwise use the temperature from the main window
+                        temperature = self.currentForager.waterTemperature
+                    try:  # use custom turbidity if specified in CSV file
+                        turbidity = float(row[7])
+                    except ValueError:  # otherwise use the turbidity from the main window
+                        turbidity = self.currentForager.turbidity
+                    if row[8] != "":
+                        if os.path.isfile(row[8]):
+                            customDriftFile = row[8]
                         else:
                             customDriftFile = None
-                        inputs.append((label, depth, velocity, roughness, forkLength, mass, temperature, turbidity, customDriftFile))
-                    except ValueError as err:
-                        self.statusError("Value encountered in batch method 1 input file that could not be converted to a number! Skipping it. Specific error: {0}".format(err))
-            if len(inputs) == 0:
-                self.statusError("Batch method 1 input file did not contain any rows.")
+                    else:
+                        customDriftFile = None
+                    yield rowNumber, (label, depth, velocity, roughness, forkLength, mass, temperature, turbidity, customDriftFile)
+                except ValueError as err:
+                    self.statusError("Value encountered in batch method 1 input file that could not be converted to a number! Skipping it. Specific error: {0}".format(err))
+
+    def batchMethod1Results(self, inputs, shouldRunDailyModel, quantizedInputCache, shouldUseSurrogateTable):
+        """ Returns the results for a block of batch method 1 input rows, with the row's inputs attached to each one. Results are
+            interpolated from the lookup table where possible, if shouldUseSurrogateTable is True, and rows are only evaluated once for
+            each set of rounded inputs if there's a quantizedInputCache, which carries over from block to block. """
+        interpolatedResults = self.surrogateTableResults(inputs) if shouldUseSurrogateTable else None
+        points = []  # the inputs at which the model is actually evaluated
+        pointIndexByKey = {}
+        rowKeys = []
+        for rowIndex, row in enumerate(inputs):
+            label, depth, velocity, roughness, forkLength, mass, temperature, turbidity, customDriftFile = row
+            if interpolatedResults is not None and rowIndex in interpolatedResults:
+                rowKeys.append(None)  # interpolated from the lookup table instead of modeled
+                continue
+            evaluatedDepth, evaluatedVelocity, evaluatedRoughness = depth, velocity, roughness
+            inputKey = len(rowKeys)  # every row is evaluated separately unless inputs are quantized
+            if quantizedInputCache is not None:
+                inputKey = quantizedInputCache.key(depth, velocity, roughness, forkLength, mass, temperature, turbidity, customDriftFile)
+                evaluatedDepth, evaluatedVelocity, evaluatedRoughness = inputKey[:3]
+            if inputKey not in pointIndexByKey and (quantizedInputCache is None or inputKey not in quantizedInputCache.results):  # rounded inputs from earlier blocks are already evaluated
+                pointIndexByKey[inputKey] = len(points)
+                points.append({'label': label, 'depth': evaluatedDepth, 'velocity': evaluatedVelocity, 'roughness': evaluatedRoughness,
+                               'forkLength': forkLength, 'mass': mass, 'temperature': temperature, 'turbidity': turbidity,
+                               'driftFile': customDriftFile if customDriftFile is not None else self.leDriftDensityFile.text()})
+            rowKeys.append(inputKey)
+        pointResults = self.evaluateBatchPoints(points, shouldRunDailyModel) if len(points) > 0 else []
+        if quantizedInputCache is not None:
+            for inputKey, pointIndex in pointIndexByKey.items():
+                quantizedInputCache.store(inputKey, pointResults[pointIndex])
+        results = []
+        for rowIndex, (row, inputKey) in enumerate(zip(inputs, rowKeys)):
+            label, depth, velocity, roughness, forkLength, mass, temperature, turbidity, customDriftFile = row
+            driftFile = customDriftFile if customDriftFile is not None else self.leDriftDensityFile.text()
+            if inputKey is None:
+                result = interpolatedResults[rowIndex]
+                result.evaluatedDepth, result.evaluatedVelocity, result.evaluatedRoughness = depth, velocity, roughness
             else:
-                if customDriftFile is None and not os.path.exists(self.leDriftDensityFile.text()):
-                    self.alertBox("No drift density file was specified in either the batch specification file or the inputs tab.")
-                    return
-                self.status("Calculating NREI for {0} rows of the batch method 1 input file.".format(len(inputs)))
-                maxNetRateOfEnergyIntake = -100000
-                results = []
-                for row in inputs:
-                    label, depth, velocity, roughness, forkLength, mass, temperature, turbidity, customDriftFile = row
-                    self.currentForager.roughness = roughness
-                    self.currentForager.forkLength = forkLength
-                    self.currentForager.mass = mass
-                    self.currentForager.waterTemperature = temperature
-                    self.currentForager.turbidity = turbidity
-                    if customDriftFile is not None:
-                        self.currentForager.filterPreyTypes(PreyType.loadPreyTypes(customDriftFile, self))
-                    self.currentForager.clear_caches()
-                    result = self.currentForager.runForagingModel(depth, velocity, self.ckbOptimizeDiet.isChecked(), self.modelGridSize)
-                    result.pointLabel = label
-                    result.forkLength = forkLength
-                    result.mass = mass
-                    result.roughness = roughness
-                    result.temperature = temperature
-                    result.turbidity = turbidity
-                    result.driftFile = customDriftFile if customDriftFile is not None else self.leDriftDensityFile.text()
-                    results.append(result)
-                    maxNetRateOfEnergyIntake = result.netRateOfEnergyIntake if result.netRateOfEnergyIntake > maxNetRateOfEnergyIntake else maxNetRateOfEnergyIntake
-                    self.status("Calculated NREI = {0:.4f} J/s at depth = {1:.2f} cm and velocity = {2:.2f} cm/s for point labeled '{3}'.".format(result.netRateOfEnergyIntake, depth, velocity, label))
-                for result in results: result.standardizeSuitability(maxNetRateOfEnergyIntake)  # Calculate the standardized suitability for each result after the overall maximum is known
-                with open(outFilePath, 'wt') as outFile:
-                    writer = csv.writer(outFile, delimiter=',', quotechar='|', quoting=csv.QUOTE_MINIMAL)
-                    writer.writerow(['Label',
-                                     'Depth (cm)',
-                                     'Velocity (cm/s)',
-                                     'Roughness (cm)',
-                                     'Fork length (cm)',
-                                     'Mass (g)',
-                                     'Temperature',
-                                     'Turbidity',
-                                     'Drift file',
-                                     'Net rate of energy intake (J/s)',
-                                     'Standardized habitat suitability',
-                                     'Gross rate of energy intake (J/s)',
-                                     'Energy cost of maneuvering (J/s)',
-                                     'Energy cost of focal swimming (J/s)',
-                                     'Total energy costs (J/s)',
-                                     'Mean reaction distance (cm)',
-                                     'Prey capture success proportion',
-                                     'Proportion of time handling prey',
-                                     'Prey ingestion rate (items/s)',
-                                     'Prey encounter rate (items/s)',
-                                     'Mean prey energy value (J)',
-                                     'Number of prey types in diet',
-                                     'Proportion of energy assimilated'])
-                    for result in results: writer.writerow([result.pointLabel,
-                                                            result.depth,
-                                                            result.velocity,
-                                                            result.roughness,
-                                                            result.forkLength,
-                                                            result.mass,
-                                                            result.temperature,
-                                                            result.turbidity,
-                                                            result.driftFile,
-                                                            result.netRateOfEnergyIntake,
-                                                            result.standardizedSuitability,
-                                                            result.grossRateOfEnergyIntake,
-                                                            result.captureManeuverCostRate,
-                                                            result.focalSwimmingCostRate,
-                                                            result.totalEnergyCostRate,
-                                                            result.meanReactionDistance,
-                                                            result.captureSuccess,
-                                                            result.proportionOfTimeSpentHandling,
-                                                            result.ingestionRate,
-                                                            result.encounterRate,
-                                                            result.meanPreyEnergyValue,
-                                                            result.numPreyTypes,
-                                                            result.proportionAssimilated])
-                self.status("Saved batch processing results to {0}.".format(outFilePath))
+                result = quantizedInputCache.lookup(inputKey) if quantizedInputCache is not None else pointResults[pointIndexByKey[inputKey]]
+                result.evaluatedDepth, result.evaluatedVelocity, result.evaluatedRoughness = inputKey[:3] if quantizedInputCache is not None else (depth, velocity, roughness)
+            result.driftFile = driftFile
+            result.depth = depth
+            result.velocity = velocity
+            result.pointLabel = label
+            result.forkLength = forkLength
+            result.mass = mass
+            result.roughness = roughness
+            result.temperature = temperature
+            result.turbidity = turbidity
+            results.append(result)
+        return results
+
+    def batchBlocks(self, rows):
+        """ Groups the (row number, inputs) tuples yielded by a batch input generator into lists of up to BATCH_BLOCK_SIZE inputs,
+            yielding (number of input rows read so far, list of row numbers, list of inputs) for each block. """
+        rowNumbers = []
+        block = []
+        rowsRead = 0
+        for rowNumber, inputs in rows:
+            rowNumbers.append(rowNumber)
+            block.append(inputs)
+            rowsRead = rowNumber + 1
+            if len(block) == MainWindow.BATCH_BLOCK_SIZE:
+                yield rowsRead, rowNumbers, block
+                rowNumbers = []
+                block = []
+        if len(block) > 0:
+            yield rowsRead, rowNumbers, block
+
+    def hasValidBatchShard(self):
+        if int(self.leBatchShardIndex.text() or 1) > int(self.leBatchShardCount.text() or 1):
+            self.alertBox("The shard to run must be between 1 and the number of shards.")
+            return False
+        return True
+
+    def batchShard(self, inFilePath):
+        """ Returns the BatchShard of the batch input file chosen on the batch tab, or None if the whole file is run as one shard. """
+        shardCount = int(self.leBatchShardCount.text() or 1)
+        if shardCount <= 1:
+            return None
+        byLabelHash = self.cbBatchShardMethod.currentIndex() == 1
+        return BatchShard(int(self.leBatchShardIndex.text() or 1) - 1, shardCount, byLabelHash, None if byLabelHash else BatchShard.countRows(inFilePath))
+
+    def hasBatchDriftFiles(self, inputs):
+        """ Checks that every row in a block of batch inputs, whose last element is the row's custom drift file (or None), has a drift
+            file, either its own or the one on the inputs tab. """
+        if not os.path.exists(self.leDriftDensityFile.text()) and any(row[-1] is None for row in inputs):
+            self.alertBox("No drift density file was specified in either the batch specification file or the inputs tab.")
+            return False
+        return True
+
+    def batchCheckpoint(self, outFilePath, header, shouldRunDailyModel, *fingerprintParts):
+        """ Returns the BatchCheckpoint for a batch output file, resuming an interrupted run of the same batch (the same input file,
+            header, model settings, and other fingerprint parts) if there's a checkpoint for it, or starting the file otherwise. """
+        scenarioKey = DailyScenario.fromUserInterface(self).cacheKey() if shouldRunDailyModel else None
+        fingerprint = BatchCheckpoint.inputFingerprint(header, sorted(self.currentForager.settings().items()), self.modelGridSize, self.ckbOptimizeDiet.isChecked(),
+                                                       self.leDriftDensityFile.text(), scenarioKey, *fingerprintParts)
+        checkpoint = BatchCheckpoint(outFilePath, fingerprint)
+        if checkpoint.resume():
+            self.status("Resuming the batch from its checkpoint, after {0} input rows with {1} results already saved in {2}.".format(checkpoint.rowsDone, checkpoint.rowsWritten, outFilePath))
+        else:
+            checkpoint.start(header)
+        return checkpoint
+
+    @staticmethod
+    def batchOutputValues(result, outputColumns):
+        """ Returns the values of the output columns for a batch result, leaving standardized suitability blank to be filled in once
+            every row is done. """
+        return ['' if attribute == 'standardizedSuitability' else getattr(result, attribute) for header, attribute in outputColumns]
+
+    @staticmethod
+    def standardizationValues(results, shouldRunDailyModel):
+        """ Returns the values of a block of batch results that the checkpoint tracks the extremes of for standardizing suitability. """
+        attributes = ('dailyNetEnergyIntake', 'dailyRiskBalancingMetric') if shouldRunDailyModel else ('netRateOfEnergyIntake',)
+        return {attribute: [getattr(result, attribute) for result in results] for attribute in attributes}
+
+    def finishBatchOutput(self, checkpoint, shouldRunDailyModel, methodName):
+        """ Fills in standardized suitability in a finished batch output file, in a second pass over the file using the extremes
+            recorded in the checkpoint, the same way standardizeBatchResults does for results in memory. """
+        if checkpoint.rowsWritten == 0:
+            checkpoint.discardCheckpoint()
+            os.remove(checkpoint.outFilePath)
+            self.statusError("{0} input file did not contain any rows.".format(methodName))
+            return
+        if shouldRunDailyModel:
+            valueForRow = self.standardizedSuitabilityForRow(True, checkpoint.maximum('dailyNetEnergyIntake'), checkpoint.minimum('dailyRiskBalancingMetric'), checkpoint.maximum('dailyRiskBalancingMetric'))
+        else:
+            valueForRow = self.standardizedSuitabilityForRow(False, checkpoint.maximum('netRateOfEnergyIntake'))
+        checkpoint.fillColumn(MainWindow.batchOutputHeaders(shouldRunDailyModel)['standardizedSuitability'], valueForRow)
+        self.status("Saved batch processing results to {0}.".format(checkpoint.outFilePath))
+
+    @staticmethod
+    def batchOutputHeaders(shouldRunDailyModel):
+        """ Returns the headers of the batch output columns keyed by result attribute. """
+        outputColumns = MainWindow.DAILY_OUTPUT_COLUMNS if shouldRunDailyModel else MainWindow.INSTANTANEOUS_OUTPUT_COLUMNS
+        return {attribute: header for header, attribute in outputColumns}
+
+    def standardizedSuitabilityForRow(self, shouldRunDailyModel, maxNetEnergyIntake, minDailyRiskBalancingMetric=None, maxDailyRiskBalancingMetric=None):
+        """ Returns a function giving the standardized suitability of a row of a batch output file, as a dictionary of its values
+            keyed by header, given the extremes of the batch's results. """
+        headers = MainWindow.batchOutputHeaders(shouldRunDailyModel)
+        if shouldRunDailyModel:
+            bounds = self.standardizationBounds(True, maxNetEnergyIntake, minDailyRiskBalancingMetric, maxDailyRiskBalancingMetric)
+            return lambda row: DailyRunResult.standardizedSuitabilityFor(float(row[headers['dailyNetEnergyIntake']]), float(row[headers['dailyRiskBalancingMetric']]), *bounds)
+        maxNetRateOfEnergyIntake, = self.standardizationBounds(False, maxNetEnergyIntake)
+        return lambda row: float(row[headers['netRateOfEnergyIntake']]) / maxNetRateOfEnergyIntake if maxNetRateOfEnergyIntake != 0 else np.nan
+
+    def mergeBatchShards(self):
+        """ Merges the finished output files of the shards of a batch method 1 or 3 run into one output file in input order, with
+            suitability standardized by the extremes over every shard, using the standardization settings on the batch tab. """
+        shardPaths = QtWidgets.QFileDialog.getOpenFileNames(self, "Choose the output CSV files of every shard", os.path.expanduser("~"), "CSV files (*.csv)")[0]
+        if len(shardPaths) == 0:
+            self.status("Canceled merging shard output files because none were selected.")
+            return
+        outFilePath = QtWidgets.QFileDialog.getSaveFileName(self, "Choose a name and location for the merged output CSV file", os.path.expanduser("~"), ".csv")[0]
+        if outFilePath == '':
+            self.status("Canceled merging shard output files because no output file was selected.")
+            return
+        if os.path.abspath(outFilePath) in [os.path.abspath(shardPath) for shardPath in shardPaths]:
+            self.alertBox("The merged output file must be different from the shard output files.")
+            return
+        try:
+            header = BatchShard.readShards(shardPaths)
+        except (OSError, ValueError) as err:
+            self.alertBox("Could not merge the shard output files. Specific error: {0}".format(err))
+            return
+        self.configureForager()  # for the continuous maximum, if suitability is standardized by it
+        shouldRunDailyModel = MainWindow.DAILY_OUTPUT_COLUMNS[0][0] in header
+        headers = MainWindow.batchOutputHeaders(shouldRunDailyModel)
+        self.status("Finding the extremes of the results over {0} shard output files.".format(len(shardPaths)))
+        if shouldRunDailyModel:
+            extremes = BatchShard.extremes(shardPaths, (headers['dailyNetEnergyIntake'], headers['dailyRiskBalancingMetric']))
+            valueForRow = self.standardizedSuitabilityForRow(True, extremes[headers['dailyNetEnergyIntake']][1], *extremes[headers['dailyRiskBalancingMetric']])
+        else:
+            extremes = BatchShard.extremes(shardPaths, (headers['netRateOfEnergyIntake'],))
+            valueForRow = self.standardizedSuitabilityForRow(False, extremes[headers['netRateOfEnergyIntake']][1])
+        rowCount = BatchShard.merge(shardPaths, outFilePath, headers['standardizedSuitability'], valueForRow)
+        self.status("Merged {0} rows from {1} shard output files into {2}.".format(rowCount, len(shardPaths), outFilePath))
 
     def runBatchMethod2(self):
         inFilePath = self.leBatchMethod2File.text()
@@ -626,7 +1039,11 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                     self.status("Running model for temperature {0}".format(self.currentForager.waterTemperature))
                     self.currentForager.clear_caches()
                     self.runModel(shouldShowPlots=False, shouldConfigureForager=False, gotPreyTypesFromBatchFile=hasCustomDriftFiles)
-                    self.currentResult.exportSpreadsheet(os.path.join(outFolderPath, "{0} (length {1:.2f} -- mass {2:.2f} -- temp {3:.2f}).csv".format(label, forkLength, mass, temperature)))
+                    outFilePath = os.path.join(outFolderPath, "{0} (length {1:.2f} -- mass {2:.2f} -- temp {3:.2f}).csv".format(label, forkLength, mass, temperature))
+                    if self.ckbBatchMethod2AllResponses.isChecked():
+                        self.currentResult.exportAllResponses(outFilePath)
+                    else:
+                        self.currentResult.exportSpreadsheet(outFilePath)
                 self.status("Saved batch processing results to {0}.".format(outFolderPath))
 
     def runBatchMethod3(self):
@@ -634,32 +1051,124 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         if not os.path.exists(inFilePath):
             self.alertBox("You must specify a valid batch method 3 input file before you can run the model. An example is in the 'resources' folder.")
             return
+        if not self.hasValidBatchShard():
+            return
         outFilePath = QtWidgets.QFileDialog.getSaveFileName(self, "Choose a name and location for the output CSV file", os.path.expanduser("~"), ".csv")[0]
         if outFilePath == '':
             self.status("Canceled batch method 3 process because no output file was selected.")
             return
 
         ###########################################################################################################################
-        # First, we just read the input file and store values from there or the current forager's defaults for use as appropriate
-        # Also, as we go, organize the inputs into transects, as a dictionary keyed by transect label.
-        # Each value in the dictionary will itself be an array of dictionaries, each one representing a single point,
-        # with elements for position, depth, velocity, and roughness.
+        # First, we read through the input file to organize the measurements into transects, as a dictionary keyed by transect
+        # label. Each value in the dictionary will itself be an array of dictionaries, each one representing a single point,
+        # with elements for position, depth, velocity, and roughness. Only these are kept, so the points themselves can be
+        # streamed from the file again below.
         ###########################################################################################################################
 
-        inputs = []
         transectInputs = {}
         self.configureForager()
+        for rowNumber, (label, depth, velocity, transectLabel, positionOnTransect, roughness, forkLength, mass, temperature, turbidity, customDriftFile) in self.batchMethod3Rows(inFilePath):
+            transectInputs.setdefault(transectLabel, []).append({'position': positionOnTransect, 'depth': depth, 'velocity': velocity, 'roughness': roughness})
+        if len(transectInputs) == 0:
+            self.statusError("Batch method 3 input file did not contain any rows.")
+            return
+
+        ###########################################################################################################################
+        # Use the transect information from above to build a dictionary of interpolations (keyed by transect label, with each
+        # element being a dictionary with the label and arrays of positions, depth, velocity, and roughness along the transect)
+        ###########################################################################################################################
+
+        transectInterpolations = {}
+        for transectLabel, pointInputs in transectInputs.items():
+            positions = []
+            depths = []
+            velocities = []
+            roughnesses = []
+            pointInputs.sort(key=lambda x: x['position'])
+            for pointInput in pointInputs:
+                positions.append(pointInput['position'])
+                depths.append(pointInput['depth'])
+                velocities.append(pointInput['velocity'])
+                roughnesses.append(pointInput['roughness'])
+            transectInterpolations[transectLabel] = TransectCalculationGrid.transectInterpolations(transectLabel, positions, depths, velocities, roughnesses)
+
+        shard = self.batchShard(inFilePath)
+        if shard is not None and (self.ckbBatchMethod3Optima.isChecked() or self.ckbBatchMethod3Sweep.isChecked()):
+            self.status("Shards only divide the points of batch method 3, so every transect is searched or swept.")
+        if self.ckbBatchMethod3Optima.isChecked():
+            self.searchTransects(transectInterpolations, outFilePath)
+            return
+        if self.ckbBatchMethod3Sweep.isChecked():
+            self.sweepTransects(transectInterpolations, outFilePath)
+            return
+
+        ###########################################################################################################################
+        #      Last, run the actual NREI calculations for the points given the transects above, one block of rows at a time       #
+        ###########################################################################################################################
+
+        shouldRunDailyModel = self.ckbBatchMethod3Daily.isChecked()
+        outputColumns = MainWindow.DAILY_OUTPUT_COLUMNS if shouldRunDailyModel else MainWindow.INSTANTANEOUS_OUTPUT_COLUMNS
+        header = ([BatchShard.ROW_HEADER] if shard is not None else []) + ['Label',
+                  'Depth (cm)',
+                  'Velocity (cm/s)',
+                  'Transect Label',
+                  'Position on transect (m)',
+                  'Roughness (cm)',
+                  'Fork length (cm)',
+                  'Mass (g)',
+                  'Temperature',
+                  'Turbidity',
+                  'Drift file'] + [header for header, attribute in outputColumns]
+        checkpoint = self.batchCheckpoint(outFilePath, header, shouldRunDailyModel, 3, inFilePath, shard.description() if shard is not None else None)
+        self.status("Calculating {0} for the rows of the batch method 3 input file{1}.".format("DNEI" if shouldRunDailyModel else "NREI", ", " + shard.description() if shard is not None else ""))
+        inputRows = self.batchMethod3Rows(inFilePath, shard.startRow(checkpoint.rowsDone) if shard is not None else checkpoint.rowsDone, shouldReportErrors=False)
+        try:
+            for rowsDone, rowNumbers, inputs in self.batchBlocks(shard.rows(inputRows) if shard is not None else inputRows):
+                if not self.hasBatchDriftFiles(inputs):
+                    return
+                points = []
+                for row in inputs:
+                    label, depth, velocity, transectLabel, positionOnTransect, roughness, forkLength, mass, temperature, turbidity, customDriftFile = row
+                    # Note that depth and velocity here end up referencing the focal depth and velocity for this fish, but the
+                    # values for different prey locations / maneuvers will depend on the transect interpolations.
+                    points.append({'label': label, 'depth': depth, 'velocity': velocity, 'roughness': roughness, 'forkLength': forkLength, 'mass': mass,
+                                   'temperature': temperature, 'turbidity': turbidity, 'positionOnTransect': positionOnTransect, 'transectLabel': transectLabel,
+                                   'driftFile': customDriftFile if customDriftFile is not None else self.leDriftDensityFile.text()})
+                results = self.evaluateBatchPoints(points, shouldRunDailyModel, transectInterpolations)
+                rows = [([rowNumber] if shard is not None else []) + [point['label'],
+                         result.depth,
+                         result.velocity,
+                         point['transectLabel'],
+                         point['positionOnTransect'] / 100,  # convert from model units (cm) back to output units (m) for this
+                         point['roughness'],
+                         point['forkLength'],
+                         point['mass'],
+                         point['temperature'],
+                         point['turbidity'],
+                         point['driftFile']] + MainWindow.batchOutputValues(result, outputColumns) for rowNumber, point, result in zip(rowNumbers, points, results)]
+                checkpoint.appendRows(rows, rowsDone, MainWindow.standardizationValues(results, shouldRunDailyModel))
+                self.status("Saved results for {0} rows of the batch method 3 input file so far.".format(checkpoint.rowsWritten))
+        except Exception as err:  # raised by the model in a worker process, or by networked workers that keep failing
+            self.batchWorkerError("Batch method 3", err, checkpoint)
+            return
+        self.finishBatchOutput(checkpoint, shouldRunDailyModel, "Batch method 3")
+
+    def batchMethod3Rows(self, inFilePath, startRow=0, shouldReportErrors=True):
+        """ Yields (row number, inputs) for each row of the batch method 3 input file from startRow onward, counting rows from 0
+            after the header, with the inputs as a tuple of the label, depth, velocity, transect label, position on the transect (cm),
+            roughness, fork length, mass, temperature, turbidity, and custom drift file (or None). Rows with values that aren't
+            numbers are skipped, and reported if shouldReportErrors is True. """
         with open(inFilePath, newline='') as csvFile:
             reader = csv.reader(csvFile)
             next(reader, None)  # skip the header row
-            for row in reader:
+            for rowNumber, row in enumerate(reader):
+                if rowNumber < startRow:
+                    continue
                 try:
                     label = row[0]
                     depth = float(row[1])
                     velocity = float(row[2])
                     transectLabel = row[3]
-                    if transectLabel not in transectInputs.keys():
-                        transectInputs[transectLabel] = []  # create the array of points for the transect if it's not present yet
                     positionOnTransect = float(row[4]) * 100 # converting from input file units (m) to model units (cm) here
                     try:  # use custom length/mass if both are specified in CSV file
                         forkLength = float(row[6])
@@ -679,8 +1188,6 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                         turbidity = float(row[9])
                     except ValueError:  # otherwise use the turbidity from the main window
                         turbidity = self.currentForager.turbidity
-                    # Add the relevant data to the dictionary organized by transect, for use creating the transect interpolations
-                    transectInputs[transectLabel].append({'position': positionOnTransect, 'depth': depth, 'velocity': velocity, 'roughness': roughness})
                     if row[10] != "":
                         if os.path.isfile(row[10]):
                             customDriftFile = row[10]
@@ -688,125 +1195,327 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                             customDriftFile = None
                     else:
                         customDriftFile = None
-                    inputs.append((label, depth, velocity, transectLabel, positionOnTransect, roughness, forkLength, mass, temperature, turbidity, customDriftFile))
+                    yield rowNumber, (label, depth, velocity, transectLabel, positionOnTransect, roughness, forkLength, mass, temperature, turbidity, customDriftFile)
                 except ValueError as err:
-                    self.statusError("Value encountered in batch method 3 input file that could not be converted to a number! Skipping it. Specific error: {0}".format(err))
-        if len(inputs) == 0:
-            self.statusError("Batch method 3 input file did not contain any rows.")
+                    if shouldReportErrors:
+                        self.statusError("Value encountered in batch method 3 input file that could not be converted to a number! Skipping it. Specific error: {0}".format(err))
+
+    def surrogateTableResults(self, inputs):
+        """ Interpolates results from the lookup table chosen on the batch tab for the batch method 1 input rows it applies to, i.e.
+            rows with the table's fish, water, and drift settings and inputs within its range. Returns a dictionary of the results
+            keyed by row index; rows not in the dictionary must be modeled. """
+        tablePath = self.leSurrogateTableFile.text()
+        if not os.path.isfile(tablePath):
+            self.statusError("Lookup table file {0} does not exist, so every row will be modeled.".format(tablePath))
+            return {}
+        try:
+            table = SurrogateTable.load(tablePath)
+        except (OSError, KeyError, ValueError) as err:
+            self.statusError("Could not read lookup table file {0}, so every row will be modeled. Specific error: {1}".format(tablePath, err))
+            return {}
+        baseSettings = self.currentForager.settings()
+        rowIndices = []
+        for rowIndex, (label, depth, velocity, roughness, forkLength, mass, temperature, turbidity, customDriftFile) in enumerate(inputs):
+            settings = dict(baseSettings, roughness=roughness, forkLength=forkLength, mass=mass, waterTemperature=temperature, turbidity=turbidity)
+            driftFile = customDriftFile if customDriftFile is not None else self.leDriftDensityFile.text()
+            if table.appliesTo(settings, driftFile, self.modelGridSize, self.ckbOptimizeDiet.isChecked()):
+                rowIndices.append(rowIndex)
+        interpolatedResults = {}
+        if len(rowIndices) > 0:
+            columns = list(zip(*[inputs[rowIndex] for rowIndex in rowIndices]))
+            queryPoints = table.points(columns[1], columns[2], columns[3], columns[6])
+            inside = table.contains(queryPoints)
+            rowIndices = [rowIndex for rowIndex, isInside in zip(rowIndices, inside) if isInside]
+            queryPoints = queryPoints[inside]
+            values = table.query(queryPoints)
+            errors = table.queryErrors(queryPoints)['netRateOfEnergyIntake']
+            for i, rowIndex in enumerate(rowIndices):
+                label, depth, velocity = inputs[rowIndex][:3]
+                interpolatedResults[rowIndex] = InterpolatedModelResult(depth, velocity, {metric: values[metric][i] for metric in values}, errors[i])
+        self.status("Interpolated results from the lookup table for {0} of {1} rows; the rest will be modeled.".format(len(interpolatedResults), len(inputs)))
+        return interpolatedResults
+
+    def buildSurrogateTable(self):
+        """ Builds a lookup table of instantaneous results for the current fish and drift file over the depth and velocity ranges and
+            intervals on the Model Settings tab, plus the roughness and temperature values on the batch tab if any are listed, and saves
+            it to a .npz file chosen by the user. """
+        if not os.path.exists(self.leDriftDensityFile.text()):
+            self.alertBox("Cannot build a lookup table without prey types specified in the inputs tab.")
             return
-        if customDriftFile is None and not os.path.exists(self.leDriftDensityFile.text()):
-            self.alertBox("No drift density file was specified in either the batch specification file or the inputs tab.")
+        try:
+            roughnesses = [float(value) for value in self.leSurrogateRoughnessValues.text().split(',')] if self.leSurrogateRoughnessValues.text().strip() != "" else None
+            temperatures = [float(value) for value in self.leSurrogateTemperatureValues.text().split(',')] if self.leSurrogateTemperatureValues.text().strip() != "" else None
+        except ValueError as err:
+            self.alertBox("The lookup table roughness and temperature values must be comma-separated numbers. Specific error: {0}".format(err))
             return
+        outFilePath = QtWidgets.QFileDialog.getSaveFileName(self, "Choose a name and location for the lookup table file", os.path.expanduser("~"), "Lookup tables (*.npz)")[0]
+        if outFilePath == '':
+            return
+        self.configureForager()
+        depthInterval = int(self.leIntervalDepth.text())
+        velocityInterval = int(self.leIntervalVelocity.text())
+        depths = np.arange(depthInterval, int(self.leMaxDepth.text()) + 0.0001, depthInterval)
+        velocities = np.arange(velocityInterval, int(self.leMaxWaterVelocity.text()) + 0.0001, velocityInterval)
+        self.status("Building a lookup table over {0} depths, {1} velocities, {2} roughness values, and {3} temperatures.".format(
+            len(depths), len(velocities), len(roughnesses) if roughnesses is not None else 1, len(temperatures) if temperatures is not None else 1))
 
-        ###########################################################################################################################
-        # Use the transect information from above to build a dictionary of interpolations (keyed by transect label, with each
-        # element being a dictionary with keys for depth, velocity, and roughness along the transect
-        ###########################################################################################################################
+        def progress(done, total):
+            self.pbModelRunProgress.setMaximum(total)
+            self.pbModelRunProgress.setValue(done)
+            self.app.processEvents()
 
-        transectInterpolations = {}
-        for transectLabel, pointInputs in transectInputs.items():
-            positions = []
-            depths = []
-            velocities = []
-            roughnesses = []
-            pointInputs.sort(key=lambda x: x['position'])
-            for pointInput in pointInputs:
-                positions.append(pointInput['position'])
-                depths.append(pointInput['depth'])
-                velocities.append(pointInput['velocity'])
-                roughnesses.append(pointInput['roughness'])
-            transectInterpolations[transectLabel] = {}
-            transectInterpolations[transectLabel]['depth'] = interp1d(positions, depths, fill_value=0, bounds_error=False, assume_sorted=True)
-            transectInterpolations[transectLabel]['velocity'] = interp1d(positions, velocities, fill_value=0, bounds_error=False, assume_sorted=True)
-            transectInterpolations[transectLabel]['roughness'] = interp1d(positions, roughnesses, fill_value=0, bounds_error=False, assume_sorted=True)
+        try:
+            table = SurrogateTable.build(self.currentForager.settings(), PreyType.loadPreyTypes(self.leDriftDensityFile.text(), self), self.leDriftDensityFile.text(),
+                                         depths, velocities, roughnesses, temperatures, self.modelGridSize, self.ckbOptimizeDiet.isChecked(),
+                                         int(self.leBatchWorkerProcesses.text() or 1), progress)
+        except ValueError as err:
+            self.alertBox(str(err))
+            return
+        finally:
+            self.pbModelRunProgress.setValue(0)
+        if not outFilePath.endswith('.npz'):
+            outFilePath += '.npz'  # numpy adds the extension if it's missing, so the path shown must include it
+        table.save(outFilePath)
+        self.leSurrogateTableFile.setText(outFilePath)
+        self.status("Saved lookup table to {0}.".format(outFilePath))
 
-        ###########################################################################################################################
-        #                  Last, run the actual NREI calculations for the points given the transects above                        #
-        ###########################################################################################################################
+    def runRasterMap(self):
+        """ Maps instantaneous results over the depth, velocity, and optional roughness rasters on the batch tab. The lookup table and
+            input rounding from batch method 1 are used if they're checked. """
+        depthPath, velocityPath, roughnessPath = self.leRasterDepthFile.text(), self.leRasterVelocityFile.text(), self.leRasterRoughnessFile.text()
+        if not os.path.isfile(depthPath) or not os.path.isfile(velocityPath):
+            self.alertBox("You must specify valid depth and velocity raster files before you can run the model on rasters.")
+            return
+        if not os.path.exists(self.leDriftDensityFile.text()):
+            self.alertBox("Cannot run the model without prey types specified in the inputs tab.")
+            return
+        outFolderPath = QtWidgets.QFileDialog.getExistingDirectory(self, "Choose a folder for the output rasters (or the folder of an interrupted run to resume it)", os.path.expanduser("~"), QtWidgets.QFileDialog.ShowDirsOnly)
+        if outFolderPath == '':
+            self.status("Canceled raster habitat map because no output folder was selected.")
+            return
+        self.configureForager()
+        if self.ckbBatchQuantizeInputs.isChecked():
+            resolutions = (float(self.leBatchQuantizeDepth.text() or 0), float(self.leBatchQuantizeVelocity.text() or 0), float(self.leBatchQuantizeRoughness.text() or 0))
+        else:
+            resolutions = (0, 0, 0)
+        surrogateTablePath = self.leSurrogateTableFile.text() if self.ckbBatchUseSurrogateTable.isChecked() and os.path.isfile(self.leSurrogateTableFile.text()) else None
 
-        self.status("Calculating NREI for {0} rows of the batch method 3 input file.".format(len(inputs)))
-        maxNetRateOfEnergyIntake = -100000
-        results = []
-        for row in inputs:
-            label, depth, velocity, transectLabel, positionOnTransect, roughness, forkLength, mass, temperature, turbidity, customDriftFile = row
-            self.currentForager.roughness = roughness
-            self.currentForager.forkLength = forkLength
-            self.currentForager.mass = mass
-            self.currentForager.waterTemperature = temperature
-            self.currentForager.turbidity = turbidity
-            self.currentForager.positionOnTransect = positionOnTransect
-            if customDriftFile is not None:
-                self.currentForager.filterPreyTypes(PreyType.loadPreyTypes(customDriftFile, self))
-            self.currentForager.clear_caches()
-            # Note that depth and velocity passed below end up referencing the focal depth and velocity for this fish, but the
-            # values for different prey locations / maneuvers will depend on the transect interpolations.
-            result = self.currentForager.runForagingModel(depth, velocity, self.ckbOptimizeDiet.isChecked(), self.modelGridSize, transectInterpolations[transectLabel])
-            result.pointLabel = label
-            result.transectLabel = transectLabel
-            result.positionOnTransect = positionOnTransect
-            result.forkLength = forkLength
-            result.mass = mass
-            result.roughness = roughness
-            result.temperature = temperature
-            result.turbidity = turbidity
-            result.driftFile = customDriftFile if customDriftFile is not None else self.leDriftDensityFile.text()
-            results.append(result)
-            maxNetRateOfEnergyIntake = result.netRateOfEnergyIntake if result.netRateOfEnergyIntake > maxNetRateOfEnergyIntake else maxNetRateOfEnergyIntake
-            self.status("Calculated NREI = {0:.4f} J/s at depth = {1:.2f} cm and velocity = {2:.2f} cm/s for point labeled '{3}'.".format(result.netRateOfEnergyIntake, depth, velocity, label))
-        for result in results: result.standardizeSuitability(maxNetRateOfEnergyIntake)  # Calculate the standardized suitability for each result after the overall maximum is known
+        def progress(done, total):
+            self.pbModelRunProgress.setMaximum(total)
+            self.pbModelRunProgress.setValue(done)
+            self.app.processEvents()
+
+        try:
+            rasterMap = RasterHabitatMap(outFolderPath, depthPath, velocityPath, roughnessPath if os.path.isfile(roughnessPath) else None,
+                                         self.currentForager.settings(), PreyType.loadPreyTypes(self.leDriftDensityFile.text(), self), self.leDriftDensityFile.text(),
+                                         self.modelGridSize, self.ckbOptimizeDiet.isChecked(), surrogateTablePath, resolutions,
+                                         int(self.leRasterMemoryBudget.text() or 1024), int(self.leBatchWorkerProcesses.text() or 1), self)
+            rasterMap.run(progress)
+        except ValueError as err:
+            self.alertBox(str(err))
+        finally:
+            self.pbModelRunProgress.setValue(0)
+
+    def sweepTransects(self, transectInterpolations, outFilePath):
+        """ Runs the instantaneous model for the fish on the Inputs tab at the sweep interval along every transect from the batch
+            method 3 file, with one transect per worker process, and saves the NREI-versus-position profiles to one CSV file. """
+        if not os.path.exists(self.leDriftDensityFile.text()):
+            self.alertBox("Transect sweeps use the drift density file from the inputs tab, so one must be specified.")
+            return
+        interval = float(self.leTransectSweepInterval.text() or 5)
+        if self.ckbBatchMethod3Daily.isChecked():
+            self.status("Transect sweeps use the instantaneous model, so the daily model setting is ignored.")
+        self.status("Sweeping {0} transects at {1:.1f} cm intervals.".format(len(transectInterpolations), interval))
+        workers = self.batchWorkers()
+        preyTypes = PreyType.loadPreyTypes(self.leDriftDensityFile.text(), self)
+        tasks = [(self.currentForager.settings(), preyTypes, interpolations, interval, self.ckbOptimizeDiet.isChecked(), self.modelGridSize)
+                 for interpolations in transectInterpolations.values()]
+        profiles = []
+        try:
+            for transectLabel, (positions, results) in zip(transectInterpolations.keys(), workers.imap(DriftForager.sweepTransect, tasks)):
+                profiles.append((transectLabel, positions, results))
+                self.status("Swept transect '{0}' at {1} positions, with maximum NREI = {2:.4f} J/s.".format(transectLabel, len(positions), max([result.netRateOfEnergyIntake for result in results])))
+                self.app.processEvents()
+        except Exception as err:
+            self.batchWorkerError("The transect sweep", err)
+            return
+        self.standardizeBatchResults([result for transectLabel, positions, results in profiles for result in results], False)
         with open(outFilePath, 'wt') as outFile:
             writer = csv.writer(outFile, delimiter=',', quotechar='|', quoting=csv.QUOTE_MINIMAL)
-            writer.writerow(['Label',
+            writer.writerow(['Transect Label',
+                             'Position on transect (m)',
                              'Depth (cm)',
-                             'Velocity (cm/s)',
-                             'Transect Label',
+                             'Velocity (cm/s)'] + [header for header, attribute in MainWindow.INSTANTANEOUS_OUTPUT_COLUMNS])
+            for transectLabel, positions, results in profiles:
+                for position, result in zip(positions, results):
+                    writer.writerow([transectLabel,
+                                     position / 100,  # convert from model units (cm) back to output units (m)
+                                     result.depth,
+                                     result.velocity] + [getattr(result, attribute) for header, attribute in MainWindow.INSTANTANEOUS_OUTPUT_COLUMNS])
+        self.status("Saved transect sweep results to {0}.".format(outFilePath))
+
+    def searchTransects(self, transectInterpolations, outFilePath):
+        """ Searches every transect from the batch method 3 file for the focal positions (and optionally focal depths) with the highest
+            instantaneous NREI for the fish on the Inputs tab, with one transect per worker process, and saves the optima found on each
+            transect to one CSV file. See DriftForager.findTransectOptima for the search itself. """
+        if not os.path.exists(self.leDriftDensityFile.text()):
+            self.alertBox("Transect searches use the drift density file from the inputs tab, so one must be specified.")
+            return
+        try:
+            focalDepthSpecs = [float(value) for value in self.leTransectOptimaFocalDepths.text().split(',') if value.strip() != ""]
+        except ValueError:
+            self.alertBox("The focal depths to try must be a comma-separated list of numbers, or blank to use the focal depth from the inputs tab.")
+            return
+        coarseInterval = float(self.leTransectSweepInterval.text() or 5)
+        tolerance = float(self.leTransectOptimaTolerance.text() or 1)
+        count = int(self.leTransectOptimaCount.text() or 3)
+        if self.ckbBatchMethod3Daily.isChecked():
+            self.status("Transect searches use the instantaneous model, so the daily model setting is ignored.")
+        self.status("Searching {0} transects for their best {1} focal positions.".format(len(transectInterpolations), count))
+        workers = self.batchWorkers()
+        preyTypes = PreyType.loadPreyTypes(self.leDriftDensityFile.text(), self)
+        tasks = [(self.currentForager.settings(), preyTypes, interpolations, coarseInterval, tolerance, count, self.ckbOptimizeDiet.isChecked(), self.modelGridSize, focalDepthSpecs)
+                 for interpolations in transectInterpolations.values()]
+        searches = []
+        try:
+            for transectLabel, (optima, evaluations) in zip(transectInterpolations.keys(), workers.imap(DriftForager.searchTransect, tasks)):
+                searches.append((transectLabel, optima, evaluations))
+                if len(optima) > 0:
+                    self.status("Best focal position on transect '{0}' is at {1:.2f} m with NREI = {2:.4f} J/s, found with {3} model evaluations.".format(transectLabel, optima[0]['position'] / 100, optima[0]['result'].netRateOfEnergyIntake, evaluations))
+                else:
+                    self.status("Found no focal positions with water to forage in on transect '{0}'.".format(transectLabel))
+                self.app.processEvents()
+        except Exception as err:
+            self.batchWorkerError("The transect search", err)
+            return
+        self.standardizeBatchResults([optimum['result'] for transectLabel, optima, evaluations in searches for optimum in optima], False)
+        with open(outFilePath, 'wt') as outFile:
+            writer = csv.writer(outFile, delimiter=',', quotechar='|', quoting=csv.QUOTE_MINIMAL)
+            writer.writerow(['Transect Label',
+                             'Rank',
                              'Position on transect (m)',
-                             'Roughness (cm)',
-                             'Fork length (cm)',
-                             'Mass (g)',
-                             'Temperature',
-                             'Turbidity',
-                             'Drift file',
-                             'Net rate of energy intake (J/s)',
-                             'Standardized habitat suitability',
-                             'Gross rate of energy intake (J/s)',
-                             'Energy cost of maneuvering (J/s)',
-                             'Energy cost of focal swimming (J/s)',
-                             'Total energy costs (J/s)',
-                             'Mean reaction distance (cm)',
-                             'Prey capture success proportion',
-                             'Proportion of time handling prey',
-                             'Prey ingestion rate (items/s)',
-                             'Prey encounter rate (items/s)',
-                             'Mean prey energy value (J)',
-                             'Number of prey types in diet',
-                             'Proportion of energy assimilated'])
-            for result in results: writer.writerow([result.pointLabel,
-                                                    result.depth,
-                                                    result.velocity,
-                                                    result.transectLabel,
-                                                    result.positionOnTransect / 100,  # convert from model units (cm) back to output units (m) for this
-                                                    result.roughness,
-                                                    result.forkLength,
-                                                    result.mass,
-                                                    result.temperature,
-                                                    result.turbidity,
-                                                    result.driftFile,
-                                                    result.netRateOfEnergyIntake,
-                                                    result.standardizedSuitability,
-                                                    result.grossRateOfEnergyIntake,
-                                                    result.captureManeuverCostRate,
-                                                    result.focalSwimmingCostRate,
-                                                    result.totalEnergyCostRate,
-                                                    result.meanReactionDistance,
-                                                    result.captureSuccess,
-                                                    result.proportionOfTimeSpentHandling,
-                                                    result.ingestionRate,
-                                                    result.encounterRate,
-                                                    result.meanPreyEnergyValue,
-                                                    result.numPreyTypes,
-                                                    result.proportionAssimilated])
-        self.status("Saved batch processing results to {0}.".format(outFilePath))
+                             'Focal depth specification',
+                             'Depth (cm)',
+                             'Velocity (cm/s)'] + [header for header, attribute in MainWindow.INSTANTANEOUS_OUTPUT_COLUMNS] + ['Model evaluations for transect'])
+            for transectLabel, optima, evaluations in searches:
+                for rank, optimum in enumerate(optima):
+                    result = optimum['result']
+                    writer.writerow([transectLabel,
+                                     rank + 1,
+                                     optimum['position'] / 100,  # convert from model units (cm) back to output units (m)
+                                     optimum['focalDepthSpec'],
+                                     result.depth,
+                                     result.velocity] + [getattr(result, attribute) for header, attribute in MainWindow.INSTANTANEOUS_OUTPUT_COLUMNS] + [evaluations])
+        self.status("Saved transect search results to {0}.".format(outFilePath))
+
+    def batchWorkerError(self, description, err, checkpoint=None):
+        """ Reports an error raised while the workers were running a batch, which stops the batch. Rows already saved by a checkpoint
+            are kept, so running the batch again with the same output file carries on from them. """
+        message = "{0} stopped because the model failed while running it. Specific error: {1}".format(description, err)
+        if checkpoint is not None:
+            message += "\nThe results for {0} rows were saved to {1}; run the batch again with the same output file to resume it.".format(checkpoint.rowsWritten, checkpoint.outFilePath)
+        self.statusError(message)
+        self.alertBox(message)
+
+    def batchWorkers(self):
+        """ Returns the workers that run batch jobs: a pool of the number of processes set on the batch tab or, if networked workers
+            are turned on, a ClusterWorkers coordinator that starts that many workers on this computer and serves jobs to any others that
+            connect. The coordinator is kept until its settings change, so remote workers stay connected from one batch to the next. """
+        processes = int(self.leBatchWorkerProcesses.text() or 1)
+        configuration = (int(self.leClusterPort.text() or 6000), self.leClusterAuthKey.text(), processes) if self.ckbBatchUseClusterWorkers.isChecked() else None
+        if configuration != self.clusterWorkersConfiguration and self.clusterWorkers is not None:
+            self.clusterWorkers.close()
+            self.clusterWorkers = None
+            self.clusterWorkersConfiguration = None
+        if configuration is None:
+            return ParallelWorkers(processes)
+        if configuration[1] == '':
+            self.statusError("Networked workers need a password, so the batch will only run on this computer.")
+            return ParallelWorkers(processes)
+        if self.clusterWorkers is None:
+            try:
+                self.clusterWorkers = ClusterWorkers(configuration[0], configuration[1], processes, jobTimeout=MainWindow.CLUSTER_JOB_TIMEOUT,
+                                                     waitTimeout=MainWindow.CLUSTER_WAIT_TIMEOUT, idle=self.app.processEvents)
+            except OSError as err:
+                self.statusError("Could not listen for networked workers on port {0}, so the batch will only run on this computer. Specific error: {1}".format(configuration[0], err))
+                return ParallelWorkers(processes)
+            self.clusterWorkersConfiguration = configuration
+            self.status("Listening for networked workers on port {0}. Start them on other computers with: python -m DriftModelRT.ClusterWorkers --host {1} --port {0} --authkey <password>".format(configuration[0], socket.gethostname()))
+        return self.clusterWorkers
+
+    def evaluateBatchPoints(self, points, shouldRunDailyModel, transectInterpolations=None):
+        """ Runs the model for each point, a dictionary with the label, depth, velocity, roughness, forkLength, mass, temperature,
+            turbidity, and driftFile (plus positionOnTransect and transectLabel for transects), returning the results in the same order.
+            Points with the same fish, water, and drift settings share one forager, so its cached calculations are reused, and they're
+            split into chunks spread across the batch workers (see batchWorkers). Daily runs use the Daily Settings tab. """
+        scenario = DailyScenario.fromUserInterface(self) if shouldRunDailyModel else None
+        baseSettings = self.currentForager.settings()
+        preyTypesByFile = {}
+        groups = {}
+        for index, point in enumerate(points):
+            groups.setdefault((point['roughness'], point['forkLength'], point['mass'], point['temperature'], point['turbidity'], point['driftFile']), []).append(index)
+            if point['driftFile'] not in preyTypesByFile:
+                preyTypesByFile[point['driftFile']] = PreyType.loadPreyTypes(point['driftFile'], self)
+        workers = self.batchWorkers()
+        chunkSize = max(1, int(np.ceil(len(points) / (4 * workers.processes))))  # several chunks per process, so they finish at about the same time
+        tasks = []
+        taskIndices = []
+        for (roughness, forkLength, mass, temperature, turbidity, driftFile), indices in groups.items():
+            settings = dict(baseSettings, roughness=roughness, forkLength=forkLength, mass=mass, waterTemperature=temperature, turbidity=turbidity)
+            for start in range(0, len(indices), chunkSize):
+                chunk = indices[start:start + chunkSize]
+                chunkPoints = [(points[i]['depth'], points[i]['velocity'], points[i].get('positionOnTransect'), points[i].get('transectLabel')) for i in chunk]
+                tasks.append((settings, preyTypesByFile[driftFile], scenario, chunkPoints, self.ckbOptimizeDiet.isChecked(), self.modelGridSize, transectInterpolations))
+                taskIndices.append(chunk)
+        results = [None] * len(points)
+        for chunk, chunkResults in zip(taskIndices, workers.imap(DriftForager.runPoints, tasks)):
+            for i, result in zip(chunk, chunkResults):
+                results[i] = result
+                point = points[i]
+                if shouldRunDailyModel:
+                    self.status("Calculated DNEI = {0:.4f} J at depth = {1:.2f} cm and velocity = {2:.2f} cm/s for point labeled '{3}'.".format(result.dailyNetEnergyIntake, point['depth'], point['velocity'], point['label']))
+                else:
+                    self.status("Calculated NREI = {0:.4f} J/s at depth = {1:.2f} cm and velocity = {2:.2f} cm/s for point labeled '{3}'.".format(result.netRateOfEnergyIntake, point['depth'], point['velocity'], point['label']))
+            self.app.processEvents()  # keeps the status window updating while the workers run
+        return results
+
+    def standardizeBatchResults(self, results, shouldRunDailyModel):
+        """ Calculates the standardized suitability for each batch result after the overall maximum is known. """
+        if shouldRunDailyModel:
+            bounds = self.standardizationBounds(True, max([result.dailyNetEnergyIntake for result in results]),
+                                                min([result.dailyRiskBalancingMetric for result in results]), max([result.dailyRiskBalancingMetric for result in results]))
+        else:
+            bounds = self.standardizationBounds(False, max([result.netRateOfEnergyIntake for result in results]))
+        for result in results:
+            result.standardizeSuitability(*bounds)
+
+    def standardizationBounds(self, shouldRunDailyModel, maxNetEnergyIntake, minDailyRiskBalancingMetric=None, maxDailyRiskBalancingMetric=None):
+        """ Returns the arguments to standardizeSuitability for batch results with the given maximum NREI (or DNEI and the range of the
+            risk-balancing metric, for daily results). If standardizing by the continuous maximum, that's the maximum for the fish on the
+            Inputs tab, unless a batch result exceeds it. """
+        if shouldRunDailyModel:
+            if self.ckbStandardizeByContinuousMaximum.isChecked():
+                maxNetEnergyIntake = max(maxNetEnergyIntake, self.continuousMaximum(DailyScenario.fromUserInterface(self)))
+            return (maxNetEnergyIntake, minDailyRiskBalancingMetric, maxDailyRiskBalancingMetric, self.cbForagingStrategy.currentIndex())
+        if self.ckbStandardizeByContinuousMaximum.isChecked():
+            maxNetEnergyIntake = max(maxNetEnergyIntake, self.continuousMaximum())
+        return (maxNetEnergyIntake,)
+
+    def continuousMaximum(self, scenario=None):
+        """ Returns the maximum NREI (or DNEI, if a DailyScenario is given) of the current forager over continuous depths and velocities
+            from the depth and velocity intervals up to the maximums on the Inputs tab, to within 0.1 cm and 0.1 cm/s, or -inf if the
+            forager has no prey types. """
+        depthRange = (float(self.leIntervalDepth.text()), float(self.leMaxDepth.text()))
+        velocityRange = (float(self.leIntervalVelocity.text()), float(self.leMaxWaterVelocity.text()))
+        if getattr(self.currentForager, 'preyTypes', None) is None:
+            self.status("Can't find the continuous maximum without prey types on the inputs tab, so suitability is standardized by the best result instead.")
+            return -np.inf
+        self.status("Searching for the maximum {0} over continuous depth and velocity.".format("DNEI" if scenario is not None else "NREI"))
+        self.app.processEvents()
+        optimum = self.currentForager.findMaximumNetEnergyIntake(depthRange, velocityRange, self.ckbOptimizeDiet.isChecked(), self.modelGridSize, scenario)
+        self.status("Found maximum {0} = {1:.4f} {2} at depth = {3:.2f} cm and velocity = {4:.2f} cm/s, with {5} model evaluations.".format(
+            "DNEI" if scenario is not None else "NREI", optimum['value'], "J" if scenario is not None else "J/s", optimum['depth'], optimum['velocity'], optimum['evaluations']))
+        return optimum['value']
 
     def plotSliceSliderChanged(self, whichCurve):
         """ Updates the depth and velocity curves when the user changes the slider to select a different depth or velocity """
@@ -834,6 +1543,8 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         if self.currentResult is not None:
             if whichResult == 'spreadsheet':
                 self.currentResult.exportSpreadsheet()
+            elif whichResult == 'all responses':
+                self.currentResult.exportAllResponses()
             elif whichResult == 'response surface plot':
                 self.currentResult.exportPlot('response surface')
             elif whichResult == 'depth curve plot':
@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 """
 This class holds the results of a model run (a full 2D table of depth/velocity combination results) 
-and handles plotting and exporting of those results.
+and handles plotting and exporting of those results. The results are stored in a ResultTable with one array per response.
 """
 
 import numpy as np
@@ -10,11 +10,13 @@ from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 from mpl_toolkits.mplot3d import Axes3D  # we get a warning message that this is unused, but it actually is necessary for rotating the 3D plot
 from matplotlib import cm
-from scipy.interpolate import griddata
+from scipy.interpolate import RegularGridInterpolator
+from scipy.ndimage import binary_dilation
 from PyQt5.QtWidgets import QSpacerItem
 from PyQt5 import QtWidgets
-from os.path import expanduser
+from os.path import expanduser, splitext
 import csv
+from DriftModelRT.ResultTable import ResultTable
 
 class ModelSetResult(object):
     
@@ -28,16 +30,34 @@ class ModelSetResult(object):
             if type(itemToDelete) is not QSpacerItem: 
                 itemToDelete.widget().setParent(None)
     
-    def __init__(self, ui, results):
+    RESPONSES = ()  # names of the result attributes that can be plotted and exported, set in subclasses
+
+    @classmethod
+    def fromResults(cls, ui, results):
+        """ Builds the model set result from a list of SingleModelResult or DailyRunResult objects, keeping only their responses. If
+            every result has the same prey types, each type's ingestion rate is kept too, in a column named 'ingestionRate[label]',
+            so the diet is exported along with the responses. """
+        table = ResultTable.fromResults(results, cls.RESPONSES)
+        preyLabels = getattr(results[0], 'preyLabels', ()) if len(results) > 0 else ()
+        if len(preyLabels) > 0 and all(getattr(result, 'preyLabels', None) == preyLabels for result in results):  # usually the same tuple object
+            rates = np.array([result.preyIngestionRates for result in results])
+            preyTable = ResultTable.fromColumns([result.depth for result in results], [result.velocity for result in results],
+                                                {"ingestionRate[{0}]".format(label): rates[:, k] for k, label in enumerate(preyLabels)})
+            table.columns.update(preyTable.columns)
+        return cls(ui, table)
+
+    def __init__(self, ui, table):
         if not hasattr(self, 'main_response'):  # Never actually triggered because both subclasses define main_response, but avoids annoying syntax warnings
             self.main_response = 'netRateOfEnergyIntake'
         self.ui = ui
-        self.results = results
+        self.table = table
         self.response = self.main_response  # main_response set in subclasses
         self.arrangePlotData()
 
     def arrangePlotData(self):
-        self.depths, self.velocities, self.responses = np.array([(result.depth, result.velocity, getattr(result, self.response)) for result in self.results]).T
+        """ The flattened arrays are views of the table, so switching responses doesn't copy or collect anything. """
+        self.depths, self.velocities = self.table.flatDepths, self.table.flatVelocities
+        self.responses = self.table.column(self.response).ravel()
     
     def setResponse(self, response):
         self.response = response
@@ -69,7 +89,9 @@ class ModelSetResult(object):
                       'dailyCaptureManeuverCost'        : 'Daily prey capture cost (J)',
                       'dailyHoursForaging'              : 'Daily hours foraging',
                       'dailySpecificConsumption'        : 'Daily specific consumption (g/g/day)',
-                      'dailySpecificConsumptionProportional' : 'Proportion of maximum ration'
+                      'dailySpecificConsumptionProportional' : 'Proportion of maximum ration',
+                      'optimalDailyRiskBalancingMetric' : 'Optimal-schedule risk-balancing metric',
+                      'greedyScheduleMetricExcess'      : 'Greedy schedule metric excess over optimal'
                       }
         shortLabels = {'netRateOfEnergyIntake'          : "NREI",
                       'standardizedSuitability'         : "Suitability",
@@ -95,7 +117,9 @@ class ModelSetResult(object):
                       'dailyCaptureManeuverCost'        : 'Maneuver cost',
                       'dailyHoursForaging'              : 'Hours foraging',
                       'dailySpecificConsumption'        : 'Specific consumption',
-                      'dailySpecificConsumptionProportional' : 'Bioenergetic P'
+                      'dailySpecificConsumptionProportional' : 'Bioenergetic P',
+                      'optimalDailyRiskBalancingMetric' : 'Optimal risky fitness',
+                      'greedyScheduleMetricExcess'      : 'Greedy excess'
                       }
         if length == 'long':
             return longLabels[self.response]
@@ -104,49 +128,81 @@ class ModelSetResult(object):
         else:
             return "Invalid label length"
         
+    curvePlots = {}  # figure, canvas, and line of the depth and velocity curves, keyed by curve, reused by every result and response
+
+    def curvePlot(self, whichCurve, layout):
+        """ Returns the dictionary holding the figure, axes, canvas, and line for the depth or velocity curve, creating them the first
+            time and making sure the canvas is the one in the layout. The line and title are animated, so they're left out of full draws
+            and the rest of the figure is saved as a background after each one; slider moves then blit just those two artists onto it. """
+        plot = ModelSetResult.curvePlots.get(whichCurve)
+        if plot is None:
+            fig = Figure(facecolor='white')
+            canvas = FigureCanvas(fig)
+            ax = fig.gca()
+            line, = ax.plot([], [], animated=True)
+            ax.title.set_animated(True)
+            plot = {'fig': fig, 'ax': ax, 'canvas': canvas, 'line': line, 'background': None}
+
+            def onDraw(event):
+                plot['background'] = canvas.copy_from_bbox(fig.bbox)  # after every full draw, including those from resizing the window
+                ModelSetResult.drawAnimatedArtists(plot)
+
+            canvas.mpl_connect('draw_event', onDraw)
+            ModelSetResult.curvePlots[whichCurve] = plot
+        if layout.indexOf(plot['canvas']) < 0:
+            ModelSetResult.clearLayout(layout)
+            layout.addWidget(plot['canvas'])  # need to clear before adding another widget
+        return plot
+
+    @staticmethod
+    def drawAnimatedArtists(plot):
+        plot['fig'].draw_artist(plot['line'])
+        plot['fig'].draw_artist(plot['ax'].title)
+
     def plotSuitabilityCurve(self, whichCurve, otherCurveValue, layout):
-        fig = Figure(facecolor='white')
-        ax = fig.gca()
-        ax.set_ylabel(self.responseLabel('long'))
-        ax.set_ylim([self.responsePlotLimit('min'),self.responsePlotLimit('max')])
+        """ Sets up the depth or velocity curve for the current response. The figure and canvas are reused, so this only replaces the
+            line's data, the labels, and the limits, and then redraws the figure once. """
         if whichCurve == 'depth':
-            curveResults = [result for result in self.results if result.velocity == otherCurveValue]
-            if len(curveResults) == 0: exit("Depth curve requested for invalid velocity.")
-            x, y = np.array([(result.depth, getattr(result, self.response)) for result in curveResults]).T
-            ax.set_title("Depth response for velocity {0} cm/s".format(otherCurveValue))
-            ax.set_xlabel('Water depth (cm)')
-            ax.canvas = FigureCanvas(fig)
-            self.depthLine, = ax.plot(x, y)
-            self.depthAx = ax
-            self.depthFig = fig
+            curve = self.table.depthCurve(self.response, otherCurveValue)
+            if curve is None: exit("Depth curve requested for invalid velocity.")
+            title = "Depth response for velocity {0} cm/s".format(otherCurveValue)
+            xLabel = 'Water depth (cm)'
+        elif whichCurve == 'velocity':
+            curve = self.table.velocityCurve(self.response, otherCurveValue)
+            if curve is None: exit("Velocity curve requested for invalid depth.")
+            title = "Velocity response for depth {0} cm".format(otherCurveValue)
+            xLabel = 'Water velocity (cm/s)'
+        else:
+            quit("Invalid curve requested in plotSuitabilityCurve -- should be 'depth' or 'velocity' only.")
 #            This commented-out code could be used as the start of hover-over tooltips at some point in the future.
 #            def on_plot_hover(event):
 #                if event.xdata is not None: # if actually over the plot
 #                    nearestx = min(x, key=lambda var:abs(var-event.xdata)) # x of event in data coords
 #                    print(nearestx)
 #            fig.canvas.mpl_connect('motion_notify_event', on_plot_hover)  
-
-        elif whichCurve == 'velocity':
-            curveResults = [result for result in self.results if result.depth == otherCurveValue]
-            if len(curveResults) == 0: exit("Velocity curve requested for invalid depth.")
-            x, y = np.array([(result.velocity, getattr(result,self.response)) for result in curveResults]).T
-            ax.set_title("Velocity response for depth {0} cm".format(otherCurveValue))
-            ax.set_xlabel('Water velocity (cm/s)')
-            ax.canvas = FigureCanvas(fig)
-            self.velocityLine, = ax.plot(x, y)
-            self.velocityAx = ax
-            self.velocityFig = fig
+        plot = self.curvePlot(whichCurve, layout)
+        x, y = curve
+        ax = plot['ax']
+        plot['line'].set_data(x, y)
+        ax.set_title(title)
+        ax.set_xlabel(xLabel)
+        ax.set_ylabel(self.responseLabel('long'))
+        ax.relim()
+        ax.autoscale_view(scaley=False)
+        ax.set_ylim([self.responsePlotLimit('min'),self.responsePlotLimit('max')])
+        if whichCurve == 'depth':
+            self.depthFig = plot['fig']
         else:
-            quit("Invalid curve requested in plotSuitabilityCurve -- should be 'depth' or 'velocity' only.")
-        ModelSetResult.clearLayout(layout)
-        layout.addWidget(ax.canvas)  # need to clear before adding another widget
-        fig.tight_layout(pad=2.5)
-        ax.canvas.draw()
+            self.velocityFig = plot['fig']
+        plot['fig'].tight_layout(pad=2.5)
+        plot['canvas'].draw()
         
     def responsePlotLimit(self, whichLimit):
         """ Returns minimum and maximum value that shows up on the plot. Sometimes the minimum NREI gets extremely low at high velocity values, so it
             needs to be cut off to preserve detail in the plot in the interesting/realistic velocity ranges."""
         responses = self.responses[np.logical_not(np.isnan(self.responses))]
+        if len(responses) == 0:
+            return 0  # e.g. schedule diagnostics, which are only calculated for risk-balancing runs
         responsePadding = 0.03 * (responses.max() - responses.min())
         if whichLimit == 'min':
             if self.response == 'netRateOfEnergyIntake':
@@ -159,46 +215,70 @@ class ModelSetResult(object):
             return 0
         
     def updateSuitabilityCurve(self, whichCurve, otherCurveValue):
-        """ This function updates the depth curve for a given velocity value or vice versa, simply by changing the ydata in the plot 
-            to move the line without redrawing the entire figure. """
+        """ This function updates the depth curve for a given velocity value or vice versa, by taking the slice from the result table
+            and blitting only the line and title onto the saved background, rather than redrawing the axes, ticks, and labels. """
         if whichCurve == 'depth':
-            curveResults = [getattr(result, self.response) for result in self.results if result.velocity == otherCurveValue]
-            if len(curveResults) == 0: exit("Depth curve requested for invalid velocity.")
-            self.depthLine.set_ydata(np.array(curveResults))
-            self.depthAx.set_title("Depth response for velocity {0} cm/s".format(otherCurveValue))
-            self.depthAx.canvas.draw()
+            curve = self.table.depthCurve(self.response, otherCurveValue)
+            if curve is None: exit("Depth curve requested for invalid velocity.")
+            title = "Depth response for velocity {0} cm/s".format(otherCurveValue)
         elif whichCurve == 'velocity':
-            curveResults = [getattr(result, self.response) for result in self.results if result.depth == otherCurveValue]
-            if len(curveResults) == 0: exit("Velocity curve requested for invalid depth.")
-            self.velocityLine.set_ydata(np.array(curveResults))
-            self.velocityAx.set_title("Velocity response for depth {0} cm".format(otherCurveValue))
-            self.velocityAx.canvas.draw()
+            curve = self.table.velocityCurve(self.response, otherCurveValue)
+            if curve is None: exit("Velocity curve requested for invalid depth.")
+            title = "Velocity response for depth {0} cm".format(otherCurveValue)
         else:
             quit("Invalid curve requested in updateSuitabilityCurve -- should be 'depth' or 'velocity' only.")        
+        plot = ModelSetResult.curvePlots.get(whichCurve)
+        if plot is None:
+            return  # the curves haven't been plotted yet
+        plot['line'].set_ydata(curve[1])
+        plot['ax'].set_title(title)
+        if plot['background'] is None:
+            plot['canvas'].draw()  # saves the background for next time
+        else:
+            plot['canvas'].restore_region(plot['background'])
+            ModelSetResult.drawAnimatedArtists(plot)
+            plot['canvas'].blit(plot['fig'].bbox)
         
     def showDefaultCurves(self):
-        self.bestVelocityAtMaxDepth = self.velocities[0]  # placeholder
-        self.bestMainResponseAtMaxDepth = getattr(self.results[0], self.main_response)  # placeholder
-        for result in self.results:
-            if result.depth == self.depths.max() and getattr(result, self.main_response) > self.bestMainResponseAtMaxDepth:
-                self.bestVelocityAtMaxDepth = result.velocity
-                self.bestMainResponseAtMaxDepth = getattr(result, self.main_response)
+        mainResponseAtMaxDepth = self.table.column(self.main_response)[-1, :]
+        best = np.nanargmax(mainResponseAtMaxDepth) if not np.isnan(mainResponseAtMaxDepth).all() else 0
+        self.bestVelocityAtMaxDepth = self.table.velocities[best]
+        self.bestMainResponseAtMaxDepth = mainResponseAtMaxDepth[best]
         self.ui.hsDepthForVelocityPlot.setValue(self.depths.max() / int(self.ui.leIntervalDepth.text()))
         self.ui.hsVelocityForDepthPlot.setValue(self.bestVelocityAtMaxDepth / int(self.ui.leIntervalVelocity.text()))
             
+    SURFACE_MESH_SIZE = 50  # number of depths and velocities on the mesh drawn in the 3D plot
+
+    @staticmethod
+    def surfaceMesh(depths, velocities, values, size):
+        """ Interpolates the (depth x velocity) array of responses on the result table's regular lattice onto an evenly spaced mesh of
+            at most size x size points for the 3D plot. Coarse lattices are smoothed with cubic interpolation, except near NaN values (e.g.
+            where the fish aren't eating so rates aren't defined), which spread through cubic splines, so linear interpolation is used
+            within two lattice nodes of them. Lattices finer than the mesh are thinned out with linear interpolation, which is quick
+            and loses nothing visible at that resolution. """
+        if len(depths) < 2 or len(velocities) < 2:
+            return depths, velocities, values  # nothing to interpolate along a single depth or velocity
+        meshDepths = np.linspace(depths.min(), depths.max(), size)
+        meshVelocities = np.linspace(velocities.min(), velocities.max(), size)
+        points = tuple(np.meshgrid(meshDepths, meshVelocities, indexing='ij'))
+        mesh = RegularGridInterpolator((depths, velocities), values, method='linear')(points)
+        isCoarse = len(depths) <= size and len(velocities) <= size
+        if isCoarse and len(depths) >= 4 and len(velocities) >= 4:  # cubic interpolation needs 4 points on each axis
+            isNaN = np.isnan(values)
+            cubic = RegularGridInterpolator((depths, velocities), np.where(isNaN, 0, values), method='cubic')(points)
+            isNearNaN = RegularGridInterpolator((depths, velocities), binary_dilation(isNaN, iterations=2).astype(float), method='linear')(points) > 0
+            mesh = np.where(isNearNaN, mesh, cubic)
+        return meshDepths, meshVelocities, mesh
+
     def plotResponseSurface(self, layout):
-        """ Builds the 3D plot of the full depth/velocity relationship. """
+        """ Builds the 3D plot of the full depth/velocity relationship, straight from the regular lattice of the result table. """
         self.responseSurfaceFig = Figure(facecolor='white')
         canvas = FigureCanvas(self.responseSurfaceFig)  # must be created before the add_subplot line
         ax = self.responseSurfaceFig.add_subplot(111, projection='3d')
         ax.canvas = canvas  # must be set after the add_subplot line
         ax.mouse_init()
-        # 3d plot grid arrangement code adapted from http://stackoverflow.com/questions/29547687/matplotlib-3d-surface-plots-not-showing       
-        xi = np.linspace(self.depths.min(), self.depths.max(), 50)
-        yi = np.linspace(self.velocities.min(), self.velocities.max(), 50)
-        zmethod = 'linear' if np.isnan(self.responses).any() else 'cubic' # cubic interpolation fails with any NaN values, i.e. if the fish aren't eating so rates aren't defined
-        zi = griddata((self.depths, self.velocities), self.responses, (xi[None, :], yi[:, None]), method=zmethod)    # create a uniform spaced grid
-        xig, yig = np.meshgrid(xi, yi)
+        xi, yi, zi = ModelSetResult.surfaceMesh(self.table.depths, self.table.velocities, self.table.column(self.response).astype(float), self.SURFACE_MESH_SIZE)
+        xig, yig = np.meshgrid(xi, yi, indexing='ij')
         ax.plot_surface(xig, yig, zi, rstride=1, cstride=1, cmap=cm.viridis, linewidth=0, vmin=self.responsePlotLimit('min'), vmax=self.responsePlotLimit('max'), antialiased=False)
         ax.set_zlim3d(self.responsePlotLimit('min'),self.responsePlotLimit('max'))
         ax.set_zlabel(self.responseLabel('short'))
@@ -222,27 +302,45 @@ class ModelSetResult(object):
     def exportSpreadsheet(self, path=None):
         outFilePath = path if path is not None else QtWidgets.QFileDialog.getSaveFileName(self.ui, "Choose a name and location for the output CSV file", expanduser("~"), "Spreadsheet (*.csv)")[0]
         if outFilePath != '':
-            depths = np.sort(np.unique(self.depths))
-            velocities = np.sort(np.unique(self.velocities))
-            dictResponses = {}
-            for result in self.results: dictResponses[(result.depth, result.velocity)] = getattr(result,self.response) # store response values in a dict indexed by depth and velocity
+            column = self.table.column(self.response)
             with open(outFilePath, 'wt') as outFile:
                 writer = csv.writer(outFile, delimiter=',',quotechar='|', quoting=csv.QUOTE_MINIMAL)
-                writer.writerow(["velocity (row) by depth (column)"] + depths.tolist())
-                for v in velocities:
-                    writer.writerow([v] + [dictResponses[(d, v)] for d in depths])
+                writer.writerow(["velocity (row) by depth (column)"] + self.table.depths.tolist())
+                for j, v in enumerate(self.table.velocities):
+                    writer.writerow([v] + column[:, j].tolist())
             self.ui.status("Saved responses for the full depth/velocity grid to to {0}.".format(outFilePath))
 
+    def exportAllResponses(self, path=None):
+        """ Writes every response in one pass, both as a long-format CSV file (one row per depth/velocity cell and one column per
+            response) and as a compressed binary columnar file with the same base name, which loads far faster than the CSV. """
+        outFilePath = path if path is not None else QtWidgets.QFileDialog.getSaveFileName(self.ui, "Choose a name and location for the output files (CSV and binary)", expanduser("~"), "Spreadsheet (*.csv)")[0]
+        if outFilePath != '':
+            basePath, extension = splitext(outFilePath)
+            if extension.lower() not in ('.csv', '.npz', '.parquet'):
+                basePath = outFilePath  # e.g. a batch method 2 file name ending with a decimal temperature, without an extension
+            binaryPath = basePath + ResultTable.binaryExtension()
+            self.table.exportCSV(basePath + '.csv')
+            self.table.saveBinary(binaryPath)
+            self.ui.status("Saved all {0} responses (and per-prey ingestion rates, if any) for the full depth/velocity grid to {1} and {2}.".format(len(self.RESPONSES), basePath + '.csv', binaryPath))
+
 class InstantaneousModelSetResult(ModelSetResult):
 
-    def __init__(self, ui, results):
+    RESPONSES = ('netRateOfEnergyIntake', 'standardizedSuitability', 'grossRateOfEnergyIntake', 'captureManeuverCostRate', 'focalSwimmingCostRate',
+                 'totalEnergyCostRate', 'meanReactionDistance', 'captureSuccess', 'proportionOfTimeSpentHandling', 'ingestionRate', 'encounterRate',
+                 'meanPreyEnergyValue', 'numPreyTypes', 'proportionAssimilated')
+
+    def __init__(self, ui, table):
         self.main_response = 'netRateOfEnergyIntake'  # default response to plot first and use for depth plot default velocity
-        super().__init__(ui, results)
+        super().__init__(ui, table)
 
 class DailyModelSetResult(ModelSetResult):
 
-    def __init__(self, ui, results):
+    RESPONSES = ('dailyNetEnergyIntake', 'dailyRiskBalancingMetric', 'standardizedSuitability', 'dailyRisk', 'dailyRiskOn90DayHorizon',
+                 'dailyGrossEnergyIntake', 'dailyCost', 'dailyFocalSwimmingCost', 'dailyCaptureManeuverCost', 'dailyHoursForaging',
+                 'dailySpecificConsumption', 'dailySpecificConsumptionProportional', 'optimalDailyRiskBalancingMetric', 'greedyScheduleMetricExcess')
+
+    def __init__(self, ui, table):
         self.main_response = 'dailyNetEnergyIntake'  # default response to plot first and use for depth plot default velocity
-        super().__init__(ui, results)
+        super().__init__(ui, table)
 
 
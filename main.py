@@ -12,6 +12,11 @@ if __name__ == '__main__':
 
     import sys
     import os
+    import multiprocessing
+    multiprocessing.freeze_support()  # lets worker processes start from the compiled (Pyinstaller) program
+    if len(sys.argv) > 1 and sys.argv[1] == 'worker':  # runs networked batch workers instead of the user interface, e.g. "main worker --host ..."
+        from DriftModelRT.ClusterWorkers import ClusterWorkers
+        sys.exit(ClusterWorkers.main(sys.argv[2:]))
     os.environ["QT_AUTO_SCREEN_SCALE_FACTOR"] = "1"
     from MainWindow import MainWindow
     from PyQt5 import QtWidgets, QtCore